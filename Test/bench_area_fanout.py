@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recipients and cost per driver location update with rider
+subscription areas versus broadcasting to every rider.
+
+Riders and drivers are spread at a constant density over a square service
+area that grows from one city to a whole country. Each rider subscribes to
+a 5 km circle around itself. Without areas every update reaches every rider;
+with areas it reaches only riders nearby, so fan-out stays flat while the
+fleet grows geographically.
+
+Run from the backend root:
+    python Test/bench_area_fanout.py
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+from spatial_index import SubscriptionArea
+
+BASE_LAT = 23.8103
+BASE_LNG = 90.4125
+SPANS_DEG = [0.25, 0.5, 1.0, 2.0, 4.0]  # Dhaka city up to most of Bangladesh
+RIDERS_PER_SQ_DEG = 2_000
+SUBSCRIPTION_RADIUS_KM = 5.0
+UPDATES = 100
+MESSAGE = '{"type":"driver-location","data":{"driver_id":1,"latitude":23.81,"longitude":90.41}}'
+
+
+class NullWebSocket:
+    async def send_text(self, message: str):
+        pass
+
+
+def random_point(rng: random.Random, span: float):
+    return (BASE_LAT + rng.uniform(-span / 2, span / 2),
+            BASE_LNG + rng.uniform(-span / 2, span / 2))
+
+
+async def build_manager(span: float, scoped: bool) -> ConnectionManager:
+    rng = random.Random(int(span * 100))
+    manager = ConnectionManager()
+    riders = int(RIDERS_PER_SQ_DEG * span * span)
+    for rider_id in range(1, riders + 1):
+        connection_id = f"rider-{rider_id}"
+        await manager.connect(NullWebSocket(), connection_id, rider_id, "rider")
+        if scoped:
+            latitude, longitude = random_point(rng, span)
+            manager.subscribe_area(
+                connection_id, SubscriptionArea.circle(latitude, longitude, SUBSCRIPTION_RADIUS_KM))
+    return manager
+
+
+async def measure(manager: ConnectionManager, span: float):
+    rng = random.Random(42)
+    updates = [random_point(rng, span) for _ in range(UPDATES)]
+    recipients = 0
+    start = time.perf_counter()
+    for latitude, longitude in updates:
+        result = await manager.broadcast_to_area(latitude, longitude, MESSAGE)
+        recipients += result.delivered
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return recipients / UPDATES, elapsed_ms / UPDATES
+
+
+async def main():
+    print("📊 Rider fan-out per driver update")
+    print("=" * 78)
+    print(f"{'span deg':>9} {'riders':>8} {'all: recipients':>16} {'all: ms':>9} "
+          f"{'area: recipients':>17} {'area: ms':>9} {'shrink':>7}")
+    for span in SPANS_DEG:
+        everyone = await build_manager(span, scoped=False)
+        all_recipients, all_ms = await measure(everyone, span)
+        scoped = await build_manager(span, scoped=True)
+        area_recipients, area_ms = await measure(scoped, span)
+        await everyone.stop()
+        await scoped.stop()
+        riders = len(everyone.unscoped_riders)
+        shrink = all_recipients / area_recipients if area_recipients else float("inf")
+        print(f"{span:>9.2f} {riders:>8} {all_recipients:>16.1f} {all_ms:>9.3f} "
+              f"{area_recipients:>17.1f} {area_ms:>9.3f} {shrink:>6.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
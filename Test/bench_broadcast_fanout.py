@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: cost of broadcast_to_riders versus connection count.
+
+Compares the previous implementation (scan user_info, then send_to_user per
+rider with its debug prints) with the role-indexed registry. Sockets are
+in-memory fakes, so the numbers are pure server-side fan-out overhead.
+
+Run from the backend root:
+    python Test/bench_broadcast_fanout.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+
+CONNECTION_COUNTS = [100, 1_000, 10_000]
+DRIVER_SHARE = 0.2  # one driver per four riders
+ROUNDS = 5
+MESSAGE = '{"type": "driver-location", "data": {"driver_id": 1, "latitude": 23.81, "longitude": 90.41}}'
+
+
+class NullWebSocket:
+    async def send_text(self, message: str):
+        pass
+
+
+async def legacy_broadcast_to_riders(manager: ConnectionManager, message: str):
+    """The pre-index implementation, including the per-recipient debug output."""
+    for user_id, info in manager.user_info.items():
+        if info.get("role") == "rider":
+            user_id_int = int(user_id)
+            print(f"🔍 Looking for user connection: {user_id_int}")
+            print(
+                f"🔍 Available user connections: {list(manager.user_connections.keys())}")
+            if user_id_int in manager.user_connections:
+                connection_id = manager.user_connections[user_id_int]
+                print(
+                    f"🔍 Found connection for user {user_id_int}: {connection_id}")
+                await manager.send_personal_message(message, connection_id)
+
+
+async def build_manager(connections: int) -> ConnectionManager:
+    manager = ConnectionManager()
+    drivers = int(connections * DRIVER_SHARE)
+    for user_id in range(1, connections + 1):
+        role = "driver" if user_id <= drivers else "rider"
+        await manager.connect(NullWebSocket(), f"conn-{user_id}", user_id, role)
+    return manager
+
+
+async def time_broadcast(fn, manager, rounds: int) -> float:
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(rounds):
+            await fn(manager, MESSAGE)
+            await manager.drain()  # Include the writer tasks delivering to sockets
+            sink.seek(0)
+            sink.truncate()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def main():
+    print("🧪 Rider broadcast fan-out benchmark")
+    print("=" * 60)
+    print(f"{'connections':>12} {'riders':>8} {'legacy ms':>12} {'indexed ms':>12} {'speedup':>10}")
+
+    for connections in CONNECTION_COUNTS:
+        manager = await build_manager(connections)
+        riders = len(manager.connections_for_role("rider"))
+        # The legacy path is quadratic; one round is plenty at 10k
+        legacy_rounds = 1 if connections >= 10_000 else ROUNDS
+        legacy_ms = await time_broadcast(legacy_broadcast_to_riders, manager, legacy_rounds)
+        indexed_ms = await time_broadcast(
+            lambda m, msg: m.broadcast_to_riders(msg), manager, ROUNDS)
+        print(f"{connections:>12} {riders:>8} {legacy_ms:>12.3f} {indexed_ms:>12.3f} "
+              f"{legacy_ms / indexed_ms:>9.1f}x")
+        await manager.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
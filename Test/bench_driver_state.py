@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-memory driver location cache: memory held by 100k active
+drivers and the cost of one location update, for the old per-update dict
+(ISO string and datetime formatted on every ping) vs DriverState records
+updated in place.
+
+Run from the backend root:
+    python Test/bench_driver_state.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService, DriverState
+
+DRIVER_COUNTS = [10_000, 100_000]
+UPDATES = 200_000
+
+
+def legacy_entry(latitude: float, longitude: float) -> dict:
+    """Cache entry as stored before DriverState."""
+    now = datetime.now()
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": now.isoformat(),
+        "last_seen": now,
+        "velocity": {"north_mps": 3.2, "east_mps": -1.5},
+    }
+
+
+def state_entry(latitude: float, longitude: float) -> DriverState:
+    return DriverState(latitude, longitude, time.monotonic(), 3.2, -1.5)
+
+
+def cache_bytes(make_entry, count: int) -> int:
+    rng = random.Random(count)
+    positions = [(23.8103 + rng.uniform(-0.5, 0.5), 90.4125 + rng.uniform(-0.5, 0.5)) for _ in range(count)]
+    tracemalloc.start()
+    cache = {driver_id: make_entry(*positions[driver_id]) for driver_id in range(count)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cache
+    return size
+
+
+def legacy_update_us(count: int) -> float:
+    cache = {driver_id: legacy_entry(23.81, 90.41) for driver_id in range(count)}
+    start = time.perf_counter()
+    for index in range(UPDATES):
+        driver_id = index % count
+        cache[driver_id] = legacy_entry(23.81 + index * 1e-7, 90.41)
+        cache[driver_id]["velocity"] = {"north_mps": 3.2, "east_mps": -1.5}
+    return (time.perf_counter() - start) * 1e6 / UPDATES
+
+
+def state_update_us(count: int) -> float:
+    cache = {driver_id: state_entry(23.81, 90.41) for driver_id in range(count)}
+    start = time.perf_counter()
+    for index in range(UPDATES):
+        state = cache[index % count]
+        state.latitude = 23.81 + index * 1e-7
+        state.longitude = 90.41
+        state.seen_at = time.monotonic()
+        state.north_mps = 3.2
+        state.east_mps = -1.5
+    return (time.perf_counter() - start) * 1e6 / UPDATES
+
+
+def service_update_us(count: int) -> float:
+    """Full _cache_location path including the spatial indexes."""
+    service = DriverLocationService()
+    velocity = {"north_mps": 3.2, "east_mps": -1.5}
+    for driver_id in range(count):
+        service._cache_location(driver_id, 23.81, 90.41, velocity)
+    start = time.perf_counter()
+    for index in range(UPDATES):
+        service._cache_location(index % count, 23.81 + index * 1e-7, 90.41, velocity)
+    return (time.perf_counter() - start) * 1e6 / UPDATES
+
+
+def main():
+    print("📊 Driver cache memory")
+    print("=" * 64)
+    print(f"{'drivers':>10} {'dict MB':>10} {'state MB':>10} {'bytes/driver':>14} {'saved':>8}")
+    for count in DRIVER_COUNTS:
+        legacy = cache_bytes(legacy_entry, count)
+        compact = cache_bytes(state_entry, count)
+        print(f"{count:>10} {legacy / 2**20:10.1f} {compact / 2**20:10.1f} "
+              f"{legacy // count:>6} -> {compact // count:<5} {(1 - compact / legacy) * 100:7.1f}%")
+
+    count = DRIVER_COUNTS[-1]
+    print(f"\n📍 Cost of one location update ({count} drivers, {UPDATES} updates)")
+    print("=" * 64)
+    legacy = legacy_update_us(count)
+    compact = state_update_us(count)
+    print(f"{'new dict + isoformat':>32} {legacy:8.3f} µs")
+    print(f"{'DriverState in place':>32} {compact:8.3f} µs  ({legacy / compact:.1f}x)")
+    print(f"{'_cache_location (with indexes)':>32} {service_update_us(count):8.3f} µs")
+
+
+if __name__ == "__main__":
+    main()
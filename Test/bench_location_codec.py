@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark driver location updates over /ws: JSON frames vs the binary
+location subprotocol.
+
+For each update the server decodes the driver's frame, builds the
+acknowledgement and builds the driver-location frame riders receive. Bytes
+are counted per update for all three frames; CPU time is process time for
+UPDATES updates, excluding sockets and the location service.
+
+Run from the backend root:
+    python Test/bench_location_codec.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_codec import (
+    FRAME_DRIVER_LOCATION,
+    FRAME_LOCATION_ACK,
+    FRAME_LOCATION_UPDATE,
+    LocationFrame,
+    decode_frame,
+    encode_frame,
+    now_ms,
+)
+from schema import WSLocationUpdate
+from serialization import JSON_BACKEND, dumps_text, loads
+
+UPDATES = 10_000
+REPEATS = 5
+
+
+def json_updates(count: int):
+    """update-location frames as the driver app sends them."""
+    rng = random.Random(count)
+    return [
+        dumps_text({
+            "type": "update-location",
+            "data": {
+                "driver_id": rng.randint(1, 5000),
+                "latitude": 23.8103 + rng.uniform(-0.2, 0.2),
+                "longitude": 90.4125 + rng.uniform(-0.2, 0.2),
+            },
+            "timestamp": datetime.now().isoformat(),
+        })
+        for _ in range(count)
+    ]
+
+
+def binary_updates(count: int):
+    rng = random.Random(count)
+    return [
+        encode_frame(FRAME_LOCATION_UPDATE, LocationFrame(
+            rng.randint(1, 5000),
+            23.8103 + rng.uniform(-0.2, 0.2),
+            90.4125 + rng.uniform(-0.2, 0.2),
+            now_ms(),
+        ))
+        for _ in range(count)
+    ]
+
+
+def handle_json(raw: str):
+    """Server work on the JSON path (see ws_handlers._update_location)."""
+    message = loads(raw)
+    data = WSLocationUpdate.model_validate(message["data"]).payload()
+    location = {
+        "driver_id": data["driver_id"],
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "timestamp": message.get("timestamp") or datetime.now().isoformat(),
+    }
+    ack = dumps_text({
+        "type": "location_updated",
+        "message": f"Location updated for driver {data['driver_id']}",
+        "data": location,
+    })
+    broadcast = dumps_text({"type": "driver-location", "data": location})
+    return ack, broadcast
+
+
+def handle_binary(frame: bytes):
+    """Server work on the binary path (see ws_handlers.handle_location_frame)."""
+    _, location = decode_frame(frame)
+    return encode_frame(FRAME_LOCATION_ACK, location), encode_frame(FRAME_DRIVER_LOCATION, location)
+
+
+def cpu_ms(handle, frames) -> float:
+    best = None
+    for _ in range(REPEATS):
+        start = time.process_time()
+        for frame in frames:
+            handle(frame)
+        elapsed = (time.process_time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def average_bytes(frames) -> float:
+    return sum(len(frame.encode("utf-8") if isinstance(frame, str) else frame) for frame in frames) / len(frames)
+
+
+def main():
+    json_frames = json_updates(UPDATES)
+    binary_frames = binary_updates(UPDATES)
+    json_out = [handle_json(frame) for frame in json_frames]
+    binary_out = [handle_binary(frame) for frame in binary_frames]
+
+    print(f"📊 Driver location update: JSON (backend: {JSON_BACKEND}) vs binary frames")
+    print("=" * 72)
+    print(f"{'bytes per update':>28} {'JSON':>10} {'binary':>10} {'ratio':>8}")
+    rows = [
+        ("driver -> server", json_frames, binary_frames),
+        ("server -> driver (ack)", [ack for ack, _ in json_out], [ack for ack, _ in binary_out]),
+        ("server -> each rider", [out for _, out in json_out], [out for _, out in binary_out]),
+    ]
+    for label, json_side, binary_side in rows:
+        json_bytes = average_bytes(json_side)
+        binary_bytes = average_bytes(binary_side)
+        print(f"{label:>28} {json_bytes:10.1f} {binary_bytes:10.1f} {json_bytes / binary_bytes:7.1f}x")
+
+    json_cpu = cpu_ms(handle_json, json_frames)
+    binary_cpu = cpu_ms(handle_binary, binary_frames)
+    print(f"\n⏱️ Server CPU per {UPDATES} updates (best of {REPEATS})")
+    print(f"{'JSON':>28} {json_cpu:10.1f} ms")
+    print(f"{'binary':>28} {binary_cpu:10.1f} ms")
+    print(f"{'speedup':>28} {json_cpu / binary_cpu:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
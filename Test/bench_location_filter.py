@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Simulate drivers reporting every 5 seconds and measure how many updates the
+location filter lets through, and how far a rider's extrapolated marker is
+from the driver's reported position.
+
+Half the fleet is parked with GPS jitter; the rest drive straight legs at
+city speeds with occasional turns and stops.
+
+Run from the backend root:
+    python Test/bench_location_filter.py
+"""
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_filter import METRES_PER_DEGREE, LocationUpdateFilter
+
+DRIVERS = 200
+REPORT_INTERVAL_S = 5
+DURATION_S = 3600
+GPS_JITTER_M = 4
+MAX_ERRORS_M = [10, 25, 50]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(max_error_m: float, seed: int = 7):
+    rng = random.Random(seed)
+    clock = Clock()
+    update_filter = LocationUpdateFilter(
+        min_interval_ms=1000, max_error_m=max_error_m, max_silence_s=30, clock=clock)
+
+    drivers = []
+    for driver_id in range(DRIVERS):
+        drivers.append({
+            "id": driver_id,
+            "north": rng.uniform(-5000, 5000),
+            "east": rng.uniform(-5000, 5000),
+            "speed": 0.0 if driver_id % 2 == 0 else rng.uniform(6, 15),
+            "heading": rng.uniform(0, 2 * math.pi),
+        })
+    # What riders last received per driver: (north, east, at, north_mps, east_mps)
+    rider_view = {}
+    worst_error = 0.0
+    errors = []
+
+    for tick in range(0, DURATION_S, REPORT_INTERVAL_S):
+        clock.now = float(tick)
+        for driver in drivers:
+            if driver["speed"] and rng.random() < 0.05:
+                driver["heading"] += rng.choice([-math.pi / 2, math.pi / 2])
+            if driver["id"] % 2 and rng.random() < 0.02:
+                driver["speed"] = 0.0 if driver["speed"] else rng.uniform(6, 15)
+            driver["north"] += math.cos(driver["heading"]) * driver["speed"] * REPORT_INTERVAL_S
+            driver["east"] += math.sin(driver["heading"]) * driver["speed"] * REPORT_INTERVAL_S
+            north = driver["north"] + rng.gauss(0, GPS_JITTER_M)
+            east = driver["east"] + rng.gauss(0, GPS_JITTER_M)
+
+            latitude = 23.8 + north / METRES_PER_DEGREE
+            longitude = 90.4 + east / (METRES_PER_DEGREE * math.cos(math.radians(23.8)))
+            decision = update_filter.check(driver["id"], latitude, longitude)
+            if decision.accepted:
+                velocity = decision.velocity
+                rider_view[driver["id"]] = (north, east, clock.now, velocity["north_mps"], velocity["east_mps"])
+            seen = rider_view[driver["id"]]
+            elapsed = clock.now - seen[2]
+            error = math.hypot(seen[0] + seen[3] * elapsed - north, seen[1] + seen[4] * elapsed - east)
+            errors.append(error)
+            worst_error = max(worst_error, error)
+
+    errors.sort()
+    return update_filter.metrics(), errors[int(len(errors) * 0.99)], worst_error
+
+
+def main():
+    updates = DRIVERS * DURATION_S // REPORT_INTERVAL_S
+    print(f"📊 Location filter: {DRIVERS} drivers, one report every {REPORT_INTERVAL_S} s for {DURATION_S // 60} min "
+          f"({updates} updates)")
+    print("=" * 84)
+    print(f"{'max error m':>12} {'accepted':>10} {'suppressed':>11} {'writes saved':>13} "
+          f"{'p99 error m':>12} {'worst m':>9}")
+    for max_error_m in MAX_ERRORS_M:
+        metrics, p99, worst = simulate(max_error_m)
+        print(f"{max_error_m:>12} {metrics['accepted']:>10} {metrics['suppressed']:>11} "
+              f"{metrics['suppressed_ratio'] * 100:12.1f}% {p99:12.1f} {worst:9.1f}")
+    print("\nAccepted updates are the only ones written to the database and fanned out to riders.")
+
+
+if __name__ == "__main__":
+    main()
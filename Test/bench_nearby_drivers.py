@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark nearby-driver queries: the old linear haversine scan, the scalar
+grid scan and the grid + vectorized NumPy path.
+
+Run from the backend root:
+    python Test/bench_nearby_drivers.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService
+
+# Dhaka-sized service area
+BASE_LAT = 23.8103
+BASE_LNG = 90.4125
+SPREAD_DEG = 0.5
+FLEET_SIZES = [1_000, 10_000, 100_000]
+QUERIES = 50
+RADIUS_KM = 5.0
+
+
+def build_service(fleet_size: int) -> DriverLocationService:
+    """Populate the in-memory cache without touching the database."""
+    service = DriverLocationService()
+    rng = random.Random(fleet_size)
+    for driver_id in range(1, fleet_size + 1):
+        service._cache_location(
+            driver_id,
+            BASE_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+            BASE_LNG + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+        )
+    return service
+
+
+def linear_scan(service: DriverLocationService, latitude: float, longitude: float, radius_km: float):
+    """The pre-index implementation: haversine over every active driver."""
+    nearby_drivers = []
+    for driver_id, location_data in service.get_all_active_drivers().items():
+        distance = service._calculate_distance(
+            latitude, longitude,
+            location_data.latitude, location_data.longitude
+        )
+        if distance <= radius_km:
+            nearby_drivers.append({
+                "driver_id": driver_id,
+                "latitude": location_data.latitude,
+                "longitude": location_data.longitude,
+                "timestamp": location_data.iso_timestamp(),
+                "distance_km": round(distance, 2)
+            })
+    nearby_drivers.sort(key=lambda x: x["distance_km"])
+    return nearby_drivers
+
+
+def scalar_grid_scan(service: DriverLocationService, latitude: float, longitude: float, radius_km: float):
+    """Grid candidates with a per-driver Python haversine."""
+    nearby_drivers = []
+    for driver_id in service.spatial_index.candidates(latitude, longitude, radius_km):
+        location_data = service.active_drivers[driver_id]
+        distance = service._calculate_distance(
+            latitude, longitude,
+            location_data.latitude, location_data.longitude
+        )
+        if distance <= radius_km:
+            nearby_drivers.append({
+                "driver_id": driver_id,
+                "latitude": location_data.latitude,
+                "longitude": location_data.longitude,
+                "timestamp": location_data.iso_timestamp(),
+                "distance_km": round(distance, 2)
+            })
+    nearby_drivers.sort(key=lambda x: x["distance_km"])
+    return nearby_drivers
+
+
+def time_queries(fn, points) -> float:
+    start = time.perf_counter()
+    for latitude, longitude in points:
+        fn(latitude, longitude, RADIUS_KM)
+    return (time.perf_counter() - start) / len(points) * 1000
+
+
+def main():
+    print("🧪 Nearby driver query benchmark")
+    print("=" * 60)
+    print(f"{'drivers':>10} {'linear ms':>12} {'grid ms':>12} {'numpy ms':>12} "
+          f"{'top-10 ms':>12} {'speedup':>10} {'hits':>8}")
+
+    rng = random.Random(42)
+    points = [
+        (BASE_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+         BASE_LNG + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+        for _ in range(QUERIES)
+    ]
+
+    for fleet_size in FLEET_SIZES:
+        service = build_service(fleet_size)
+
+        # Both paths must agree before we compare their speed
+        expected = linear_scan(service, *points[0], RADIUS_KM)
+        actual = service.find_nearby_drivers(*points[0], RADIUS_KM)
+        assert sorted(d["driver_id"] for d in expected) == sorted(d["driver_id"] for d in actual)
+
+        linear_ms = time_queries(lambda a, b, r: linear_scan(service, a, b, r), points)
+        grid_ms = time_queries(lambda a, b, r: scalar_grid_scan(service, a, b, r), points)
+        numpy_ms = time_queries(service.find_nearby_drivers, points)
+        top_ms = time_queries(lambda a, b, r: service.find_nearby_drivers(a, b, r, limit=10), points)
+        print(f"{fleet_size:>10} {linear_ms:>12.3f} {grid_ms:>12.3f} {numpy_ms:>12.3f} "
+              f"{top_ms:>12.3f} {linear_ms / numpy_ms:>9.1f}x {len(actual):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark notification persistence for bursts of /ws bid traffic: one ORM
+session and commit per notification on the DB executor (the sync path)
+vs NotificationWriter micro-batches in each durability mode.
+
+Runs against a file-backed SQLite database so every commit pays for a
+journal sync, as it would on PostgreSQL.
+
+Run from the backend root:
+    python Test/bench_notification_writer.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from models import Notification
+from notification_writer import NotificationWriter
+from ws_repository import DB_EXECUTOR_WORKERS, notification_row
+
+NOTIFICATIONS = 2000
+HANDLERS = [1, 10, 50]
+
+
+def make_engine(directory: str, name: str):
+    engine = create_engine(
+        f"sqlite:///{os.path.join(directory, name)}.db",
+        connect_args={"check_same_thread": False, "timeout": 60},
+    )
+    Notification.__table__.create(engine)
+    return engine
+
+
+def bid(index: int) -> dict:
+    return {
+        "recipient_id": index % 100,
+        "recipient_type": "rider",
+        "sender_id": index,
+        "notification_type": "bid",
+        "title": "Driver Bid Received",
+        "message": f"Driver offered ৳{300 + index} for your trip",
+        "bid_amount": 300 + index,
+    }
+
+
+def insert_one(engine, notification_data: dict) -> int:
+    """What ws_repository.insert_notification does, against the benchmark engine."""
+    with Session(engine) as session:
+        notification = Notification(**notification_row(notification_data))
+        session.add(notification)
+        session.commit()
+        return notification.notification_id
+
+
+async def drive(save, handlers: int) -> tuple:
+    """Run NOTIFICATIONS saves split across concurrent handlers; return (seconds, latencies)."""
+    latencies = []
+
+    async def handler(offset: int):
+        for index in range(offset, NOTIFICATIONS, handlers):
+            sent = time.perf_counter()
+            await save(bid(index))
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(offset) for offset in range(handlers)))
+    return time.perf_counter() - start, latencies
+
+
+async def run_sync(engine, handlers: int) -> tuple:
+    executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS)
+    loop = asyncio.get_running_loop()
+    try:
+        return await drive(
+            lambda data: loop.run_in_executor(executor, insert_one, engine, data), handlers)
+    finally:
+        executor.shutdown()
+
+
+async def run_writer(engine, handlers: int, durability: str) -> tuple:
+    writer = NotificationWriter(engine, durability=durability)
+    await writer.start()
+    elapsed, latencies = await drive(writer.save, handlers)
+    # Background rows still count toward the time to persist everything
+    start = time.perf_counter()
+    await writer.stop()
+    return elapsed + time.perf_counter() - start, latencies
+
+
+def count_rows(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Notification.__table__)).scalar_one()
+
+
+def main():
+    print(f"📊 Persisting {NOTIFICATIONS} notifications")
+    print("=" * 78)
+    print(f"{'path':<24} {'handlers':>8} {'notif/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for handlers in HANDLERS:
+            baseline = None
+            for label, runner in [
+                ("one commit each", lambda engine: run_sync(engine, handlers)),
+                ("batched, commit", lambda engine: run_writer(engine, handlers, "commit")),
+                ("batched, async", lambda engine: run_writer(engine, handlers, "async")),
+            ]:
+                engine = make_engine(directory, f"{label.replace(' ', '_').replace(',', '')}_{handlers}")
+                elapsed, latencies = asyncio.run(runner(engine))
+                assert count_rows(engine) == NOTIFICATIONS
+                engine.dispose()
+                throughput = NOTIFICATIONS / elapsed
+                baseline = baseline or throughput
+                ordered = sorted(latencies)
+                print(f"{label:<24} {handlers:>8} {throughput:10.0f} {statistics.median(ordered):9.2f} "
+                      f"{ordered[int(0.99 * (len(ordered) - 1))]:9.2f} {throughput / baseline:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
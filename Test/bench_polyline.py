@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark trip route simplification and encoding on a 10k-point trace:
+recursive pure-Python Douglas-Peucker vs the vectorized one in polyline.py,
+and route payload size as raw coordinate JSON vs an encoded polyline at
+several map zoom levels.
+
+The trace is an ambulance driving city blocks with GPS jitter, sampled
+once a second.
+
+Run from the backend root:
+    python Test/bench_polyline.py
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline import EARTH_RADIUS_M, encode_polyline, simplify, tolerance_for_zoom
+from serialization import dumps_text
+
+POINTS = 10_000
+ZOOMS = [11, 13, 15, 17]
+REPEATS = 5
+
+
+def city_trace(count: int, seed: int = 5):
+    rng = random.Random(seed)
+    metres_per_degree = math.radians(1) * EARTH_RADIUS_M
+    north = east = 0.0
+    heading = 0.0
+    points = []
+    for _ in range(count):
+        if rng.random() < 0.01:
+            heading += rng.choice([-math.pi / 2, math.pi / 2])
+        speed = rng.uniform(5, 15)
+        north += math.cos(heading) * speed
+        east += math.sin(heading) * speed
+        latitude = 23.8 + (north + rng.gauss(0, 3)) / metres_per_degree
+        longitude = 90.4 + (east + rng.gauss(0, 3)) / (metres_per_degree * math.cos(math.radians(23.8)))
+        points.append((latitude, longitude))
+    return points
+
+
+def recursive_simplify(points, tolerance_m):
+    """Textbook Douglas-Peucker with a per-point Python loop."""
+    scale = math.radians(1) * EARTH_RADIUS_M
+    cos_lat = math.cos(math.radians(points[0][0]))
+    xy = [(longitude * scale * cos_lat, latitude * scale) for latitude, longitude in points]
+
+    def segment_distance(point, start, end):
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            return math.hypot(point[0] - start[0], point[1] - start[1])
+        t = max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length_sq))
+        return math.hypot(point[0] - start[0] - t * dx, point[1] - start[1] - t * dy)
+
+    def recurse(first, last, keep):
+        worst, index = 0.0, None
+        for middle in range(first + 1, last):
+            distance = segment_distance(xy[middle], xy[first], xy[last])
+            if distance > worst:
+                worst, index = distance, middle
+        if index is not None and worst > tolerance_m:
+            keep.add(index)
+            recurse(first, index, keep)
+            recurse(index, last, keep)
+
+    keep = {0, len(points) - 1}
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), len(points) + 100))
+    recurse(0, len(points) - 1, keep)
+    return [points[index] for index in sorted(keep)]
+
+
+def time_ms(fn, repeats: int = REPEATS) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main():
+    points = city_trace(POINTS)
+    raw_json = dumps_text([{"latitude": lat, "longitude": lon} for lat, lon in points])
+    raw_kb = len(raw_json) / 1024
+
+    print(f"📊 Route simplification, {POINTS} points (raw JSON {raw_kb:.1f} KB)")
+    print("=" * 90)
+    print(f"{'zoom':>5} {'tol m':>7} {'kept':>6} {'python ms':>10} {'numpy ms':>9} {'speedup':>8} "
+          f"{'encode ms':>10} {'polyline KB':>12} {'smaller':>8}")
+    for zoom in ZOOMS:
+        tolerance_m = tolerance_for_zoom(zoom, points[0][0])
+        kept = simplify(points, tolerance_m)
+        assert kept == recursive_simplify(points, tolerance_m)
+        python_ms = time_ms(lambda: recursive_simplify(points, tolerance_m), repeats=1)
+        numpy_ms = time_ms(lambda: simplify(points, tolerance_m))
+        encode_ms = time_ms(lambda: encode_polyline(kept))
+        encoded_kb = len(encode_polyline(kept)) / 1024
+        print(f"{zoom:>5} {tolerance_m:7.2f} {len(kept):>6} {python_ms:10.1f} {numpy_ms:9.2f} "
+              f"{python_ms / numpy_ms:7.1f}x {encode_ms:10.3f} {encoded_kb:12.2f} {raw_kb / encoded_kb:7.0f}x")
+
+    unsimplified_kb = len(encode_polyline(points)) / 1024
+    print(f"\nEncoding alone (no simplification): {unsimplified_kb:.1f} KB, "
+          f"{raw_kb / unsimplified_kb:.1f}x smaller than raw JSON")
+
+
+if __name__ == "__main__":
+    main()
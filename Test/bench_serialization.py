@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON encode cost for the notification list and the nearby-drivers
+list: stdlib json vs the serialization module, and encoding a broadcast once
+vs once per recipient.
+
+Run from the backend root:
+    python Test/bench_serialization.py
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import JSON_BACKEND, dumps_text
+
+NOTIFICATION_COUNTS = [50, 200, 1_000]
+DRIVER_COUNTS = [100, 1_000, 10_000]
+RIDERS = 200
+REPEATS = 20
+
+
+def notification_list(count: int) -> dict:
+    """Same shape as the GET /notifications response."""
+    now = datetime.now()
+    return {
+        "success": True,
+        "notifications": [
+            {
+                "notification_id": index,
+                "recipient_id": 7,
+                "recipient_type": "rider",
+                "sender_id": 1000 + index,
+                "sender_type": "driver",
+                "notification_type": "bid_offer",
+                "title": "New Bid Received",
+                "message": f"Driver {1000 + index} offered ৳{300 + index} for your trip",
+                "req_id": 42,
+                "trip_id": index,
+                "bid_amount": 300.0 + index,
+                "original_amount": 250.0,
+                "status": "unread",
+                "timestamp": (now - timedelta(minutes=index)).isoformat(),
+                "pickup_location": "Dhanmondi 27, Dhaka",
+                "destination": "Square Hospital, Panthapath",
+            }
+            for index in range(count)
+        ],
+    }
+
+
+def nearby_drivers(count: int) -> dict:
+    """Same shape as the nearby-drivers WebSocket message."""
+    rng = random.Random(count)
+    now = datetime.now().isoformat()
+    return {
+        "type": "nearby-drivers",
+        "data": [
+            {
+                "id": driver_id,
+                "latitude": 23.8103 + rng.uniform(-0.5, 0.5),
+                "longitude": 90.4125 + rng.uniform(-0.5, 0.5),
+                "timestamp": now,
+            }
+            for driver_id in range(1, count + 1)
+        ],
+    }
+
+
+def time_ms(fn, repeats: int = REPEATS) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def compare(label: str, payload: dict):
+    stdlib = time_ms(lambda: json.dumps(payload))
+    fast = time_ms(lambda: dumps_text(payload))
+    size_kb = len(dumps_text(payload).encode("utf-8")) / 1024
+    print(f"{label:>28} {size_kb:9.1f} {stdlib:11.3f} {fast:11.3f} {stdlib / fast:8.1f}x")
+
+
+def main():
+    print(f"📊 JSON encode cost (backend: {JSON_BACKEND})")
+    print("=" * 72)
+    print(f"{'payload':>28} {'size KB':>9} {'json ms':>11} {'fast ms':>11} {'speedup':>9}")
+    for count in NOTIFICATION_COUNTS:
+        compare(f"notifications x{count}", notification_list(count))
+    for count in DRIVER_COUNTS:
+        compare(f"nearby-drivers x{count}", nearby_drivers(count))
+
+    print(f"\n📡 Broadcasting nearby-drivers to {RIDERS} riders")
+    print("=" * 72)
+    print(f"{'drivers':>10} {'per-recipient ms':>18} {'encode-once ms':>16} {'speedup':>9}")
+    for count in DRIVER_COUNTS:
+        payload = nearby_drivers(count)
+        per_recipient = time_ms(
+            lambda: [json.dumps(payload) for _ in range(RIDERS)], repeats=1)
+        once = time_ms(lambda: [dumps_text(payload)] * RIDERS, repeats=1)
+        print(f"{count:>10} {per_recipient:18.3f} {once:16.3f} {per_recipient / once:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
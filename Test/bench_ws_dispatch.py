@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-frame dispatch cost on /ws: the old if/elif chain over
+message types vs the registry dispatcher, without and with payload
+validation.
+
+Handlers are no-ops so only decoding, routing and validation are timed.
+
+Run from the backend root:
+    python Test/bench_ws_dispatch.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema import WSBid, WSDriverBidOffer, WSLocationUpdate, WSTrip, WSTripLocationUpdate
+from serialization import loads
+from ws_dispatch import MessageDispatcher, WSContext
+
+FRAMES = 20_000
+
+# Order of the branches in the old endpoint
+CHAIN_TYPES = [
+    "ping", "new-client", "add-location", "driver-location", "update-location",
+    "nearby-drivers-resync", "subscribe-area", "unsubscribe-area", "new-trip-request",
+    "bid-from-driver", "driver-bid-offer", "rider-counter-offer", "driver-counter-offer",
+    "bid-accepted", "bid-accepted-for-confirmation", "trip-confirmed-by-driver",
+    "trip-cancelled-by-driver", "bid-rejected", "trip-location-update", "trip-ended",
+    "end-emergency-request", "end-emergency-confirmed", "end-emergency-cancelled", "broadcast",
+]
+
+MODELS = {
+    "add-location": WSLocationUpdate,
+    "driver-location": WSLocationUpdate,
+    "update-location": WSLocationUpdate,
+    "bid-from-driver": WSBid,
+    "driver-bid-offer": WSDriverBidOffer,
+    "bid-rejected": WSBid,
+    "trip-location-update": WSTripLocationUpdate,
+    "trip-ended": WSTrip,
+}
+
+SAMPLES = {
+    "ping": {"type": "ping", "timestamp": 1700000000000},
+    "update-location": {
+        "type": "update-location",
+        "data": {"driver_id": 17, "latitude": 23.8103, "longitude": 90.4125},
+        "timestamp": "2024-01-01T10:00:00",
+    },
+    "driver-bid-offer": {
+        "type": "driver-bid-offer",
+        "data": {
+            "req_id": 42, "rider_id": 7, "driver_id": 17, "amount": 650,
+            "driver_name": "Karim", "driver_mobile": "01712345678",
+            "pickup_location": "Dhanmondi 27", "destination": "Square Hospital",
+        },
+    },
+    "trip-location-update": {
+        "type": "trip-location-update",
+        "data": {
+            "trip_id": 9, "rider_id": 7, "driver_id": 17,
+            "driver_location": {"latitude": 23.81, "longitude": 90.41},
+        },
+    },
+}
+
+
+class NullWebSocket:
+    async def send_text(self, message: str):
+        pass
+
+
+async def noop(*args):
+    pass
+
+
+async def chain_dispatch(raw: str) -> None:
+    """Stand-in for the old endpoint: json.loads, then compare against each branch in order."""
+    message_data = json.loads(raw)
+    message_type = message_data.get("type", "unknown")
+    for candidate in CHAIN_TYPES:
+        if message_type == candidate:
+            await noop(message_data.get("data", {}))
+            return
+
+
+def build_dispatcher(validate: bool = True) -> MessageDispatcher:
+    dispatcher = MessageDispatcher()
+    for message_type in CHAIN_TYPES:
+        dispatcher.register(message_type, MODELS.get(message_type) if validate else None)(noop)
+    return dispatcher
+
+
+async def time_per_frame_us(dispatch, raw: str) -> float:
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        await dispatch(raw)
+    return (time.perf_counter() - start) * 1_000_000 / FRAMES
+
+
+async def main():
+    dispatcher = build_dispatcher()
+    unvalidated = build_dispatcher(validate=False)
+    ctx = WSContext(NullWebSocket(), "bench")
+
+    async def registry_dispatch(raw: str) -> None:
+        await dispatcher.dispatch(ctx, loads(raw))
+
+    async def routing_only(raw: str) -> None:
+        await unvalidated.dispatch(ctx, loads(raw))
+
+    print(f"📊 /ws dispatch cost per frame ({FRAMES} frames each, no-op handlers)")
+    print("=" * 72)
+    print(f"{'message type':>24} {'branch':>7} {'if/elif us':>11} {'routing us':>11} {'validated us':>13}")
+    for message_type, message in SAMPLES.items():
+        raw = json.dumps(message)
+        before = await time_per_frame_us(chain_dispatch, raw)
+        routed = await time_per_frame_us(routing_only, raw)
+        after = await time_per_frame_us(registry_dispatch, raw)
+        branch = CHAIN_TYPES.index(message_type) + 1
+        validated = f"{after:13.2f}" if message_type in MODELS else f"{'-':>13}"
+        print(f"{message_type:>24} {branch:>7} {before:11.2f} {routed:11.2f} {validated}")
+
+    print("\n⏱️ Handling latency recorded by the dispatcher")
+    for message_type, stats in dispatcher.metrics()["latency"].items():
+        print(f"{message_type:>24} count {stats['count']:>6}  avg {stats['avg_ms']} ms  p99 <= {stats['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+"""
+Shared helpers for the tests that run against an in-memory SQLite database.
+
+Test modules import these directly, so they also work when a test file is run
+as a script.
+"""
+from sqlalchemy import Table, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+
+def make_sqlite_engine(*tables: Table) -> Engine:
+    """
+    Create an in-memory SQLite engine holding the given tables.
+
+    StaticPool keeps one connection, so every session and background thread
+    sees the same database.
+
+    Args:
+        *tables: Tables to create, e.g. Notification.__table__
+
+    Returns:
+        Engine: The engine
+    """
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    for table in tables:
+        table.create(engine)
+    return engine
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Load test: find where the database connection pool saturates under
+concurrent POST /trip-requests and /ws driver-bid-offer traffic.
+
+Start the API first (uvicorn api:app --port 8000), then run:
+    python Test/load_test_db_pool.py
+
+Each step doubles the number of HTTP and WebSocket clients and reads the
+db_pool section of /internal/metrics before and after. While the pool keeps
+up, checkout waits stay near zero and throughput grows with concurrency;
+past saturation in_use sits at pool_size + max_overflow, checkout waits
+climb and request latency grows without more throughput. Compare runs with
+different DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_PRE_PING settings on the server.
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+import websockets
+
+# Configuration
+BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000")
+WS_URL = os.getenv("WS_URL", "ws://127.0.0.1:8000/ws")
+RIDER_LOGIN = os.getenv("RIDER_LOGIN", "rider@test.com")
+RIDER_PASSWORD = os.getenv("RIDER_PASSWORD", "password123")
+CONCURRENCY_STEPS = [int(step) for step in os.getenv("CONCURRENCY_STEPS", "2,4,8,16,32,64").split(",")]
+STEP_SECONDS = float(os.getenv("STEP_SECONDS", "10"))
+
+# Existing rows used by the bid payloads
+REQ_ID = int(os.getenv("REQ_ID", "1"))
+RIDER_ID = int(os.getenv("RIDER_ID", "1"))
+DRIVER_ID = int(os.getenv("DRIVER_ID", "1"))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    response = await client.post(f"{BASE_URL}/auth/login", json={
+        "phone_or_email": RIDER_LOGIN,
+        "password": RIDER_PASSWORD,
+        "user_type": "rider",
+    })
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+async def pool_metrics(client: httpx.AsyncClient) -> dict:
+    response = await client.get(f"{BASE_URL}/internal/metrics")
+    return response.json()["db_pool"]
+
+
+async def trip_request_client(client: httpx.AsyncClient, token: str, stop: asyncio.Event,
+                              latencies: list, errors: list):
+    """Create trip requests back to back; each one inserts a row and broadcasts it."""
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        sent = time.perf_counter()
+        try:
+            response = await client.post(f"{BASE_URL}/trip-requests", headers=headers, json={
+                "pickup_location": "Load Test Pickup",
+                "destination": "Load Test Hospital",
+                "fare": 300.0,
+                "latitude": 23.8103,
+                "longitude": 90.4125,
+            })
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - sent) * 1000)
+            else:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+async def bid_client(stop: asyncio.Event, counter: list):
+    """Send driver bids, each of which runs several queries on the DB executor."""
+    async with websockets.connect(WS_URL) as websocket:
+        await websocket.recv()  # connection_established
+        amount = 300
+        while not stop.is_set():
+            amount += 1
+            await websocket.send(json.dumps({
+                "type": "driver-bid-offer",
+                "data": {
+                    "req_id": REQ_ID,
+                    "rider_id": RIDER_ID,
+                    "driver_id": DRIVER_ID,
+                    "driver_name": "Load Test Driver",
+                    "amount": amount,
+                }
+            }))
+            counter[0] += 1
+            await asyncio.sleep(0.01)
+
+
+async def run_step(client: httpx.AsyncClient, token: str, concurrency: int) -> dict:
+    stop = asyncio.Event()
+    latencies, errors, bids = [], [], [0]
+    before = await pool_metrics(client)
+    tasks = [asyncio.create_task(trip_request_client(client, token, stop, latencies, errors))
+             for _ in range(concurrency)]
+    tasks += [asyncio.create_task(bid_client(stop, bids)) for _ in range(concurrency)]
+
+    # Sample occupancy while the step runs
+    peak_in_use = peak_overflow = 0
+    deadline = time.monotonic() + STEP_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        current = await pool_metrics(client)
+        peak_in_use = max(peak_in_use, current.get("in_use", 0))
+        peak_overflow = max(peak_overflow, current.get("overflow", 0))
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    after = await pool_metrics(client)
+
+    checkouts = after.get("checkouts", 0) - before.get("checkouts", 0)
+    wait_ms = after.get("total_wait_ms", 0) - before.get("total_wait_ms", 0)
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": len(latencies) / STEP_SECONDS,
+        "bids_per_s": bids[0] / STEP_SECONDS,
+        "p50_ms": statistics.median(latencies) if latencies else float("nan"),
+        "p99_ms": percentile(latencies, 99),
+        "errors": len(errors),
+        "peak_in_use": peak_in_use,
+        "peak_overflow": peak_overflow,
+        "mean_wait_ms": wait_ms / checkouts if checkouts else 0.0,
+        "p99_wait_ms": after.get("p99_wait_ms", 0.0),
+        "timeouts": after.get("timeouts", 0) - before.get("timeouts", 0),
+        "capacity": after.get("pool_size", 0) + after.get("max_overflow", 0),
+    }
+
+
+async def main():
+    print("🧪 Connection pool saturation under /trip-requests and /ws load")
+    print("=" * 104)
+    async with httpx.AsyncClient(timeout=30) as client:
+        token = await login(client)
+        print(f"{'clients':>8} {'req/s':>8} {'bids/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+              f"{'in use':>7} {'overflow':>9} {'wait ms':>8} {'p99 wait':>9} {'timeouts':>9}")
+        saturated_at = None
+        for concurrency in CONCURRENCY_STEPS:
+            step = await run_step(client, token, concurrency)
+            print(f"{step['concurrency']:>8} {step['requests_per_s']:8.1f} {step['bids_per_s']:8.1f} "
+                  f"{step['p50_ms']:8.1f} {step['p99_ms']:8.1f} {step['errors']:>7} "
+                  f"{step['peak_in_use']:>3}/{step['capacity']:<3} {step['peak_overflow']:>9} "
+                  f"{step['mean_wait_ms']:8.2f} {step['p99_wait_ms']:9.2f} {step['timeouts']:>9}")
+            if saturated_at is None and step["peak_in_use"] >= step["capacity"]:
+                saturated_at = concurrency
+
+    if saturated_at is None:
+        print("\n💡 The pool never ran out of connections; the bottleneck is elsewhere")
+    else:
+        print(f"\n💡 Every pooled connection was in use from {saturated_at} clients of each kind; "
+              f"checkout waits above this point are time spent queueing for the pool")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Load test: ping/pong latency on /ws while other sockets write driver bids.
+
+Start the API first (uvicorn api:app --port 8000), then run:
+    python Test/load_test_ws_latency.py
+
+Phase 1 measures ping round trips on an idle server, phase 2 repeats the
+measurement while bid sockets keep sending driver-bid-offer messages (each one
+creates OngoingTrip/Dirde rows and a notification). With the DB work on the
+executor, p99 in phase 2 should stay close to phase 1.
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import websockets
+
+# Configuration
+WS_URL = os.getenv("WS_URL", "ws://127.0.0.1:8000/ws")
+PING_CLIENTS = int(os.getenv("PING_CLIENTS", "20"))
+BID_CLIENTS = int(os.getenv("BID_CLIENTS", "10"))
+PHASE_SECONDS = float(os.getenv("PHASE_SECONDS", "10"))
+PING_INTERVAL = 0.05
+
+# Existing rows used by the bid payloads
+REQ_ID = int(os.getenv("REQ_ID", "1"))
+RIDER_ID = int(os.getenv("RIDER_ID", "1"))
+DRIVER_ID = int(os.getenv("DRIVER_ID", "1"))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def ping_client(stop: asyncio.Event, samples: list):
+    """Send pings and record round-trip times in milliseconds."""
+    async with websockets.connect(WS_URL) as websocket:
+        await websocket.recv()  # connection_established
+        while not stop.is_set():
+            sent = time.perf_counter()
+            await websocket.send(json.dumps({"type": "ping", "timestamp": sent}))
+            while True:
+                message = json.loads(await websocket.recv())
+                if message.get("type") == "pong":
+                    break
+            samples.append((time.perf_counter() - sent) * 1000)
+            await asyncio.sleep(PING_INTERVAL)
+
+
+async def bid_client(stop: asyncio.Event, counter: list):
+    """Keep the server busy with driver bids that hit the database."""
+    async with websockets.connect(WS_URL) as websocket:
+        await websocket.recv()  # connection_established
+        amount = 300
+        while not stop.is_set():
+            amount += 1
+            await websocket.send(json.dumps({
+                "type": "driver-bid-offer",
+                "data": {
+                    "req_id": REQ_ID,
+                    "rider_id": RIDER_ID,
+                    "driver_id": DRIVER_ID,
+                    "driver_name": "Load Test Driver",
+                    "amount": amount,
+                }
+            }))
+            counter[0] += 1
+            await asyncio.sleep(0)
+
+
+async def run_phase(with_bids: bool):
+    stop = asyncio.Event()
+    samples = []
+    bids = [0]
+    tasks = [asyncio.create_task(ping_client(stop, samples)) for _ in range(PING_CLIENTS)]
+    if with_bids:
+        tasks += [asyncio.create_task(bid_client(stop, bids)) for _ in range(BID_CLIENTS)]
+
+    await asyncio.sleep(PHASE_SECONDS)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return samples, bids[0]
+
+
+def report(label, samples, bids):
+    print(f"\n📊 {label}")
+    print(f"   Pings: {len(samples)}   Bids sent: {bids}")
+    if samples:
+        print(f"   p50: {statistics.median(samples):8.2f} ms")
+        print(f"   p95: {percentile(samples, 95):8.2f} ms")
+        print(f"   p99: {percentile(samples, 99):8.2f} ms")
+        print(f"   max: {max(samples):8.2f} ms")
+
+
+async def main():
+    print("🧪 /ws ping latency under bid load")
+    print("=" * 50)
+    print(f"   {PING_CLIENTS} ping sockets, {BID_CLIENTS} bid sockets, {PHASE_SECONDS}s per phase")
+
+    idle_samples, _ = await run_phase(with_bids=False)
+    report("Idle server", idle_samples, 0)
+
+    loaded_samples, bids = await run_phase(with_bids=True)
+    report("While writing bids", loaded_samples, bids)
+
+    if idle_samples and loaded_samples:
+        ratio = percentile(loaded_samples, 99) / percentile(idle_samples, 99)
+        print(f"\n💡 p99 under load is {ratio:.1f}x the idle p99")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
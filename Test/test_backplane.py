@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test cross-worker delivery through the backplane.
+
+The Unix socket test starts a broker and two worker processes: the receiver
+holds rider 7's connection, the sender calls send_to_user and broadcast for
+a rider it does not hold. The receiver reports the latency of each message.
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backplane import BackplaneBroker, InProcessBackplane, UnixSocketBackplane
+from connection_manager import ConnectionManager
+
+MESSAGES = 200
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+
+def test_in_process_hub_routes_between_managers():
+    async def scenario():
+        hub = set()
+        worker_a = ConnectionManager(InProcessBackplane(hub))
+        worker_b = ConnectionManager(InProcessBackplane(hub))
+        await worker_a.start()
+        await worker_b.start()
+        rider, driver = FakeWebSocket(), FakeWebSocket()
+        await worker_b.connect(rider, "c-rider", 7, "rider")
+        await worker_a.connect(driver, "c-driver", 8, "driver")
+
+        forwarded = await worker_a.send_to_user("bid", 7)
+        missing = await ConnectionManager().send_to_user("bid", 7)
+        await worker_a.broadcast_to_riders("riders only")
+        await worker_b.broadcast("everyone")
+        await worker_a.drain()
+        await worker_b.drain()
+        return rider, driver, forwarded, missing
+
+    rider, driver, forwarded, missing = asyncio.run(scenario())
+    # Forwarded, but only the worker holding rider 7 knows it arrived
+    assert forwarded is None
+    assert missing is False
+    assert rider.sent == ["bid", "riders only", "everyone"]
+    assert driver.sent == ["everyone"]
+
+
+async def run_receiver(socket_path: str):
+    from backplane import UnixSocketBackplane
+
+    class TimingWebSocket:
+        def __init__(self):
+            self.latencies = []
+            self.done = asyncio.Event()
+
+        async def send_text(self, message: str):
+            payload = json.loads(message)
+            self.latencies.append((time.time() - payload["sent_at"]) * 1000)
+            if len(self.latencies) == MESSAGES + 1:
+                self.done.set()
+
+    manager = ConnectionManager(UnixSocketBackplane(socket_path, embed_broker=False))
+    await manager.start()
+    websocket = TimingWebSocket()
+    await manager.connect(websocket, "c-rider", 7, "rider")
+    print("ready", flush=True)
+    await asyncio.wait_for(websocket.done.wait(), timeout=30)
+    await manager.stop()
+    print(json.dumps(websocket.latencies), flush=True)
+
+
+async def run_sender(socket_path: str):
+    from backplane import UnixSocketBackplane
+
+    manager = ConnectionManager(UnixSocketBackplane(socket_path, embed_broker=False))
+    await manager.start()
+    for index in range(MESSAGES):
+        await manager.send_to_user(json.dumps({"index": index, "sent_at": time.time()}), 7)
+    await manager.broadcast_to_riders(json.dumps({"index": "broadcast", "sent_at": time.time()}))
+    await asyncio.sleep(0.2)
+    await manager.stop()
+
+
+@pytest.mark.skipif(not hasattr(asyncio, "start_unix_server"), reason="Unix sockets unavailable")
+def test_unix_socket_backplane_delivers_across_processes():
+    socket_path = os.path.join(tempfile.mkdtemp(), "backplane.sock")
+    broker = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "backplane.py"), "--socket", socket_path],
+        stdout=subprocess.DEVNULL)
+    receiver = sender = None
+    try:
+        deadline = time.time() + 10
+        while not os.path.exists(socket_path) and time.time() < deadline:
+            time.sleep(0.05)
+
+        receiver = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--receiver", socket_path],
+            stdout=subprocess.PIPE, text=True)
+        assert receiver.stdout.readline().split()[-1] == "ready"
+
+        sender = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--sender", socket_path],
+            stdout=subprocess.DEVNULL)
+        sender.wait(timeout=30)
+        output, _ = receiver.communicate(timeout=30)
+        latencies = json.loads(output.strip().splitlines()[-1])
+    finally:
+        for process in (sender, receiver, broker):
+            if process is not None and process.poll() is None:
+                process.kill()
+
+    assert len(latencies) == MESSAGES + 1
+    ordered = sorted(latencies)
+    print(f"\n📊 Cross-worker latency over {len(ordered)} messages: "
+          f"p50 {statistics.median(ordered):.3f} ms, "
+          f"p99 {ordered[int(len(ordered) * 0.99) - 1]:.3f} ms, max {ordered[-1]:.3f} ms")
+    assert statistics.median(ordered) < 100
+
+
+@pytest.mark.skipif(not hasattr(asyncio, "start_unix_server"), reason="Unix sockets unavailable")
+def test_broker_disconnects_a_worker_that_stops_reading():
+    socket_path = os.path.join(tempfile.mkdtemp(), "backplane.sock")
+    lines = 4096
+
+    async def scenario():
+        broker = BackplaneBroker(socket_path, max_buffer=64 * 1024)
+        await broker.start()
+        _, sender = await asyncio.open_unix_connection(socket_path)
+        stalled, stalled_writer = await asyncio.open_unix_connection(socket_path)
+        await asyncio.sleep(0.05)
+
+        # The sender is never held up by a worker that does not read
+        for _ in range(lines):
+            sender.write(b"x" * 1023 + b"\n")
+            await asyncio.wait_for(sender.drain(), timeout=5)
+
+        # Once it reads again it finds that the broker hung up
+        hung_up = False
+        try:
+            hung_up = not await asyncio.wait_for(stalled.read(lines * 1024), timeout=5)
+            while not hung_up:
+                hung_up = not await asyncio.wait_for(stalled.read(lines * 1024), timeout=5)
+        except ConnectionError:
+            hung_up = True
+        dropped = broker.slow_clients_dropped
+        for writer in (sender, stalled_writer):
+            writer.close()
+        await asyncio.sleep(0.05)
+        await broker.stop()
+        return hung_up, dropped
+
+    hung_up, dropped = asyncio.run(scenario())
+    assert hung_up
+    assert dropped == 1
+
+@pytest.mark.skipif(not hasattr(asyncio, "start_unix_server"), reason="Unix sockets unavailable")
+def test_socket_outside_a_private_directory_is_refused():
+    shared = tempfile.mkdtemp()
+    os.chmod(shared, 0o777)
+    try:
+        asyncio.run(BackplaneBroker(os.path.join(shared, "backplane.sock")).start())
+        assert False, "a world-writable socket directory should be refused"
+    except PermissionError:
+        pass
+
+
+@pytest.mark.skipif(not hasattr(os, "chown") or os.getuid() != 0, reason="Needs root to fake another owner")
+def test_worker_refuses_a_broker_socket_owned_by_another_user():
+    socket_path = os.path.join(tempfile.mkdtemp(), "backplane.sock")
+
+    async def scenario():
+        broker = BackplaneBroker(socket_path)
+        await broker.start()
+        os.chown(socket_path, 65534, 65534)
+        try:
+            await UnixSocketBackplane(socket_path, embed_broker=False)._connect()
+            return False
+        except PermissionError:
+            return True
+        finally:
+            await broker.stop()
+
+    assert asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--receiver":
+        asyncio.run(run_receiver(sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "--sender":
+        asyncio.run(run_sender(sys.argv[2]))
+    else:
+        test_in_process_hub_routes_between_managers()
+        test_unix_socket_backplane_delivers_across_processes()
+        test_broker_disconnects_a_worker_that_stops_reading()
+        test_socket_outside_a_private_directory_is_refused()
+        test_worker_refuses_a_broker_socket_owned_by_another_user()
+        print("✅ Backplane tests passed")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test the WebSocket connection registry with in-memory fake sockets.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+from location_codec import FRAME_DRIVER_LOCATION, LocationFrame, decode_frame
+from spatial_index import SubscriptionArea
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        self.sent.append(message)
+
+
+def test_role_broadcast_reaches_only_riders():
+    async def scenario():
+        manager = ConnectionManager()
+        rider, driver, anonymous = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(rider, "c-rider", 1, "rider")
+        await manager.connect(driver, "c-driver", 2, "driver")
+        await manager.connect(anonymous, "c-anon")
+        await manager.broadcast_to_riders("hello riders")
+        await manager.drain()
+        return rider, driver, anonymous
+
+    rider, driver, anonymous = asyncio.run(scenario())
+    assert rider.sent == ["hello riders"]
+    assert driver.sent == []
+    assert anonymous.sent == []
+
+
+def test_disconnect_removes_role_membership():
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.connect(FakeWebSocket(), "c-1", 1, "rider")
+        manager.disconnect("c-1", 1)
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.connections_for_role("rider") == {}
+    assert manager.active_connections == {}
+    assert 1 not in manager.user_connections
+
+
+def test_stale_disconnect_keeps_reconnected_user():
+    async def scenario():
+        manager = ConnectionManager()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(old, "c-old", 5, "rider")
+        await manager.connect(new, "c-new", 5, "rider")
+        manager.disconnect("c-old", 5)  # Old socket closes after the reconnect
+        delivered = await manager.send_to_user("bid", 5)
+        await manager.drain()
+        return manager, new, delivered
+
+    manager, new, delivered = asyncio.run(scenario())
+    assert delivered is True
+    assert new.sent == ["bid"]
+    assert list(manager.connections_for_role("rider")) == ["c-new"]
+
+
+def test_area_subscription_scopes_location_updates():
+    async def scenario():
+        manager = ConnectionManager()
+        dhaka, chattogram, everywhere = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(dhaka, "c-dhaka", 1, "rider")
+        await manager.connect(chattogram, "c-ctg", 2, "rider")
+        await manager.connect(everywhere, "c-all", 3, "rider")
+        manager.subscribe_area("c-dhaka", SubscriptionArea.circle(23.81, 90.41, 10.0))
+        manager.subscribe_area("c-ctg", SubscriptionArea.bbox(22.2, 91.7, 22.5, 91.9))
+
+        await manager.broadcast_to_area(23.80, 90.40, "dhaka driver")
+        await manager.broadcast_to_points([(22.35, 91.80), (23.82, 90.42)], "both")
+        nearby = manager.get_nearby_riders(9, 22.35, 91.80)
+
+        manager.unsubscribe_area("c-ctg")
+        await manager.broadcast_to_area(23.80, 90.40, "after unsubscribe")
+        await manager.drain()
+        return dhaka, chattogram, everywhere, nearby
+
+    dhaka, chattogram, everywhere, nearby = asyncio.run(scenario())
+    assert dhaka.sent == ["dhaka driver", "both", "after unsubscribe"]
+    assert chattogram.sent == ["both", "after unsubscribe"]
+    assert everywhere.sent == ["dhaka driver", "both", "after unsubscribe"]
+    assert sorted(nearby) == [2, 3]
+
+
+def test_binary_riders_get_location_frames():
+    async def scenario():
+        manager = ConnectionManager()
+        text_rider, binary_rider = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(text_rider, "c-text", 1, "rider")
+        await manager.connect(binary_rider, "c-binary", 2, "rider", binary=True)
+        location = LocationFrame(9, 23.80, 90.40, 1700000000000)
+        result = await manager.broadcast_to_area(23.80, 90.40, "driver-location json", location)
+        await manager.broadcast_to_riders("bid json")
+        await manager.drain()
+        return text_rider, binary_rider, result
+
+    text_rider, binary_rider, result = asyncio.run(scenario())
+    assert result.delivered == 2
+    assert text_rider.sent == ["driver-location json", "bid json"]
+    assert decode_frame(binary_rider.sent[0]) == (
+        FRAME_DRIVER_LOCATION, LocationFrame(9, 23.80, 90.40, 1700000000000))
+    # Everything except location updates stays JSON
+    assert binary_rider.sent[1] == "bid json"
+
+
+if __name__ == "__main__":
+    test_role_broadcast_reaches_only_riders()
+    test_disconnect_removes_role_membership()
+    test_stale_disconnect_keeps_reconnected_user()
+    test_area_subscription_scopes_location_updates()
+    test_binary_riders_get_location_frames()
+    print("✅ Connection manager tests passed")
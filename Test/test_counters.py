@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test the aggregate counter queries and the event-maintained counter cache
+against an in-memory SQLite database.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import counters
+from conftest import make_sqlite_engine
+from counters import CounterCache, count_drivers, count_notifications
+from models import Driver, Notification
+
+
+def make_cache(refresh_s=0):
+    engine = make_sqlite_engine(Driver.__table__, Notification.__table__)
+    make_session = sessionmaker(bind=engine)
+    cache = CounterCache(refresh_s=refresh_s)
+    cache.listen(make_session)
+    return engine, make_session, cache
+
+
+def add_driver(session, index, available):
+    driver = Driver(
+        name=f"Driver {index}",
+        email=f"driver{index}@test.com",
+        mobile=f"0170000{index:04d}",
+        password="hashed",
+        is_available=available,
+    )
+    session.add(driver)
+    return driver
+
+
+def add_notification(session, status="unread"):
+    notification = Notification(
+        recipient_id=1, recipient_type="rider", sender_id=2, title="New Bid Received",
+        message="Bid", status=status)
+    session.add(notification)
+    return notification
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_aggregates_take_one_query_each():
+    engine, make_session, _ = make_cache()
+    with make_session() as session:
+        for index in range(5):
+            add_driver(session, index, available=index % 2 == 0)
+        for status in ["unread", "unread", "read", "accepted"]:
+            add_notification(session, status)
+        session.commit()
+
+        statements = count_queries(engine)
+        assert count_drivers(session) == {"total": 5, "available": 3}
+        assert count_notifications(session) == {"unread": 2, "read": 1, "accepted": 1}
+        assert len(statements) == 2
+        assert "GROUP BY" in statements[1]
+
+
+def test_cache_follows_committed_changes():
+    engine, make_session, cache = make_cache()
+    with make_session() as session:
+        drivers = [add_driver(session, index, available=False) for index in range(3)]
+        first = add_notification(session)
+        session.commit()
+
+        assert cache.driver_counts(session) == {"total": 3, "available": 0}
+        assert cache.notification_counts(session) == {"unread": 1, "total": 1}
+
+        statements = count_queries(engine)
+        drivers[0].is_available = True
+        drivers[1].is_available = True
+        first.status = "read"
+        add_notification(session)
+        session.commit()
+        writes = len(statements)
+
+        assert cache.driver_counts(session) == {"total": 3, "available": 2}
+        counts = cache.notification_counts(session)
+        assert counts["unread"] == 1 and counts["read"] == 1 and counts["total"] == 2
+        # Cached reads do not touch the database
+        assert len(statements) == writes
+
+        # Rewriting the same value on an expired row is not a change
+        drivers[1].is_available = True
+        session.commit()
+        assert cache.driver_counts(session) == {"total": 3, "available": 2}
+
+        session.delete(drivers[0])
+        session.commit()
+        assert cache.driver_counts(session) == {"total": 2, "available": 1}
+        assert cache.driver_counts(session) == count_drivers(session)
+
+
+def test_rollback_leaves_cache_unchanged():
+    _, make_session, cache = make_cache()
+    with make_session() as session:
+        driver = add_driver(session, 1, available=False)
+        session.commit()
+        assert cache.driver_counts(session) == {"total": 1, "available": 0}
+
+        driver.is_available = True
+        add_driver(session, 2, available=True)
+        session.flush()
+        session.rollback()
+        assert cache.driver_counts(session) == {"total": 1, "available": 0}
+
+        # A later commit in the same session does not replay the rolled back flush
+        add_notification(session)
+        session.commit()
+        assert cache.driver_counts(session) == {"total": 1, "available": 0}
+
+
+def test_refresh_interval_reloads_outside_writes():
+    engine, make_session, cache = make_cache(refresh_s=0.01)
+    with make_session() as session:
+        add_notification(session)
+        session.commit()
+        assert cache.notification_counts(session)["total"] == 1
+
+    # A write the session events cannot see
+    with engine.begin() as conn:
+        conn.execute(Notification.__table__.insert().values(
+            recipient_id=2, recipient_type="driver", sender_id=1, title="t", message="m", status="unread"))
+
+    time.sleep(0.02)
+    with make_session() as session:
+        assert cache.notification_counts(session)["total"] == 2
+    assert cache.metrics()["refreshes"] == 2
+
+
+def test_commit_during_a_load_is_not_lost():
+    _, make_session, cache = make_cache(refresh_s=0)
+    with make_session() as session:
+        add_notification(session)
+        session.commit()
+
+    def count_then_commit(session):
+        counts = count_notifications(session)
+        # Lands after the query ran but before its result is cached
+        with make_session() as other:
+            add_notification(other, status="read")
+            other.commit()
+        return counts
+
+    counters.count_notifications = count_then_commit
+    try:
+        with make_session() as session:
+            first = cache.notification_counts(session)
+    finally:
+        counters.count_notifications = count_notifications
+
+    # The first read returns what the query saw plus what committed meanwhile
+    assert first == {"unread": 1, "read": 1, "total": 2}
+    with make_session() as session:
+        assert cache.notification_counts(session) == {**count_notifications(session), "total": 2}
+    assert cache.metrics()["deltas_replayed"] == 1
+
+
+if __name__ == "__main__":
+    test_aggregates_take_one_query_each()
+    test_cache_follows_committed_changes()
+    test_rollback_leaves_cache_unchanged()
+    test_refresh_interval_reloads_outside_writes()
+    test_commit_during_a_load_is_not_lost()
+    print("✅ Counter cache tests passed")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test the instrumented connection pool and pre-ping modes against SQLite.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import exc, text
+
+from db import create_db_engine, pool_metrics
+
+
+def make_engine(**kwargs):
+    settings = {"pool_size": 1, "max_overflow": 0, "pool_timeout_s": 1, "pre_ping": "never", **kwargs}
+    return create_db_engine("sqlite:///:memory:?check_same_thread=false", **settings)
+
+
+def test_checkout_wait_is_recorded():
+    engine = make_engine()
+    held = engine.connect()
+    assert pool_metrics(engine)["in_use"] == 1
+
+    def waiter():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.1)
+    held.close()
+    thread.join()
+
+    metrics = pool_metrics(engine)
+    assert metrics["checkouts"] == 2
+    assert metrics["waited"] >= 1
+    assert metrics["max_wait_ms"] >= 80
+    assert metrics["in_use"] == 0
+    assert metrics["max_in_use"] == 1
+
+
+def test_timeout_is_counted():
+    engine = make_engine(pool_timeout_s=0.05)
+    held = engine.connect()
+    try:
+        engine.connect()
+        assert False, "checkout should time out"
+    except exc.TimeoutError:
+        pass
+    held.close()
+    assert pool_metrics(engine)["timeouts"] == 1
+
+
+def test_idle_pre_ping_only_after_idle_period():
+    engine = make_engine(pre_ping="idle", pre_ping_idle_s=0.05)
+    pings = []
+    do_ping = engine.dialect.do_ping
+    engine.dialect.do_ping = lambda dbapi_connection: pings.append(1) or do_ping(dbapi_connection)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    assert pings == []
+
+    time.sleep(0.1)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert pings == [1]
+
+
+def test_unknown_pre_ping_mode_is_rejected():
+    try:
+        make_engine(pre_ping="sometimes")
+        assert False, "unknown mode should raise"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_checkout_wait_is_recorded()
+    test_timeout_is_counted()
+    test_idle_pre_ping_only_after_idle_period()
+    test_unknown_pre_ping_mode_is_rejected()
+    print("✅ Connection pool tests passed")
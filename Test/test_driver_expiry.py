@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test heap-based expiry of drivers that stopped sending locations.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import driver_location_service as service_module
+from driver_location_service import STALE_AFTER_SECONDS, DriverLocationService
+from driver_stream import DriverDeltaStream
+from serialization import loads
+
+
+def test_only_due_drivers_expire():
+    service = DriverLocationService()
+    events = []
+    service.add_listener(lambda event, driver_id, location: events.append((event, driver_id)))
+    for driver_id in range(1, 6):
+        service._cache_location(driver_id, 23.80, 90.40 + driver_id / 100)
+    service.remove_driver(5)
+    events.clear()
+
+    now = time.monotonic()
+    assert service.expire_stale_drivers(now) == []
+    expired = service.expire_stale_drivers(now + STALE_AFTER_SECONDS + 1)
+    assert sorted(expired) == [1, 2, 3, 4]
+    assert sorted(events) == [("expired", 1), ("expired", 2), ("expired", 3), ("expired", 4)]
+    assert service.active_drivers == {}
+    assert service.find_nearby_drivers(23.80, 90.42, 10) == []
+    # The removed driver's leftover entry is discarded, not expired twice
+    assert service.expiry_metrics()["scheduled"] == 0
+
+
+def test_driver_seen_again_is_rescheduled_not_expired():
+    service = DriverLocationService()
+    service._cache_location(1, 23.80, 90.40)
+    first_deadline = service._expiry_heap[0][0]
+    time.sleep(0.01)
+    service._cache_location(1, 23.81, 90.40)
+    # Updates do not add heap entries
+    assert len(service._expiry_heap) == 1
+
+    assert service.expire_stale_drivers(first_deadline) == []
+    assert 1 in service.active_drivers
+    assert service._expiry_heap[0][0] > first_deadline
+
+
+def test_reads_return_live_view():
+    service = DriverLocationService()
+    service._cache_location(1, 23.80, 90.40)
+    view = service.get_all_active_drivers()
+    service._cache_location(2, 23.81, 90.41)
+    assert sorted(view) == [1, 2]
+    try:
+        view[3] = {}
+        assert False, "view should be read-only"
+    except TypeError:
+        pass
+    assert service.get_driver_count() == 2
+
+
+def test_background_expiry_sends_offline_notice():
+    original = service_module.STALE_AFTER_SECONDS
+    service_module.STALE_AFTER_SECONDS = 0.05
+    published = []
+
+    async def publish(points, frame):
+        published.append((points, loads(frame)))
+
+    async def scenario():
+        service = DriverLocationService()
+        stream = DriverDeltaStream(service, publish, coalesce_ms=0)
+        await service.start()
+        await stream.start()
+        service._cache_location(9, 23.80, 90.40)
+        await asyncio.sleep(0.2)
+        await stream.stop()
+        await service.stop()
+        return service
+
+    try:
+        service = asyncio.run(scenario())
+    finally:
+        service_module.STALE_AFTER_SECONDS = original
+
+    assert service.active_drivers == {}
+    assert service.expiry_metrics()["expired"] == 1
+    frames = [frame for _, frame in published]
+    assert [frame["type"] for frame in frames] == [
+        "nearby-drivers-delta", "nearby-drivers-delta", "driver-offline"]
+    assert frames[1]["removed"] == [9]
+    assert frames[2]["data"]["driver_id"] == 9
+    assert published[2][0] == [(23.80, 90.40)]
+
+
+if __name__ == "__main__":
+    test_only_due_drivers_expire()
+    test_driver_seen_again_is_rescheduled_not_expired()
+    test_reads_return_live_view()
+    test_background_expiry_sends_offline_notice()
+    print("✅ Driver expiry tests passed")
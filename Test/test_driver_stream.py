@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test the nearby-drivers snapshot/delta stream without a database or sockets.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService
+from driver_stream import DriverDeltaStream
+from serialization import loads
+
+
+def apply(state: dict, frame: dict) -> dict:
+    """Client-side reducer: upsert and remove drivers by id."""
+    for driver in frame["upserted"]:
+        state[driver["id"]] = driver
+    for driver_id in frame["removed"]:
+        state.pop(driver_id, None)
+    return state
+
+
+def test_snapshot_then_deltas_track_service_state():
+    service = DriverLocationService()
+    stream = DriverDeltaStream(service)
+    service._cache_location(1, 23.81, 90.41)
+    service._cache_location(2, 23.82, 90.42)
+
+    snapshot = loads(stream.snapshot_payload())
+    assert snapshot["type"] == "nearby-drivers-snapshot"
+    state = {driver["id"]: driver for driver in snapshot["data"]}
+    seq = snapshot["seq"]
+
+    service._cache_location(1, 23.83, 90.43)
+    service.remove_driver(2)
+    service._cache_location(3, 23.84, 90.44)
+    delta = loads(stream.take_delta().text)
+    assert delta["type"] == "nearby-drivers-delta"
+    assert delta["seq"] == seq + 1
+    apply(state, delta)
+
+    assert sorted(state) == [1, 3]
+    assert state[1]["latitude"] == 23.83
+    assert stream.take_delta() is None
+
+
+def test_updates_inside_window_are_coalesced_into_one_frame():
+    service = DriverLocationService()
+    frames = []
+
+    async def publish(points, frame):
+        frames.append(loads(frame))
+
+    async def scenario():
+        stream = DriverDeltaStream(service, publish, coalesce_ms=30)
+        await stream.start()
+        for step in range(10):
+            service._cache_location(7, 23.80 + step / 1000, 90.40)
+        await asyncio.sleep(0.1)
+        await stream.stop()
+
+    asyncio.run(scenario())
+    assert len(frames) == 1
+    assert frames[0]["upserted"] == [
+        {**frames[0]["upserted"][0], "id": 7, "latitude": 23.809}]
+
+
+def test_delta_points_include_previous_position():
+    service = DriverLocationService()
+    stream = DriverDeltaStream(service)
+    service._cache_location(5, 23.81, 90.41)
+    assert stream.take_delta().points == [(23.81, 90.41)]
+
+    service._cache_location(5, 24.90, 91.87)
+    assert stream.take_delta().points == [(23.81, 90.41), (24.90, 91.87)]
+
+    service.remove_driver(5)
+    assert stream.take_delta().points == [(24.90, 91.87)]
+
+
+def test_remove_after_update_sends_only_removal():
+    service = DriverLocationService()
+    stream = DriverDeltaStream(service)
+    service._cache_location(4, 23.81, 90.41)
+    stream.take_delta()
+
+    service._cache_location(4, 23.82, 90.42)
+    service.remove_driver(4)
+    delta = loads(stream.take_delta().text)
+    assert delta["upserted"] == []
+    assert delta["removed"] == [4]
+
+
+if __name__ == "__main__":
+    test_snapshot_then_deltas_track_service_state()
+    test_updates_inside_window_are_coalesced_into_one_frame()
+    test_delta_points_include_previous_position()
+    test_remove_after_update_sends_only_removal()
+    print("✅ Driver stream tests passed")
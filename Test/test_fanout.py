@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test queued WebSocket fan-out with fake sockets that are dead, slow or healthy.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0, dead: bool = False):
+        self.sent = []
+        self.delay = delay
+        self.dead = dead
+
+    async def send_text(self, message: str):
+        if self.dead:
+            raise RuntimeError("socket closed")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+
+def test_dead_socket_is_evicted_without_aborting_broadcast():
+    async def scenario():
+        manager = ConnectionManager()
+        healthy = [FakeWebSocket() for _ in range(5)]
+        await manager.connect(FakeWebSocket(dead=True), "c-dead", 99, "driver")
+        for index, websocket in enumerate(healthy):
+            await manager.connect(websocket, f"c-{index}", index + 1, "driver")
+        result = await manager.broadcast("trip")
+        await manager.drain()
+        return manager, healthy, result
+
+    manager, healthy, result = asyncio.run(scenario())
+    assert result.delivered == 6
+    assert all(websocket.sent == ["trip"] for websocket in healthy)
+    assert "c-dead" not in manager.active_connections
+    assert "c-dead" not in manager.outbound
+    assert 99 not in manager.user_connections
+    assert "c-dead" not in manager.connections_for_role("driver")
+
+
+def test_slow_socket_does_not_delay_others():
+    async def scenario():
+        manager = ConnectionManager()
+        slow, fast = FakeWebSocket(delay=1.0), FakeWebSocket()
+        await manager.connect(slow, "c-slow", 1, "rider")
+        await manager.connect(fast, "c-fast", 2, "rider")
+        await manager.broadcast_to_riders("location")
+        await asyncio.wait_for(manager.outbound["c-fast"].join(), timeout=0.2)
+        return manager, slow, fast
+
+    manager, slow, fast = asyncio.run(scenario())
+    assert fast.sent == ["location"]
+    assert slow.sent == []
+    assert "c-slow" in manager.active_connections
+
+
+if __name__ == "__main__":
+    test_dead_socket_is_evicted_without_aborting_broadcast()
+    test_slow_socket_does_not_delay_others()
+    print("✅ Fan-out tests passed")
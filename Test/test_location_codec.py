@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test the binary location frame layout and its validation.
+"""
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_codec import (
+    FRAME_DRIVER_LOCATION,
+    FRAME_LOCATION_UPDATE,
+    FRAME_SIZE,
+    LocationFrame,
+    decode_frame,
+    encode_frame,
+    iso_timestamp,
+    timestamp_ms,
+)
+
+
+def test_round_trip_keeps_microdegree_precision():
+    location = LocationFrame(4_000_000_000, 23.8103417, -90.4125981, 1700000000123)
+    frame = encode_frame(FRAME_LOCATION_UPDATE, location)
+    assert len(frame) == FRAME_SIZE == 21
+    kind, decoded = decode_frame(frame)
+    assert kind == FRAME_LOCATION_UPDATE
+    assert decoded.driver_id == 4_000_000_000
+    assert decoded.timestamp_ms == 1700000000123
+    assert abs(decoded.latitude - 23.8103417) <= 0.5e-6
+    assert abs(decoded.longitude - -90.4125981) <= 0.5e-6
+
+
+def test_layout_is_little_endian_microdegrees():
+    frame = encode_frame(FRAME_DRIVER_LOCATION, LocationFrame(1, 1.0, -2.0, 3))
+    assert frame == struct.pack("<BIiiq", 3, 1, 1_000_000, -2_000_000, 3)
+
+
+def test_bad_frames_are_rejected():
+    good = encode_frame(FRAME_LOCATION_UPDATE, LocationFrame(1, 23.8, 90.4, 0))
+    bad_frames = [
+        good[:-1],
+        good + b"\x00",
+        b"\x09" + good[1:],
+        struct.pack("<BIiiq", FRAME_LOCATION_UPDATE, 1, 91_000_000, 0, 0),
+        struct.pack("<BIiiq", FRAME_LOCATION_UPDATE, 1, 0, -181_000_000, 0),
+    ]
+    for frame in bad_frames:
+        try:
+            decode_frame(frame)
+            assert False, f"frame should be rejected: {frame!r}"
+        except ValueError:
+            pass
+
+
+def test_timestamp_conversion():
+    assert timestamp_ms(iso_timestamp(1700000000123)) == 1700000000123
+    assert timestamp_ms("2024-01-01T10:00:00Z") == 1704103200000
+    # Unreadable client timestamps fall back to now instead of failing the update
+    assert timestamp_ms("yesterday") > 1700000000000
+    assert timestamp_ms(None) > 1700000000000
+
+
+if __name__ == "__main__":
+    test_round_trip_keeps_microdegree_precision()
+    test_layout_is_little_endian_microdegrees()
+    test_bad_frames_are_rejected()
+    test_timestamp_conversion()
+    print("✅ Location codec tests passed")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test location update throttling and dead-reckoning with a fake clock.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService
+from location_filter import METRES_PER_DEGREE, LocationUpdateFilter
+
+
+class RecordingWriter:
+    """Stands in for the write-behind buffer; every enqueue is a DB write."""
+    running = True
+
+    def __init__(self):
+        self.rows = []
+
+    def enqueue(self, driver_id, latitude, longitude):
+        self.rows.append((driver_id, latitude, longitude))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_filter(**kwargs):
+    clock = FakeClock()
+    settings = {"min_interval_ms": 1000, "max_error_m": 25, "max_silence_s": 30, **kwargs}
+    return LocationUpdateFilter(clock=clock, **settings), clock
+
+
+def test_parked_driver_is_suppressed_until_heartbeat():
+    update_filter, clock = make_filter()
+    reasons = [update_filter.check(1, 23.8, 90.4).reason]
+    clock.now += 0.5
+    reasons.append(update_filter.check(1, 23.8, 90.4).reason)
+    for _ in range(5):
+        clock.now += 5
+        # GPS jitter of a few metres
+        reasons.append(update_filter.check(1, 23.80003, 90.40002).reason)
+    clock.now += 5
+    reasons.append(update_filter.check(1, 23.8, 90.4).reason)
+    assert reasons == ["first", "too_soon"] + ["within_error"] * 5 + ["heartbeat"]
+    metrics = update_filter.metrics()
+    assert metrics["accepted"] == 2
+    assert metrics["suppressed"] == 6
+
+
+def test_constant_velocity_is_extrapolated():
+    update_filter, clock = make_filter()
+    step = 100 / METRES_PER_DEGREE  # 100 m north every 5 s = 20 m/s
+    decisions = []
+    for index in range(6):
+        decisions.append(update_filter.check(1, 23.8 + step * index, 90.4))
+        clock.now += 5
+    # First sample, then the first move (no velocity yet); after that the track predicts each point
+    assert [decision.reason for decision in decisions] == [
+        "first", "deviated", "within_error", "within_error", "within_error", "within_error"]
+    assert decisions[1].velocity == {"north_mps": 20.0, "east_mps": 0.0}
+
+    # Turning east breaks the prediction
+    decision = update_filter.check(1, 23.8 + step * 5, 90.4 + step)
+    assert decision.accepted and decision.reason == "deviated"
+
+
+def test_force_restarts_track():
+    update_filter, clock = make_filter()
+    update_filter.check(1, 23.8, 90.4)
+    clock.now += 0.1
+    decision = update_filter.check(1, 23.9, 90.5, force=True)
+    assert decision.accepted and decision.reason == "first"
+    assert decision.velocity == {"north_mps": 0.0, "east_mps": 0.0}
+
+
+def test_service_skips_suppressed_updates():
+    update_filter, clock = make_filter()
+    writer = RecordingWriter()
+    service = DriverLocationService(writer, update_filter)
+    events = []
+    service.add_listener(lambda event, driver_id, location: events.append((event, driver_id)))
+
+    service.report_location(3, 23.8, 90.4)
+    clock.now += 5
+    suppressed = service.report_location(3, 23.80001, 90.4)
+    clock.now += 5
+    moved = service.report_location(3, 23.81, 90.4)
+
+    assert not suppressed.accepted
+    assert moved.accepted
+    assert events == [("updated", 3), ("updated", 3)]
+    assert [row[1] for row in writer.rows] == [23.8, 23.81]
+    assert service.active_drivers[3].latitude == 23.81
+    assert service.active_drivers[3].velocity() == moved.velocity
+
+    service.remove_driver(3)
+    assert service.report_location(3, 23.81, 90.4).reason == "first"
+
+
+if __name__ == "__main__":
+    test_parked_driver_is_suppressed_until_heartbeat()
+    test_constant_velocity_is_extrapolated()
+    test_force_restarts_track()
+    test_service_skips_suppressed_updates()
+    print("✅ Location filter tests passed")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test the append-only location history against an in-memory SQLite database.
+"""
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_mock_engine, func, select
+from sqlalchemy.orm import Session
+
+from conftest import make_sqlite_engine
+from location_history import (
+    LocationHistoryWriter,
+    downsample,
+    load_track,
+    partition_ddl,
+)
+from models import DriverLocationHistory
+
+TABLE = DriverLocationHistory.__table__
+
+
+def make_writer(**kwargs):
+    engine = make_sqlite_engine(TABLE)
+    return LocationHistoryWriter(engine, **kwargs), engine
+
+
+def count_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(TABLE)).scalar()
+
+
+def test_every_position_is_appended():
+    writer, engine = make_writer()
+    start = datetime(2026, 10, 18, 8, 0, 0)
+    for step in range(5):
+        writer.record(7, 23.80 + step * 0.001, 90.41, recorded_at=start + timedelta(seconds=step))
+    writer.record(8, 22.34, 91.82, trip_id=3, recorded_at=start)
+
+    assert writer.flush_sync() == 6
+    assert count_rows(engine) == 6
+
+    with Session(engine) as session:
+        track = load_track(session, 7, start + timedelta(seconds=1), start + timedelta(seconds=3))
+    assert [round(point.latitude, 3) for point in track] == [23.801, 23.802, 23.803]
+
+    # A replayed batch does not duplicate rows
+    writer.record(7, 23.80, 90.41, recorded_at=start)
+    writer.flush_sync()
+    assert count_rows(engine) == 6
+    assert writer.metrics()["rows_written"] == 7
+
+
+def test_retention_deletes_old_rows_without_partitions():
+    writer, engine = make_writer(retention_days=30)
+    today = date(2026, 10, 18)
+    writer.record(1, 23.8, 90.4, recorded_at=datetime(2026, 9, 17, 23, 59))
+    writer.record(1, 23.8, 90.4, recorded_at=datetime(2026, 9, 18, 0, 0))
+    writer.record(1, 23.8, 90.4, recorded_at=datetime(2026, 10, 18, 9, 0))
+    writer.flush_sync()
+
+    writer.maintain_sync(today)
+    assert count_rows(engine) == 2
+    assert writer.metrics()["rows_expired"] == 1
+
+
+def test_pending_rows_are_bounded():
+    writer, _ = make_writer(max_pending=3)
+    for step in range(5):
+        writer.record(1, 23.8 + step, 90.4)
+    metrics = writer.metrics()
+    assert metrics["pending"] == 3
+    assert metrics["rows_dropped"] == 2
+
+
+def test_stop_flushes_pending_rows():
+    async def scenario():
+        writer, engine = make_writer(flush_interval_ms=60_000)
+        await writer.start()
+        writer.record(1, 23.8, 90.4)
+        assert count_rows(engine) == 0
+        await writer.stop()
+        return count_rows(engine)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_partition_ddl_covers_one_day():
+    assert partition_ddl("driverlocationhistory", date(2026, 12, 31)) == (
+        'CREATE TABLE IF NOT EXISTS "driverlocationhistory_p20261231" '
+        'PARTITION OF "driverlocationhistory" '
+        "FOR VALUES FROM ('2026-12-31') TO ('2027-01-01')"
+    )
+
+
+def test_downsample_keeps_endpoints():
+    points = list(range(1001))
+    sampled = downsample(points, 11)
+    assert sampled == list(range(0, 1001, 100))
+    assert downsample(points[:5], 11) == points[:5]
+
+
+def test_unsupported_dialect_is_rejected_up_front():
+    try:
+        LocationHistoryWriter(create_mock_engine("mysql://", lambda *args, **kwargs: None))
+        assert False, "unsupported dialect should raise"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_every_position_is_appended()
+    test_retention_deletes_old_rows_without_partitions()
+    test_pending_rows_are_bounded()
+    test_stop_flushes_pending_rows()
+    test_partition_ddl_covers_one_day()
+    test_downsample_keeps_endpoints()
+    test_unsupported_dialect_is_rejected_up_front()
+    print("✅ Location history tests passed")
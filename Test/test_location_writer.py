@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the write-behind buffer for driver locations against an in-memory SQLite database.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_mock_engine, select
+
+from conftest import make_sqlite_engine
+from driver_location_service import DriverLocationService
+from location_writer import LocationWriteBehindBuffer
+
+
+def make_buffer(**kwargs):
+    table = Table(
+        "driverlocation", MetaData(),
+        Column("driver_id", Integer, primary_key=True),
+        Column("latitude", Float, nullable=False),
+        Column("longitude", Float, nullable=False),
+    )
+    engine = make_sqlite_engine(table)
+    return LocationWriteBehindBuffer(engine, table=table, **kwargs), engine, table
+
+
+def read_rows(engine, table):
+    with engine.connect() as conn:
+        return {row.driver_id: (row.latitude, row.longitude) for row in conn.execute(select(table))}
+
+
+def test_latest_position_per_driver_is_written_once():
+    buffer, engine, table = make_buffer()
+    buffer.enqueue(1, 23.80, 90.41)
+    buffer.enqueue(1, 23.81, 90.42)
+    buffer.enqueue(2, 22.34, 91.82)
+
+    assert buffer.flush_sync() == 2
+    assert read_rows(engine, table) == {1: (23.81, 90.42), 2: (22.34, 91.82)}
+
+    # Existing rows are updated in place by the upsert
+    buffer.enqueue(2, 22.35, 91.83)
+    buffer.flush_sync()
+    assert read_rows(engine, table)[2] == (22.35, 91.83)
+
+    metrics = buffer.metrics()
+    assert metrics["coalesced"] == 1
+    assert metrics["rows_written"] == 3
+    assert metrics["pending"] == 0
+
+
+def test_service_defers_writes_until_flush():
+    async def scenario():
+        buffer, engine, table = make_buffer(flush_interval_ms=60_000)
+        service = DriverLocationService(buffer)
+        await buffer.start()
+
+        for step in range(10):
+            service.update_driver_location(7, 23.80 + step * 0.001, 90.41)
+        assert read_rows(engine, table) == {}
+        assert service.get_driver_location(7)["latitude"] == 23.80 + 9 * 0.001
+
+        # Shutdown must not lose the buffered position
+        await buffer.stop()
+        return read_rows(engine, table), buffer.metrics()
+
+    rows, metrics = asyncio.run(scenario())
+    assert rows == {7: (23.80 + 9 * 0.001, 90.41)}
+    assert metrics["flushes"] == 1
+    assert metrics["coalesced"] == 9
+
+
+def test_high_water_triggers_early_flush():
+    async def scenario():
+        buffer, engine, table = make_buffer(flush_interval_ms=60_000, high_water=3)
+        await buffer.start()
+        for driver_id in range(1, 4):
+            buffer.enqueue(driver_id, 23.8, 90.4)
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if buffer.metrics()["rows_written"] == 3:
+                break
+        await buffer.stop()
+        return buffer.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["early_flushes"] == 1
+    assert metrics["rows_written"] == 3
+
+
+def test_unsupported_dialect_is_rejected_up_front():
+    try:
+        LocationWriteBehindBuffer(create_mock_engine("mysql://", lambda *args, **kwargs: None))
+        assert False, "unsupported dialect should raise"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_latest_position_per_driver_is_written_once()
+    test_service_defers_writes_until_flush()
+    test_high_water_triggers_early_flush()
+    test_unsupported_dialect_is_rejected_up_front()
+    print("✅ Location write-behind tests passed")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Test that the models build a fresh SQLite database, as create_tables.py does.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect
+from sqlmodel import SQLModel
+
+import models  # Registers every table
+
+
+def test_create_all_on_sqlite():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    inspector = inspect(engine)
+    assert {"driverlocation", "notification", "notification_archive"} <= set(inspector.get_table_names())
+    assert "location" in {column["name"] for column in inspector.get_columns("driverlocation")}
+    # The GiST index only exists on PostgreSQL
+    assert "idx_driverlocation_location" not in {
+        index["name"] for index in inspector.get_indexes("driverlocation")}
+
+
+if __name__ == "__main__":
+    test_create_all_on_sqlite()
+    print("✅ Model tests passed")
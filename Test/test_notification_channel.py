@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test the /ws notifications channel: pushes, snapshots and batched read
+receipts, with fake sockets and an in-memory SQLite database.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backplane import InProcessBackplane
+from conftest import make_sqlite_engine
+from connection_manager import ConnectionManager
+from models import Notification
+from notification_channel import NotificationChannel
+from serialization import loads
+from ws_repository import notification_row
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message: str):
+        self.sent.append(loads(message))
+
+
+def make_engine():
+    return make_sqlite_engine(Notification.__table__)
+
+
+def add_notifications(engine, recipient_id, recipient_type="rider", statuses=("unread",) * 3):
+    start = datetime(2026, 10, 18, 9, 0, 0)
+    with Session(engine) as session:
+        notifications = [
+            Notification(
+                recipient_id=recipient_id, recipient_type=recipient_type, sender_id=100 + index,
+                title="Driver Bid Received", message=f"Bid {index}", status=status,
+                timestamp=start + timedelta(seconds=index))
+            for index, status in enumerate(statuses)
+        ]
+        session.add_all(notifications)
+        session.commit()
+        return [notification.notification_id for notification in notifications]
+
+
+def test_push_reaches_subscribed_recipient_with_matching_role():
+    async def scenario():
+        manager = ConnectionManager()
+        channel = NotificationChannel(make_engine(), connections=manager)
+        subscribed, unsubscribed, driver = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(subscribed, "c-7", 7, "rider")
+        await manager.connect(unsubscribed, "c-8", 8, "rider")
+        await manager.connect(driver, "c-9", 9, "driver")
+        for connection_id in ["c-7", "c-9"]:
+            manager.subscribe_notifications(connection_id)
+
+        await channel.publish([
+            (notification_row({"recipient_id": 7, "recipient_type": "rider", "sender_id": 9,
+                               "title": "Driver Bid Received", "message": "Bid"}), 41),
+            (notification_row({"recipient_id": 8, "recipient_type": "rider", "sender_id": 9,
+                               "title": "Driver Bid Received", "message": "Bid"}), 42),
+            # Rider 7 is not driver 7
+            (notification_row({"recipient_id": 7, "recipient_type": "driver", "sender_id": 1,
+                               "title": "Rider Counter Offer", "message": "Offer"}), 43),
+        ])
+        await manager.drain()
+        return subscribed, unsubscribed, driver, channel
+
+    subscribed, unsubscribed, driver, channel = asyncio.run(scenario())
+    assert [frame["type"] for frame in subscribed.sent] == ["notification"]
+    assert subscribed.sent[0]["data"]["notification_id"] == 41
+    assert subscribed.sent[0]["data"]["status"] == "unread"
+    assert unsubscribed.sent == [] and driver.sent == []
+    assert channel.metrics()["pushed"] == 1
+
+
+def test_push_reaches_other_worker_when_id_is_held_here_by_the_other_role():
+    async def scenario():
+        hub = set()
+        worker_a = ConnectionManager(InProcessBackplane(hub))
+        worker_b = ConnectionManager(InProcessBackplane(hub))
+        await worker_a.start()
+        await worker_b.start()
+        rider, driver = FakeWebSocket(), FakeWebSocket()
+        # Rider 7 is on worker A, driver 7 on worker B
+        await worker_a.connect(rider, "c-rider", 7, "rider")
+        await worker_b.connect(driver, "c-driver", 7, "driver")
+        worker_a.subscribe_notifications("c-rider")
+        worker_b.subscribe_notifications("c-driver")
+
+        channel = NotificationChannel(make_engine(), connections=worker_a)
+        await channel.publish([
+            (notification_row({"recipient_id": 7, "recipient_type": "driver", "sender_id": 1,
+                               "title": "Rider Counter Offer", "message": "Offer"}), 43),
+        ])
+        await worker_a.drain()
+        await worker_b.drain()
+        return rider, driver, channel
+
+    rider, driver, channel = asyncio.run(scenario())
+    assert rider.sent == []
+    assert [frame["data"]["notification_id"] for frame in driver.sent] == [43]
+    # Worker A cannot tell whether worker B held the driver
+    assert channel.metrics()["pushed"] == 0 and channel.metrics()["forwarded"] == 1
+
+
+def test_snapshot_has_unread_count_and_newest_page():
+    engine = make_engine()
+    ids = add_notifications(engine, 7, statuses=("unread", "read", "unread", "accepted", "unread"))
+    add_notifications(engine, 8)
+
+    snapshot = asyncio.run(NotificationChannel(engine).snapshot(7, "rider", limit=2))
+    assert snapshot["unread_count"] == 3
+    assert [n["notification_id"] for n in snapshot["notifications"]] == [ids[4], ids[2]]
+    assert snapshot["next_cursor"] is not None
+
+
+def test_acks_are_marked_read_in_one_batch():
+    engine = make_engine()
+    mine = add_notifications(engine, 7, statuses=("unread", "unread", "read"))
+    theirs = add_notifications(engine, 8)
+
+    async def scenario():
+        manager = ConnectionManager()
+        channel = NotificationChannel(engine, connections=manager)
+        rider = FakeWebSocket()
+        await manager.connect(rider, "c-7", 7, "rider")
+        manager.subscribe_notifications("c-7")
+        channel.acknowledge(7, "rider", [mine[0]])
+        # Someone else's notification and an already read one are ignored
+        channel.acknowledge(7, "rider", [mine[1], mine[2], theirs[0]])
+        marked = await channel.flush()
+        await manager.drain()
+        return channel, rider, marked
+
+    channel, rider, marked = asyncio.run(scenario())
+    assert marked == 2
+    assert rider.sent == [{"type": "notifications-read", "data": {"notification_ids": mine[:2]}}]
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(select(Notification.notification_id, Notification.status)).all())
+    assert [statuses[i] for i in mine] == ["read", "read", "read"]
+    assert [statuses[i] for i in theirs] == ["unread"] * 3
+    assert channel.metrics()["ack_flushes"] == 1
+
+
+if __name__ == "__main__":
+    test_push_reaches_subscribed_recipient_with_matching_role()
+    test_push_reaches_other_worker_when_id_is_held_here_by_the_other_role()
+    test_snapshot_has_unread_count_and_newest_page()
+    test_acks_are_marked_read_in_one_batch()
+    print("✅ Notification channel tests passed")
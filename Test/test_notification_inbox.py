@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test keyset pagination of the notification inbox against an in-memory SQLite database.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from conftest import make_sqlite_engine
+from models import Notification
+from notification_inbox import inbox_page, parse_cursor
+
+
+def make_session():
+    return Session(make_sqlite_engine(Notification.__table__))
+
+
+def add_notifications(session, recipient_id=7, recipient_type="rider", count=25):
+    start = datetime(2026, 10, 18, 9, 0, 0)
+    statuses = ["unread", "read", "accepted"]
+    for index in range(count):
+        session.add(Notification(
+            recipient_id=recipient_id,
+            recipient_type=recipient_type,
+            sender_id=100 + index,
+            title="New Bid Received",
+            message=f"Bid {index}",
+            status=statuses[index % 3],
+            # Pairs share a timestamp so the id has to break ties
+            timestamp=start + timedelta(seconds=index // 2),
+        ))
+    session.commit()
+
+
+def test_pages_walk_inbox_newest_first():
+    session = make_session()
+    add_notifications(session)
+    add_notifications(session, recipient_id=8)
+    add_notifications(session, recipient_type="driver")
+
+    expected = [
+        notification.notification_id
+        for notification in session.query(Notification).filter(
+            Notification.recipient_id == 7,
+            Notification.recipient_type == "rider",
+            Notification.status.in_(["unread", "read"]),
+        ).order_by(Notification.timestamp.desc(), Notification.notification_id.desc())
+    ]
+    assert len(expected) == 17
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, next_cursor = inbox_page(
+            session, 7, "rider", parse_cursor(cursor) if cursor else None, limit=5)
+        seen += [notification.notification_id for notification in page]
+        pages += 1
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    assert seen == expected
+    assert pages == 4
+
+
+def test_exact_final_page_has_no_cursor():
+    session = make_session()
+    add_notifications(session, count=3)
+    page, next_cursor = inbox_page(session, 7, "rider", limit=2)
+    assert len(page) == 2 and next_cursor is None
+
+
+def test_page_query_uses_inbox_index():
+    session = make_session()
+    add_notifications(session)
+    plan = " ".join(str(row) for row in session.execute(text("""
+        EXPLAIN QUERY PLAN
+        SELECT notification_id FROM notification
+        WHERE recipient_id = 7 AND recipient_type = 'rider' AND status = 'unread'
+          AND (timestamp, notification_id) < ('2026-10-18 09:00:10', 100)
+        ORDER BY timestamp DESC, notification_id DESC LIMIT 51
+    """)))
+    assert "ix_notification_inbox" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_malformed_cursor_is_rejected():
+    for cursor in ["", "12", "2026-10-18T09:00:00,abc", "yesterday,5"]:
+        try:
+            parse_cursor(cursor)
+            assert False, f"{cursor!r} should not parse"
+        except ValueError:
+            pass
+    assert parse_cursor("2026-10-18T09:00:00,5") == (datetime(2026, 10, 18, 9), 5)
+
+
+if __name__ == "__main__":
+    test_pages_walk_inbox_newest_first()
+    test_exact_final_page_has_no_cursor()
+    test_page_query_uses_inbox_index()
+    test_malformed_cursor_is_rejected()
+    print("✅ Notification inbox tests passed")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test notification archival against an in-memory SQLite database.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from conftest import make_sqlite_engine
+from models import Notification, NotificationArchive
+from notification_retention import COLUMNS, NotificationRetention
+
+NOW = datetime(2026, 10, 18, 12, 0, 0)
+
+
+def make_engine():
+    return make_sqlite_engine(Notification.__table__, NotificationArchive.__table__)
+
+
+def add_notifications(engine, age_days, statuses):
+    with Session(engine) as session:
+        notifications = [
+            Notification(
+                recipient_id=7, recipient_type="rider", sender_id=100 + index,
+                title="Driver Bid Received", message=f"Bid {index}", status=status,
+                bid_amount=300 + index, timestamp=NOW - timedelta(days=age_days, minutes=index))
+            for index, status in enumerate(statuses)
+        ]
+        session.add_all(notifications)
+        session.commit()
+        return [notification.notification_id for notification in notifications]
+
+
+def ids_in(engine, model):
+    with Session(engine) as session:
+        return sorted(session.execute(select(model.notification_id)).scalars())
+
+
+def test_moves_only_old_terminal_notifications():
+    engine = make_engine()
+    old = add_notifications(engine, 40, ["accepted", "rejected", "unread", "read", "confirmed"] * 2)
+    recent = add_notifications(engine, 2, ["accepted", "cancelled"])
+    retention = NotificationRetention(engine, retention_days=30, batch_size=3, pause_ms=0)
+
+    summary = retention.run_sync(now=NOW)
+    archived = [old[i] for i in (0, 1, 4, 5, 6, 9)]
+    assert summary["eligible"] == 6 and summary["archived"] == 6
+    assert summary["batches"] == 2
+    assert summary["by_status"] == {"accepted": 2, "rejected": 2, "confirmed": 2}
+    assert ids_in(engine, NotificationArchive) == archived
+    assert ids_in(engine, Notification) == sorted(set(old + recent) - set(archived))
+
+    with Session(engine) as session:
+        copy = session.get(NotificationArchive, old[1])
+        assert (copy.status, copy.message, copy.bid_amount) == ("rejected", "Bid 1", 301)
+        assert copy.archived_at is not None
+    assert retention.metrics()["rows_archived"] == 6
+
+
+def test_existing_archive_copy_is_replaced_not_lost():
+    engine = make_engine()
+    [notification_id] = add_notifications(engine, 40, ["accepted"])
+    with Session(engine) as session:
+        session.add(NotificationArchive(
+            notification_id=notification_id, recipient_id=7, recipient_type="rider", sender_id=1,
+            sender_type="driver", notification_type="bid", title="Stale", message="Stale copy", status="unread", timestamp=NOW - timedelta(days=90),
+            archived_at=NOW - timedelta(days=60)))
+        session.commit()
+
+    summary = NotificationRetention(engine, retention_days=30, pause_ms=0).run_sync(now=NOW)
+    assert summary["archived"] == 1
+    assert ids_in(engine, Notification) == []
+    with Session(engine) as session:
+        copy = session.get(NotificationArchive, notification_id)
+        assert (copy.status, copy.message) == ("accepted", "Bid 0")
+        assert copy.archived_at > NOW - timedelta(days=1)
+
+
+def test_max_batches_and_dry_run_leave_the_rest():
+    engine = make_engine()
+    add_notifications(engine, 40, ["accepted"] * 5)
+    retention = NotificationRetention(engine, retention_days=30, batch_size=2, pause_ms=0)
+
+    dry = retention.run_sync(now=NOW, dry_run=True)
+    assert dry["eligible"] == 5 and dry["archived"] == 0
+    assert ids_in(engine, NotificationArchive) == []
+
+    progress = []
+    first = retention.run_sync(now=NOW, max_batches=1, on_batch=lambda p: progress.append(p["archived"]))
+    assert first["archived"] == 2 and progress == [2]
+    second = retention.run_sync(now=NOW)
+    assert second["eligible"] == 3 and second["archived"] == 3
+    assert len(ids_in(engine, Notification)) == 0
+
+
+def test_archive_copies_every_notification_column():
+    notification_columns = {column.name for column in Notification.__table__.c}
+    assert set(COLUMNS) == notification_columns
+
+
+def test_inbox_statuses_cannot_be_archived():
+    for statuses in [("accepted", "read"), ("unread",), ()]:
+        try:
+            NotificationRetention(make_engine(), statuses=statuses)
+            assert False, f"{statuses} should be rejected"
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_moves_only_old_terminal_notifications()
+    test_existing_archive_copy_is_replaced_not_lost()
+    test_max_batches_and_dry_run_leave_the_rest()
+    test_archive_copies_every_notification_column()
+    test_inbox_statuses_cannot_be_archived()
+    print("✅ Notification retention tests passed")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Test the batched notification writer against an in-memory SQLite database.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from conftest import make_sqlite_engine
+from models import Notification
+from notification_writer import NotificationWriter
+
+
+def make_writer(create_table=True, **kwargs):
+    tables = [Notification.__table__] if create_table else []
+    engine = make_sqlite_engine(*tables)
+    return engine, NotificationWriter(engine, **kwargs)
+
+
+def bid(index, **overrides):
+    return {
+        "recipient_id": 7,
+        "recipient_type": "rider",
+        "sender_id": 100 + index,
+        "sender_type": "driver",
+        "notification_type": "bid",
+        "title": "Driver Bid Received",
+        "message": f"Bid {index}",
+        "bid_amount": 300 + index,
+        **overrides,
+    }
+
+
+def stored(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(
+            Notification.notification_id, Notification.message, Notification.status,
+        ).order_by(Notification.notification_id)).all()
+
+
+def test_concurrent_saves_share_one_batch():
+    engine, writer = make_writer(linger_ms=20)
+
+    async def scenario():
+        await writer.start()
+        ids = await asyncio.gather(*(writer.save(bid(index)) for index in range(50)))
+        await writer.stop()
+        return ids
+
+    ids = asyncio.run(scenario())
+    rows = stored(engine)
+    assert ids == [row.notification_id for row in rows]
+    assert [row.message for row in rows] == [f"Bid {index}" for index in range(50)]
+    assert all(row.status == "unread" for row in rows)
+    metrics = writer.metrics()
+    assert metrics["flushes"] == 1 and metrics["largest_batch"] == 50
+
+
+def test_batches_are_capped_at_batch_size():
+    engine, writer = make_writer(linger_ms=20, batch_size=8)
+
+    async def scenario():
+        await writer.start()
+        ids = await asyncio.gather(*(writer.save(bid(index)) for index in range(20)))
+        await writer.stop()
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert len(set(ids)) == 20 and len(stored(engine)) == 20
+    assert writer.metrics()["flushes"] == 3
+
+
+def test_async_durability_writes_in_background():
+    engine, writer = make_writer(durability="async")
+
+    async def scenario():
+        await writer.start()
+        skipped = await writer.save(bid(1))
+        waited = await writer.save(bid(2), wait=True)
+        await writer.stop()
+        return skipped, waited
+
+    skipped, waited = asyncio.run(scenario())
+    assert skipped is None
+    assert waited is not None
+    assert [row.message for row in stored(engine)] == ["Bid 1", "Bid 2"]
+
+
+def test_bad_row_does_not_sink_batch():
+    engine, writer = make_writer(linger_ms=20)
+
+    async def scenario():
+        await writer.start()
+        ids = await asyncio.gather(
+            writer.save(bid(1)), writer.save(bid(2, title=None)), writer.save(bid(3)))
+        await writer.stop()
+        return ids
+
+    first, rejected, third = asyncio.run(scenario())
+    assert rejected is None
+    assert [row.notification_id for row in stored(engine)] == [first, third]
+    assert writer.metrics()["rows_rejected"] == 1
+
+
+def test_database_errors_keep_the_batch_for_retry():
+    # "no such table" is an OperationalError, like a dropped connection
+    engine, writer = make_writer(create_table=False, retry_ms=20)
+
+    async def scenario():
+        await writer.start()
+        futures = [writer.submit(bid(index)) for index in range(3)]
+        await asyncio.sleep(0.05)
+        waiting = [future.done() for future in futures]
+        failed = writer.metrics()
+        Notification.__table__.create(engine)
+        ids = await asyncio.wait_for(asyncio.gather(*futures), timeout=1)
+        await writer.stop()
+        return waiting, failed, ids
+
+    waiting, failed, ids = asyncio.run(scenario())
+    assert waiting == [False, False, False]
+    assert failed["flush_errors"] >= 1 and failed["pending"] == 3
+    assert failed["rows_rejected"] == 0
+    assert ids == [row.notification_id for row in stored(engine)]
+    assert [row.message for row in stored(engine)] == ["Bid 0", "Bid 1", "Bid 2"]
+
+
+def test_unwritten_notifications_resolve_to_none_on_stop():
+    _, writer = make_writer(create_table=False, retry_ms=1000)
+
+    async def scenario():
+        await writer.start()
+        future = writer.submit(bid(1))
+        await asyncio.sleep(0.01)
+        await writer.stop()
+        return future
+
+    future = asyncio.run(scenario())
+    assert future.result() is None
+    assert writer.metrics()["rows_dropped"] == 1 and writer.metrics()["pending"] == 0
+
+
+def test_unknown_durability_is_rejected():
+    try:
+        make_writer(durability="eventually")
+        assert False, "unknown durability should raise"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_concurrent_saves_share_one_batch()
+    test_batches_are_capped_at_batch_size()
+    test_async_durability_writes_in_background()
+    test_bad_row_does_not_sink_batch()
+    test_database_errors_keep_the_batch_for_retry()
+    test_unwritten_notifications_resolve_to_none_on_stop()
+    test_unknown_durability_is_rejected()
+    print("✅ Notification writer tests passed")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test the per-connection send queue and its slow-consumer policies.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import OutboundQueue
+
+
+class StalledWebSocket:
+    """Never finishes a send, like a client on a dead mobile link."""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_text(self, message: str):
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def test_drop_oldest_keeps_bid_and_trip_frames():
+    async def scenario():
+        closed = []
+        queue = OutboundQueue("c-1", StalledWebSocket(), lambda cid, reason: closed.append(reason),
+                              maxsize=3, high_water=5, policy="drop_oldest")
+        queue.put("bid-1")
+        for index in range(4):
+            queue.put(f"location-{index}", droppable=True)
+        queue.put("trip-confirmed")
+        frames = [message for message, _ in queue._frames]
+        return queue, frames, closed
+
+    queue, frames, closed = asyncio.run(scenario())
+    assert frames == ["bid-1", "location-3", "trip-confirmed"]
+    assert queue.dropped == 3
+    assert closed == []
+
+
+def test_drop_oldest_disconnects_at_high_water():
+    async def scenario():
+        closed = []
+        websocket = StalledWebSocket()
+        queue = OutboundQueue("c-1", websocket, lambda cid, reason: closed.append((cid, reason)),
+                              maxsize=2, high_water=4, policy="drop_oldest")
+        accepted = [queue.put(f"bid-{index}") for index in range(6)]
+        await asyncio.sleep(0)
+        return queue, websocket, accepted, closed
+
+    queue, websocket, accepted, closed = asyncio.run(scenario())
+    assert accepted == [True, True, True, True, False, False]
+    assert queue.closed
+    assert closed == [("c-1", "slow_consumer")]
+    assert websocket.closed_with == 1013
+
+
+def test_disconnect_policy_never_drops():
+    async def scenario():
+        closed = []
+        queue = OutboundQueue("c-1", StalledWebSocket(), lambda cid, reason: closed.append(reason),
+                              maxsize=2, policy="disconnect")
+        results = [queue.put("location", droppable=True) for _ in range(3)]
+        return queue, results, closed
+
+    queue, results, closed = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert queue.dropped == 0
+    assert closed == ["slow_consumer"]
+
+
+def test_stalled_send_times_out_and_closes_socket():
+    async def scenario():
+        closed = []
+        websocket = StalledWebSocket()
+        queue = OutboundQueue("c-1", websocket, lambda cid, reason: closed.append(reason),
+                              send_timeout=0.01)
+        queue.start()
+        queue.put("bid-1")
+        queue.put("bid-2")
+        await queue.join()
+        await queue._close_task
+        return queue, websocket, closed
+
+    queue, websocket, closed = asyncio.run(scenario())
+    assert closed == ["send_timeout"]
+    assert queue.close_reason == "send_timeout"
+    assert queue.metrics()["timed_out"] == 1 and queue.sent == 0
+    assert websocket.closed_with == 1013
+
+
+if __name__ == "__main__":
+    test_drop_oldest_keeps_bid_and_trip_frames()
+    test_drop_oldest_disconnects_at_high_water()
+    test_disconnect_policy_never_drops()
+    test_stalled_send_times_out_and_closes_socket()
+    print("✅ Outbound queue tests passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test route simplification and Google polyline encoding.
+"""
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polyline import decode_polyline, encode_polyline, simplify, tolerance_for_zoom
+
+METRES_PER_DEGREE = 111_320
+
+
+def test_reference_vector():
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    encoded = encode_polyline(points)
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline(encoded) == points
+    assert encode_polyline([]) == ""
+
+
+def test_round_trip_keeps_five_decimals():
+    rng = random.Random(3)
+    points = [(round(rng.uniform(-89, 89), 5), round(rng.uniform(-179, 179), 5)) for _ in range(200)]
+    decoded = decode_polyline(encode_polyline(points))
+    assert all(abs(a - b) < 1e-9 for pair in zip(points, decoded) for a, b in zip(*pair))
+
+
+def test_collinear_points_are_dropped():
+    straight = [(23.8 + step * 0.0001, 90.4) for step in range(100)]
+    assert simplify(straight, 1.0) == [straight[0], straight[-1]]
+
+    # A right-angle turn keeps its corner
+    turn = straight + [(straight[-1][0], 90.4 + step * 0.0001) for step in range(1, 50)]
+    assert simplify(turn, 1.0) == [turn[0], straight[-1], turn[-1]]
+
+
+def test_simplified_path_stays_within_tolerance():
+    rng = random.Random(11)
+    points = [(23.8 + step * 0.0001, 90.4 + rng.gauss(0, 0.00005)) for step in range(500)]
+    tolerance_m = 10.0
+    kept = simplify(points, tolerance_m)
+    assert len(kept) < len(points)
+
+    # Every dropped point is within tolerance of the kept segment around it
+    scale = math.cos(math.radians(23.8)) * METRES_PER_DEGREE
+    kept_index = [points.index(point) for point in kept]
+    for first, last in zip(kept_index, kept_index[1:]):
+        (lat1, lon1), (lat2, lon2) = points[first], points[last]
+        for latitude, longitude in points[first + 1:last]:
+            # Chord is nearly north-south, so cross-track error is the east offset from it
+            t = (latitude - lat1) / (lat2 - lat1)
+            offset_m = abs(longitude - (lon1 + t * (lon2 - lon1))) * scale
+            assert offset_m <= tolerance_m + 0.5
+
+
+def test_tolerance_halves_per_zoom_level():
+    assert tolerance_for_zoom(15, 0.0, pixels=1) == tolerance_for_zoom(14, 0.0, pixels=1) / 2
+    assert round(tolerance_for_zoom(0, 0.0, pixels=1)) == 156543
+
+
+if __name__ == "__main__":
+    test_reference_vector()
+    test_round_trip_keeps_five_decimals()
+    test_collinear_points_are_dropped()
+    test_simplified_path_stays_within_tolerance()
+    test_tolerance_halves_per_zoom_level()
+    print("✅ Polyline tests passed")
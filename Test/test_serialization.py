@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test the shared JSON serializer and the cached active driver list.
+"""
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService
+from serialization import dumps, dumps_text, loads
+
+
+def test_round_trip_with_non_json_types():
+    encoded = dumps({1: "a", "amount": Decimal("12.50"), "at": datetime(2025, 1, 2, 3, 4, 5)})
+    assert isinstance(encoded, bytes)
+    assert loads(encoded) == {"1": "a", "amount": "12.50", "at": "2025-01-02T03:04:05"}
+    assert loads(dumps_text({"name": "ঢাকা"})) == {"name": "ঢাকা"}
+
+
+def test_active_drivers_json_is_reused_until_a_driver_moves():
+    service = DriverLocationService()
+    service._cache_location(1, 23.81, 90.41)
+    first = service.active_drivers_json()
+    assert service.active_drivers_json() is first
+
+    service._cache_location(2, 23.82, 90.42)
+    second = service.active_drivers_json()
+    assert second is not first
+    assert [driver["id"] for driver in loads(second)] == [1, 2]
+
+    service.remove_driver(1)
+    assert [driver["id"] for driver in loads(service.active_drivers_json())] == [2]
+
+
+if __name__ == "__main__":
+    test_round_trip_with_non_json_types()
+    test_active_drivers_json_is_reused_until_a_driver_moves()
+    print("✅ Serialization tests passed")
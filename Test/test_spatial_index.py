@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test the grid indexes used for nearby-driver queries and rider subscription areas.
+"""
+import os
+import random
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_location_service import DriverLocationService
+from spatial_index import AreaIndex, GridIndex, SubscriptionArea
+
+
+def test_grid_candidates_match_linear_scan():
+    """Every driver within the radius must be among the grid candidates."""
+    service = DriverLocationService()
+    rng = random.Random(7)
+    for driver_id in range(1, 2001):
+        service._cache_location(
+            driver_id,
+            23.8103 + rng.uniform(-0.3, 0.3),
+            90.4125 + rng.uniform(-0.3, 0.3),
+        )
+
+    for _ in range(20):
+        latitude = 23.8103 + rng.uniform(-0.3, 0.3)
+        longitude = 90.4125 + rng.uniform(-0.3, 0.3)
+        expected = {
+            driver_id
+            for driver_id, data in service.active_drivers.items()
+            if service._calculate_distance(latitude, longitude, data.latitude, data.longitude) <= 3.0
+        }
+        found = {d["driver_id"] for d in service.find_nearby_drivers(latitude, longitude, 3.0)}
+        assert found == expected
+
+
+def test_grid_moves_and_removes_keys():
+    index = GridIndex(cell_size_deg=0.1)
+    index.insert(1, 23.81, 90.41)
+    index.insert(1, 22.34, 91.82)  # Driver moved to another city
+
+    assert len(index) == 1
+    assert 1 not in set(index.candidates(23.81, 90.41, 2.0))
+    assert 1 in set(index.candidates(22.34, 91.82, 2.0))
+
+    assert index.remove(1) is True
+    assert index.remove(1) is False
+    assert list(index.candidates(22.34, 91.82, 2.0)) == []
+
+
+def test_limit_returns_closest_drivers():
+    service = DriverLocationService()
+    for driver_id in range(1, 51):
+        service._cache_location(driver_id, 23.8103 + driver_id * 0.0005, 90.4125)
+    service.remove_driver(3)  # Leaves a hole that the arrays must backfill
+
+    everyone = service.find_nearby_drivers(23.8103, 90.4125, 10.0)
+    top_five = service.find_nearby_drivers(23.8103, 90.4125, 10.0, limit=5)
+
+    assert [d["driver_id"] for d in top_five] == [1, 2, 4, 5, 6]
+    # Each call converts monotonic seen_at with its own wall-clock offset
+    def without_timestamps(drivers):
+        return [{**d, "timestamp": None} for d in drivers]
+
+    assert without_timestamps(top_five) == without_timestamps(everyone[:5])
+    for limited, unlimited in zip(top_five, everyone):
+        drift = datetime.fromisoformat(limited["timestamp"]) - datetime.fromisoformat(unlimited["timestamp"])
+        assert abs(drift.total_seconds()) < 0.01
+    assert set(everyone[0]) == {"driver_id", "latitude", "longitude", "timestamp", "distance_km"}
+
+
+def test_grid_wraps_antimeridian():
+    index = GridIndex()
+    index.insert("east", 0.0, 179.99)
+    index.insert("west", 0.0, -179.99)
+
+    assert {"east", "west"} <= set(index.candidates(0.0, 179.995, 5.0))
+
+
+def test_area_index_matches_exact_containment():
+    rng = random.Random(11)
+    index = AreaIndex()
+    areas = {}
+    for key in range(300):
+        if key % 2:
+            area = SubscriptionArea.circle(
+                23.8 + rng.uniform(-1, 1), 90.4 + rng.uniform(-1, 1), rng.uniform(0.5, 20))
+        else:
+            south, west = 23.8 + rng.uniform(-1, 1), 90.4 + rng.uniform(-1, 1)
+            area = SubscriptionArea.bbox(south, west, south + rng.uniform(0.01, 0.5), west + rng.uniform(0.01, 0.5))
+        areas[key] = area
+        index.insert(key, area)
+    index.insert("country", SubscriptionArea.bbox(20.0, 88.0, 27.0, 93.0))  # Wider than max_cells
+    areas["country"] = index.get("country")
+
+    for _ in range(200):
+        latitude, longitude = 23.8 + rng.uniform(-1.2, 1.2), 90.4 + rng.uniform(-1.2, 1.2)
+        expected = {key for key, area in areas.items() if area.contains(latitude, longitude)}
+        assert index.covering(latitude, longitude) == expected
+
+
+def test_area_index_replaces_and_removes_areas():
+    index = AreaIndex()
+    index.insert("rider", SubscriptionArea.circle(23.81, 90.41, 2.0))
+    assert index.covering(23.81, 90.41) == {"rider"}
+
+    index.insert("rider", SubscriptionArea.circle(22.35, 91.78, 2.0))
+    assert index.covering(23.81, 90.41) == set()
+    assert index.covering(22.35, 91.78) == {"rider"}
+
+    assert index.remove("rider") is True
+    assert index.covering(22.35, 91.78) == set()
+    assert len(index) == 0
+
+
+def test_bbox_area_crosses_antimeridian():
+    area = SubscriptionArea.bbox(-1.0, 179.5, 1.0, -179.5)
+    index = AreaIndex()
+    index.insert("pacific", area)
+
+    assert area.contains(0.0, 179.9) and area.contains(0.0, -179.9)
+    assert not area.contains(0.0, 0.0)
+    assert index.covering(0.0, -179.9) == {"pacific"}
+
+
+if __name__ == "__main__":
+    test_grid_candidates_match_linear_scan()
+    test_grid_moves_and_removes_keys()
+    test_limit_returns_closest_drivers()
+    test_grid_wraps_antimeridian()
+    test_area_index_matches_exact_containment()
+    test_area_index_replaces_and_removes_areas()
+    test_bbox_area_crosses_antimeridian()
+    print("✅ Spatial index tests passed")
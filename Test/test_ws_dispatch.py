@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test /ws message dispatch: routing, payload validation and latency metrics.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import OutboundQueue
+from schema import WSDriverBidOffer, WSLocationUpdate
+from serialization import loads
+from ws_dispatch import LatencyHistogram, MessageDispatcher, WSContext
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, message: str):
+        self.sent.append(loads(message))
+
+
+def make_dispatcher():
+    dispatcher = MessageDispatcher()
+    handled = []
+
+    @dispatcher.register("update-location", WSLocationUpdate)
+    async def handle_location(ctx, data, message):
+        handled.append(data)
+
+    @dispatcher.register("driver-bid-offer", WSDriverBidOffer)
+    async def handle_bid(ctx, data, message):
+        handled.append(data)
+
+    @dispatcher.register("ping")
+    async def handle_ping(ctx, data, message):
+        await ctx.send({"type": "pong", "timestamp": message.get("timestamp")})
+
+    return dispatcher, handled
+
+
+def run(dispatcher, *messages):
+    websocket = RecordingWebSocket()
+    ctx = WSContext(websocket, "c-1", user_id=7, user_role="driver")
+
+    async def scenario():
+        return [await dispatcher.dispatch(ctx, message) for message in messages]
+
+    return asyncio.run(scenario()), websocket.sent
+
+
+def test_valid_payload_reaches_handler_with_coerced_fields():
+    dispatcher, handled = make_dispatcher()
+    results, sent = run(dispatcher, {
+        "type": "update-location",
+        "data": {"id": "12", "latitude": 23.81, "longitude": 90.41, "speed": 31},
+    })
+    assert results == [True]
+    assert sent == []
+    # "id" is accepted as driver_id and extra fields are kept
+    assert handled == [{"driver_id": 12, "latitude": 23.81, "longitude": 90.41, "speed": 31}]
+
+
+def test_invalid_payload_is_rejected_before_the_handler():
+    dispatcher, handled = make_dispatcher()
+    results, sent = run(
+        dispatcher,
+        {"type": "update-location", "data": {"driver_id": 12, "latitude": 123.0, "longitude": 90.41}},
+        {"type": "driver-bid-offer", "data": {"driver_id": 12, "amount": 500}},
+        {"type": "driver-bid-offer"},
+    )
+    assert results == [False, False, False]
+    assert handled == []
+    assert [frame["type"] for frame in sent] == ["error", "error", "error"]
+    assert "latitude" in sent[0]["message"]
+    assert "req_id" in sent[1]["message"] and "rider_id" in sent[1]["message"]
+    assert dispatcher.metrics()["invalid"] == 3
+
+
+def test_driver_id_must_fit_a_binary_location_frame():
+    dispatcher, handled = make_dispatcher()
+    results, sent = run(
+        dispatcher,
+        {"type": "update-location", "data": {"driver_id": 2**32, "latitude": 23.81, "longitude": 90.41}},
+        {"type": "update-location", "data": {"id": -1, "latitude": 23.81, "longitude": 90.41}},
+        {"type": "update-location", "data": {"id": 2**32 - 1, "latitude": 23.81, "longitude": 90.41}},
+    )
+    assert results == [False, False, True]
+    assert [frame["type"] for frame in sent] == ["error", "error"]
+    assert [data["driver_id"] for data in handled] == [2**32 - 1]
+
+
+def test_bid_amount_is_forwarded_as_sent():
+    dispatcher, handled = make_dispatcher()
+    run(dispatcher, {
+        "type": "driver-bid-offer",
+        "data": {"req_id": 1, "rider_id": 2, "driver_id": 3, "amount": 500, "driver_name": "Karim"},
+    })
+    assert handled[0]["amount"] == 500
+    assert isinstance(handled[0]["amount"], int)
+    assert handled[0]["driver_name"] == "Karim"
+
+
+def test_unknown_type_echoes_only_the_type():
+    dispatcher, _ = make_dispatcher()
+    results, sent = run(dispatcher, {"type": "mystery", "data": {"secret": "x" * 1000}}, ["not", "a", "dict"])
+    assert results == [False, False]
+    assert sent[0] == {"type": "echo", "original_type": "mystery"}
+    assert sent[1]["type"] == "error"
+    assert dispatcher.metrics()["unknown"] == 1
+
+
+def test_handler_errors_propagate_and_are_counted():
+    dispatcher = MessageDispatcher()
+
+    @dispatcher.register("boom")
+    async def handle_boom(ctx, data, message):
+        raise RuntimeError("db down")
+
+    try:
+        run(dispatcher, {"type": "boom"})
+        assert False, "handler error should reach the endpoint"
+    except RuntimeError:
+        pass
+    metrics = dispatcher.metrics()
+    assert metrics["errors"] == 1
+    assert metrics["latency"]["boom"]["count"] == 1
+
+
+def test_duplicate_registration_is_rejected():
+    dispatcher, _ = make_dispatcher()
+    try:
+        dispatcher.register("ping")(lambda ctx, data, message: None)
+        assert False, "duplicate handler should be rejected"
+    except ValueError:
+        pass
+
+
+def test_replies_go_through_the_outbound_queue_once_connected():
+    dispatcher, _ = make_dispatcher()
+    websocket = RecordingWebSocket()
+
+    async def scenario():
+        queue = OutboundQueue("c-1", websocket)
+        ctx = WSContext(websocket, "c-1", outbound=queue)
+        await dispatcher.dispatch(ctx, {"type": "ping", "timestamp": 1})
+        # Queued for the writer task, not written by the handler
+        assert websocket.sent == [] and len(queue) == 1
+        queue.start()
+        await queue.join()
+
+    asyncio.run(scenario())
+    assert websocket.sent == [{"type": "pong", "timestamp": 1}]
+
+
+def test_latency_histogram_quantiles():
+    histogram = LatencyHistogram(buckets=(1, 5, 10))
+    for elapsed_ms in [0.5] * 90 + [4.0] * 9 + [30.0]:
+        histogram.observe(elapsed_ms)
+    stats = histogram.as_dict()
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == 1
+    assert stats["p99_ms"] == 5
+    assert stats["max_ms"] == 30.0
+    assert stats["buckets"] == {"le_1": 90, "le_5": 9, "le_10": 0, "inf": 1}
+
+
+def test_every_legacy_message_type_has_a_handler():
+    from ws_handlers import dispatcher
+
+    legacy_types = {
+        "ping", "new-client", "add-location", "driver-location", "update-location",
+        "nearby-drivers-resync", "subscribe-area", "unsubscribe-area", "new-trip-request",
+        "bid-from-driver", "driver-bid-offer", "rider-counter-offer", "driver-counter-offer",
+        "bid-accepted", "bid-accepted-for-confirmation", "trip-confirmed-by-driver",
+        "trip-cancelled-by-driver", "bid-rejected", "trip-location-update", "trip-ended",
+        "end-emergency-request", "end-emergency-confirmed", "end-emergency-cancelled", "broadcast",
+    }
+    assert legacy_types <= set(dispatcher.message_types)
+
+
+if __name__ == "__main__":
+    test_valid_payload_reaches_handler_with_coerced_fields()
+    test_invalid_payload_is_rejected_before_the_handler()
+    test_driver_id_must_fit_a_binary_location_frame()
+    test_bid_amount_is_forwarded_as_sent()
+    test_unknown_type_echoes_only_the_type()
+    test_handler_errors_propagate_and_are_counted()
+    test_duplicate_registration_is_rejected()
+    test_replies_go_through_the_outbound_queue_once_connected()
+    test_latency_histogram_quantiles()
+    test_every_legacy_message_type_has_a_handler()
+    print("✅ WebSocket dispatch tests passed")
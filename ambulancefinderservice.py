@@ -1,5 +1,6 @@
 from sqlmodel import Session
-from geoalchemy2.functions import ST_Distance, ST_GeomFromText
+from sqlalchemy import func
+from geoalchemy2.functions import ST_Distance, ST_DWithin
 from schema import NearbyDriversRequest
 from models import DriverLocation, Driver, EngagedDriver
 from fastapi import HTTPException
@@ -16,24 +17,29 @@ class AmbulanceService:
     @staticmethod
     def find_nearby_drivers(db: Session, request: NearbyDriversRequest):
         # Create reference point
-        ref_point = f'POINT({request.lon} {request.lat})'
+        ref_point = func.ST_GeogFromText(f'SRID=4326;POINT({request.lon} {request.lat})')
 
         try:
             # Subquery to get engaged drivers
             engaged_drivers_subquery = db.query(
                 EngagedDriver.driver_id).subquery()
 
-            # Query nearby drivers with a join to the Driver table and exclude engaged drivers
+            # Radius filter uses the GiST index on location; <-> orders by
+            # index-assisted KNN so only the closest `limit` rows are read
             results = db.query(
                 DriverLocation.driver_id,
                 Driver.name,
-                Driver.mobile
+                Driver.mobile,
+                ST_Distance(DriverLocation.location, ref_point).label("distance_m")
             ).join(
                 Driver, DriverLocation.driver_id == Driver.driver_id
             ).filter(
                 Driver.is_available == True,
-                ~DriverLocation.driver_id.in_(engaged_drivers_subquery)
-            ).all()
+                ~DriverLocation.driver_id.in_(engaged_drivers_subquery),
+                ST_DWithin(DriverLocation.location, ref_point, request.radius * 1000)
+            ).order_by(
+                DriverLocation.location.op("<->")(ref_point)
+            ).limit(request.limit).all()
 
             # Convert results to list of dictionaries
             nearby_drivers = []
@@ -41,7 +47,8 @@ class AmbulanceService:
                 nearby_drivers.append({
                     "driver_id": result.driver_id,
                     "name": result.name,
-                    "mobile": result.mobile
+                    "mobile": result.mobile,
+                    "distance_km": round(result.distance_m / 1000, 2)
                 })
 
             return nearby_drivers
@@ -1,5 +1,5 @@
 
-from fastapi import FastAPI, Response, APIRouter, Depends, HTTPException, Header, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, Response, APIRouter, Depends, HTTPException, Header, Query, WebSocket, WebSocketDisconnect, Request
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, List
 import ambulancefinderservice
@@ -7,7 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import location_service
 import json
 from datetime import datetime
-from db import get_session, engine
+from db import get_session, engine, pool_metrics
 # import models
 from models import Driver, Rider, TripRequest, DriverResponse, OngoingTrip, Notification, Hospital
 from sqlmodel import SQLModel
@@ -25,148 +25,30 @@ from schema import (
 )
 from schema import TokenData
 from driver_location_service import driver_location_service
+from driver_stream import driver_stream
+from location_writer import location_writer
+from counters import counter_cache
+from notification_channel import notification_channel
+from notification_retention import NOTIFICATION_RETENTION, notification_retention
+from notification_writer import NOTIFICATION_WRITE_MODE, notification_writer
+from location_history import LOCATION_HISTORY, ROUTE_MAX_POINTS, downsample, load_track, location_history
+from notification_inbox import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    inbox_page,
+    notification_view,
+    parse_cursor,
+)
+from polyline import MAX_ZOOM, MIN_ZOOM, encode_polyline, simplify, tolerance_for_zoom
+import ws_repository
+from connection_manager import manager
+from serialization import DefaultJSONResponse, dumps_text, loads
+from location_codec import BINARY_SUBPROTOCOL
+from ws_dispatch import WSContext
+from ws_handlers import dispatcher
 
-# WebSocket Connection Manager
-
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        
-        self.user_connections: Dict[int, str] = {}
-        
-        self.user_info: Dict[int, dict] = {}
-        
-        self.driver_locations: Dict[int, dict] = {}
-
-    async def connect(self, websocket: WebSocket, connection_id: str, user_id: int = None, user_role: str = None):
-        
-        self.active_connections[connection_id] = websocket
-        if user_id:
-            self.user_connections[user_id] = connection_id
-            self.user_info[user_id] = {
-                "role": user_role, "connection_id": connection_id}
-
-    def disconnect(self, connection_id: str, user_id: int = None):
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
-        if user_id and user_id in self.user_connections:
-            del self.user_connections[user_id]
-            if user_id in self.user_info:
-                del self.user_info[user_id]
-          
-            if user_id in self.driver_locations:
-                del self.driver_locations[user_id]
-
-    async def send_personal_message(self, message: str, connection_id: str):
-        if connection_id in self.active_connections:
-            websocket = self.active_connections[connection_id]
-            await websocket.send_text(message)
-
-    async def send_to_user(self, message: str, user_id):
-       
-        user_id_int = int(user_id)
-        print(f"🔍 Looking for user connection: {user_id_int}")
-        print(
-            f"🔍 Available user connections: {list(self.user_connections.keys())}")
-
-        if user_id_int in self.user_connections:
-            connection_id = self.user_connections[user_id_int]
-            print(
-                f"🔍 Found connection for user {user_id_int}: {connection_id}")
-            await self.send_personal_message(message, connection_id)
-            return True
-        else:
-            print(f"❌ No connection found for user {user_id_int}")
-            return False
-
-    async def broadcast_to_riders(self, message: str):
-        """Broadcast message only to riders"""
-        for user_id, info in self.user_info.items():
-            if info.get("role") == "rider":
-                await self.send_to_user(message, user_id)
-
-    async def broadcast(self, message: str):
-        for connection_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(message)
-            except:
-                # Remove disconnected connections
-                self.disconnect(connection_id)
-
-    def update_driver_location(self, driver_id: int, latitude: float, longitude: float):
-        """Update driver location and return nearby riders"""
-        self.driver_locations[driver_id] = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "timestamp": datetime.now().isoformat()
-        }
-        return self.get_nearby_riders(driver_id, latitude, longitude)
-
-    def get_nearby_riders(self, driver_id: int, latitude: float, longitude: float, radius_km: float = 5.0):
-        
-        return [user_id for user_id, info in self.user_info.items() if info.get("role") == "rider"]
-
-    def get_all_driver_locations(self):
-       
-        return self.driver_locations
-
-
-manager = ConnectionManager()
-
-
-async def save_notification_to_db(notification_data: dict):
-    
-    try:
-        from db import SessionLocal
-        session = SessionLocal()
-
-        print(f"💾 Inserting notification into database...")
-        print(
-            f"   - Recipient: {notification_data.get('recipient_id')} ({notification_data.get('recipient_type')})")
-        print(
-            f"   - Sender: {notification_data.get('sender_id')} ({notification_data.get('sender_type')})")
-        print(f"   - Type: {notification_data.get('notification_type')}")
-        print(f"   - Amount: ৳{notification_data.get('bid_amount')}")
-        print(f"   - Trip ID: {notification_data.get('trip_id')}")
-
-        notification = Notification(
-            recipient_id=notification_data.get("recipient_id"),
-            recipient_type=notification_data.get("recipient_type", "rider"),
-            sender_id=notification_data.get("sender_id"),
-            sender_type=notification_data.get("sender_type", "driver"),
-            notification_type=notification_data.get(
-                "notification_type", "bid"),
-            title=notification_data.get("title"),
-            message=notification_data.get("message"),
-            req_id=notification_data.get("req_id"),
-            trip_id=notification_data.get("trip_id"),
-            bid_amount=notification_data.get("bid_amount"),
-            original_amount=notification_data.get("original_amount"),
-            pickup_location=notification_data.get("pickup_location"),
-            destination=notification_data.get("destination"),
-            driver_name=notification_data.get("driver_name"),
-            driver_mobile=notification_data.get("driver_mobile"),
-            rider_name=notification_data.get("rider_name"),
-            status="unread"
-        )
-
-        session.add(notification)
-        session.commit()
-        notification_id = notification.notification_id
-        session.close()
-
-        print(
-            f"✅ Notification successfully inserted into database with ID: {notification_id}")
-        return notification_id
-    except Exception as e:
-        print(f"❌ Error saving notification to database: {str(e)}")
-        if 'session' in locals():
-            session.rollback()
-            session.close()
-        return None
 
-app = FastAPI()
+app = FastAPI(default_response_class=DefaultJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -179,6 +61,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def start_background_writers():
+    """Start buffered persistence, cross-worker messaging, driver expiry and the driver stream."""
+    if driver_location_service.location_writer is not None:
+        await driver_location_service.location_writer.start()
+    if LOCATION_HISTORY == "on":
+        await location_history.start()
+    if NOTIFICATION_WRITE_MODE == "batched":
+        await notification_writer.start()
+    await notification_channel.start()
+    if NOTIFICATION_RETENTION == "on":
+        await notification_retention.start()
+    await manager.start()
+    await driver_location_service.start()
+    await driver_stream.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_writers():
+    """Flush anything still buffered before the worker exits."""
+    await driver_stream.stop()
+    await driver_location_service.stop()
+    await manager.stop()
+    if driver_location_service.location_writer is not None:
+        await driver_location_service.location_writer.stop()
+    await location_history.stop()
+    await notification_writer.stop()
+    await notification_channel.stop()
+    await notification_retention.stop()
+
 # Update notification status
 
 
@@ -235,6 +148,25 @@ def read_root():
     return {"message": "Rapid Rescue API is running", "status": "healthy"}
 
 
+@app.get("/internal/metrics")
+def get_internal_metrics():
+    """Runtime metrics for buffers and background workers."""
+    return {
+        "location_writer": location_writer.metrics(),
+        "websockets": manager.metrics(),
+        "driver_stream": driver_stream.metrics(),
+        "ws_dispatch": dispatcher.metrics(),
+        "location_filter": driver_location_service.filter_metrics(),
+        "drivers": driver_location_service.expiry_metrics(),
+        "location_history": location_history.metrics(),
+        "db_pool": pool_metrics(engine),
+        "counters": counter_cache.metrics(),
+        "notification_writer": notification_writer.metrics(),
+        "notification_channel": notification_channel.metrics(),
+        "notification_retention": notification_retention.metrics(),
+    }
+
+
 @app.post("/hospitals")
 def create_hospital(
     payload: dict,
@@ -317,15 +249,9 @@ def delete_hospital(hospital_id: int, session: Session = Depends(get_session)):
 def get_driver_count(session: Session = Depends(get_session)):
     """Get real-time count of available and total drivers."""
     try:
-        from models import Driver
-
-        # Get count of available drivers
-        available_drivers = session.query(Driver).filter(
-            Driver.is_available == True
-        ).count()
-
-        # Get total drivers count
-        total_drivers = session.query(Driver).count()
+        counts = counter_cache.driver_counts(session)
+        available_drivers = counts["available"]
+        total_drivers = counts["total"]
 
         print(
             f"🚑 Found {available_drivers} available drivers out of {total_drivers} total drivers")
@@ -347,14 +273,9 @@ def get_driver_count(session: Session = Depends(get_session)):
 def get_available_drivers_count(session: Session = Depends(get_session)):
     """Get count of available drivers based on is_available column."""
     try:
-        from models import Driver
-
-        # Count available drivers (is_available = True)
-        available_count = session.query(Driver).filter(
-            Driver.is_available == True).count()
-
-        # Count total drivers for comparison
-        total_count = session.query(Driver).count()
+        counts = counter_cache.driver_counts(session)
+        available_count = counts["available"]
+        total_count = counts["total"]
 
         # Count unavailable drivers
         unavailable_count = total_count - available_count
@@ -563,7 +484,7 @@ async def create_trip_request(
             Rider.rider_id == trip_request.rider_id).first()
 
         # Broadcast to all drivers via WebSocket
-        await manager.broadcast(json.dumps({
+        fanout = await manager.broadcast(dumps_text({
             "type": "new-trip-request",
             "data": {
                 "req_id": trip_request.req_id,
@@ -578,6 +499,9 @@ async def create_trip_request(
                 "status": trip_request.status
             }
         }))
+        print(
+            f"📣 Trip request {trip_request.req_id} queued for {fanout.delivered} connections "
+            f"({fanout.failed} failed)")
 
         return {
             "success": True,
@@ -776,7 +700,7 @@ async def create_driver_response(
 
         if trip_request:
             # Send response to rider via WebSocket
-            await manager.send_to_user(json.dumps({
+            await manager.send_to_user(dumps_text({
                 "type": "bid-from-driver",
                 "data": {
                     "response_id": driver_response.response_id,
@@ -873,7 +797,7 @@ async def create_ongoing_trip(
             session.commit()
 
         # Notify both rider and driver
-        await manager.send_to_user(json.dumps({
+        await manager.send_to_user(dumps_text({
             "type": "trip-confirmed",
             "data": {
                 "trip_id": ongoing_trip.trip_id,
@@ -888,7 +812,7 @@ async def create_ongoing_trip(
             }
         }), ongoing_trip.rider_id)
 
-        await manager.send_to_user(json.dumps({
+        await manager.send_to_user(dumps_text({
             "type": "trip-confirmed",
             "data": {
                 "trip_id": ongoing_trip.trip_id,
@@ -1278,7 +1202,8 @@ async def create_test_trip_with_coordinates(session: Session = Depends(get_sessi
         test_driver_location = DriverLocation(
             driver_id=1,  # Assuming driver has ID 1
             latitude=23.815,
-            longitude=90.42
+            longitude=90.42,
+            location=location_service.to_geography_wkt(23.815, 90.42)
         )
         session.add(test_driver_location)
         session.commit()
@@ -1342,7 +1267,7 @@ async def end_ongoing_trip(
         session.commit()
 
         # Notify both rider and driver
-        await manager.send_to_user(json.dumps({
+        await manager.send_to_user(dumps_text({
             "type": "trip-ended",
             "data": {
                 "trip_id": trip.trip_id,
@@ -1351,7 +1276,7 @@ async def end_ongoing_trip(
             }
         }), trip.rider_id)
 
-        await manager.send_to_user(json.dumps({
+        await manager.send_to_user(dumps_text({
             "type": "trip-ended",
             "data": {
                 "trip_id": trip.trip_id,
@@ -1369,6 +1294,89 @@ async def end_ongoing_trip(
             status_code=500, detail=f"Error ending trip: {str(e)}")
 
 
+def _trip_for_party(trip_id: int, current_user: TokenData, session: Session) -> OngoingTrip:
+    """The trip, if the current user is its rider or driver."""
+    trip = session.query(OngoingTrip).filter(
+        OngoingTrip.trip_id == trip_id
+    ).first()
+
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    party_id = trip.rider_id if current_user.role == "rider" else trip.driver_id
+    if current_user.sub != str(party_id):
+        raise HTTPException(status_code=403, detail="Not a party to this trip")
+    return trip
+
+
+@app.get("/ongoing-trips/{trip_id}/route")
+async def get_trip_route(
+    trip_id: int,
+    max_points: int = Query(ROUTE_MAX_POINTS, ge=2, le=5000),
+    current_user: TokenData = Depends(get_current_user_flexible),
+    session: Session = Depends(get_session)
+):
+    """Driver's recorded path for a trip, downsampled to at most max_points."""
+    trip = _trip_for_party(trip_id, current_user, session)
+    try:
+        track = load_track(session, trip.driver_id, trip.start_time, trip.end_time)
+        points = downsample(track, max_points)
+        return {
+            "success": True,
+            "trip_id": trip.trip_id,
+            "driver_id": trip.driver_id,
+            "status": trip.status,
+            "start_time": trip.start_time.isoformat() if trip.start_time else None,
+            "end_time": trip.end_time.isoformat() if trip.end_time else None,
+            "recorded_points": len(track),
+            "points": [
+                {
+                    "latitude": point.latitude,
+                    "longitude": point.longitude,
+                    "recorded_at": point.recorded_at.isoformat()
+                }
+                for point in points
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error getting trip route: {str(e)}")
+
+
+@app.get("/ongoing-trips/{trip_id}/polyline")
+async def get_trip_polyline(
+    trip_id: int,
+    zoom: float = Query(15, ge=MIN_ZOOM, le=MAX_ZOOM),
+    current_user: TokenData = Depends(get_current_user_flexible),
+    session: Session = Depends(get_session)
+):
+    """
+    Driver's recorded path for a trip as a Google encoded polyline.
+
+    The path is simplified with Douglas-Peucker to about one pixel of error
+    at the map zoom the client is showing.
+    """
+    trip = _trip_for_party(trip_id, current_user, session)
+    try:
+        track = load_track(session, trip.driver_id, trip.start_time, trip.end_time)
+        points = [(point.latitude, point.longitude) for point in track]
+        tolerance_m = tolerance_for_zoom(zoom, points[0][0]) if points else 0.0
+        simplified = simplify(points, tolerance_m)
+        return {
+            "success": True,
+            "trip_id": trip.trip_id,
+            "driver_id": trip.driver_id,
+            "status": trip.status,
+            "zoom": zoom,
+            "tolerance_m": round(tolerance_m, 2),
+            "recorded_points": len(points),
+            "simplified_points": len(simplified),
+            "polyline": encode_polyline(simplified)
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error getting trip polyline: {str(e)}")
+
+
 """Endpoints for driver location and finding nearby drivers."""
 
 
@@ -1393,10 +1401,12 @@ async def websocket_endpoint(websocket: WebSocket):
     """
     connection_id = None
     user_id = None
+    user_role = None
 
     try:
-        # Accept the WebSocket connection
-        await websocket.accept()
+        # Accept the WebSocket connection; clients may opt in to binary location frames
+        binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
 
         # Generate a unique connection ID
         import uuid
@@ -1414,16 +1424,17 @@ async def websocket_endpoint(websocket: WebSocket):
                 user_role = payload.get("role", "unknown")
 
                 # Store connection with user info
-                await manager.connect(websocket, connection_id, user_id, user_role)
+                await manager.connect(websocket, connection_id, user_id, user_role, binary)
 
-                # Send welcome message
-                await websocket.send_text(json.dumps({
+                # Send welcome message; from here on the connection's outbound
+                # queue is the only writer to the socket
+                await manager.send_personal_message(dumps_text({
                     "type": "connection_established",
                     "message": "WebSocket connected successfully",
                     "user_id": user_id,
                     "user_role": user_role,
                     "connection_id": connection_id
-                }))
+                }), connection_id)
 
                 # If it's a driver, add them to the location service
                 if user_role == "driver":
@@ -1433,925 +1444,60 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # If it's a rider, send current driver locations
                 if user_role == "rider":
-                    # Get drivers from database
-                    from sqlmodel import Session, select
-                    from models import Driver, DriverLocation
-
-                    with Session(engine) as db:
-                        # Get only available drivers with their locations
-                        statement = select(Driver, DriverLocation).join(
-                            DriverLocation, Driver.driver_id == DriverLocation.driver_id
-                        ).filter(Driver.is_available == True)
-                        results = db.exec(statement).all()
-
-                        drivers_data = []
-                        for driver, location in results:
-                            drivers_data.append({
-                                "id": driver.driver_id,
-                                "latitude": location.latitude,
-                                "longitude": location.longitude,
-                                "timestamp": datetime.now().isoformat(),
-                                "name": driver.name,
-                                "status": "available"
-                            })
-
-                        print(
-                            f"🚑 Found {len(drivers_data)} available drivers from database")
-
-                        await websocket.send_text(json.dumps({
-                            "type": "nearby-drivers",
-                            "data": drivers_data
-                        }))
+                    # Get only available drivers with their locations
+                    drivers_data = await ws_repository.run_db(
+                        ws_repository.get_available_driver_locations)
+
+                    print(
+                        f"🚑 Found {len(drivers_data)} available drivers from database")
+
+                    await manager.send_personal_message(dumps_text({
+                        "type": "nearby-drivers",
+                        "data": drivers_data
+                    }), connection_id)
+
+                    # Live positions; nearby-drivers-delta frames follow from here
+                    await manager.send_personal_message(driver_stream.snapshot_payload(), connection_id)
 
             except Exception as e:
-                await websocket.send_text(json.dumps({
+                error = dumps_text({
                     "type": "error",
                     "message": "Invalid authentication token"
-                }))
+                })
+                if await manager.send_personal_message(error, connection_id):
+                    # Failed after connect(): let the writer send it before closing
+                    await manager.flush(connection_id)
+                else:
+                    await websocket.send_text(error)
                 await websocket.close()
                 return
         else:
             # Anonymous connection
-            await manager.connect(websocket, connection_id)
-            await websocket.send_text(json.dumps({
+            await manager.connect(websocket, connection_id, binary=binary)
+            await manager.send_personal_message(dumps_text({
                 "type": "connection_established",
                 "message": "WebSocket connected successfully (anonymous)",
                 "connection_id": connection_id
-            }))
+            }), connection_id)
 
         # Listen for messages
+        context = WSContext(websocket, connection_id, user_id, user_role, binary,
+                            manager.outbound.get(connection_id))
         while True:
             try:
-                data = await websocket.receive_text()
-                message_data = json.loads(data)
-
-                # Handle different message types
-                message_type = message_data.get("type", "unknown")
-
-                if message_type == "ping":
-                    await websocket.send_text(json.dumps({
-                        "type": "pong",
-                        "timestamp": message_data.get("timestamp")
-                    }))
-                elif message_type == "new-client":
-                    # Handle new client connection
-                    client_data = message_data.get("data", {})
-                    client_id = client_data.get("id")
-                    client_role = client_data.get("role")
-                    client_token = client_data.get("token")
-
-                    await websocket.send_text(json.dumps({
-                        "type": "client_registered",
-                        "message": f"Client {client_id} ({client_role}) registered successfully",
-                        "client_id": client_id,
-                        "client_role": client_role
-                    }))
-                elif message_type == "add-location":
-                    # Handle initial location update
-                    location_data = message_data.get("data", {})
-                    driver_id = location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
-
-                    # Update driver location using service
-                    print(
-                        f"🔄 Updating driver {driver_id} location: {latitude}, {longitude}")
-                    success = driver_location_service.update_driver_location(
-                        driver_id, latitude, longitude)
-                    print(f"📊 Update result: {success}")
-
-                    if success:
-                        # Acknowledge to driver
-                        await websocket.send_text(json.dumps({
-                            "type": "location_updated",
-                            "message": f"Location updated for driver {driver_id}",
-                            "data": {
-                                "driver_id": driver_id,
-                                "latitude": latitude,
-                                "longitude": longitude,
-                                "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
-                            }
-                        }))
-
-                        # Broadcast to all riders
-                        driver_location_message = json.dumps({
-                            "type": "driver-location",
-                            "data": {
-                                "driver_id": driver_id,
-                                "latitude": latitude,
-                                "longitude": longitude,
-                                "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
-                            }
-                        })
-                        await manager.broadcast_to_riders(driver_location_message)
-                elif message_type == "driver-location":
-                    # Handle driver location update from frontend
-                    location_data = message_data.get("data", {})
-                    driver_id = location_data.get(
-                        "id") or location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
-
-                    if driver_id and latitude and longitude:
-                        print(
-                            f"🔄 Driver {driver_id} location update: {latitude}, {longitude}")
-                        success = driver_location_service.update_driver_location(
-                            driver_id, latitude, longitude)
-                        print(f"📊 Update result: {success}")
-
-                        if success:
-                            # Broadcast to all riders
-                            driver_location_message = json.dumps({
-                                "type": "driver-location",
-                                "data": {
-                                    "driver_id": driver_id,
-                                    "latitude": latitude,
-                                    "longitude": longitude,
-                                    "timestamp": datetime.now().isoformat()
-                                }
-                            })
-                            await manager.broadcast_to_riders(driver_location_message)
-                elif message_type == "update-location":
-                    # Handle location update
-                    location_data = message_data.get("data", {})
-                    driver_id = location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
-
-                    # Update driver location using service
-                    print(
-                        f"🔄 Updating driver {driver_id} location: {latitude}, {longitude}")
-                    success = driver_location_service.update_driver_location(
-                        driver_id, latitude, longitude)
-                    print(f"📊 Update result: {success}")
-
-                    if success:
-                        # Acknowledge to driver
-                        await websocket.send_text(json.dumps({
-                            "type": "location_updated",
-                            "message": f"Location updated for driver {driver_id}",
-                            "data": {
-                                "driver_id": driver_id,
-                                "latitude": latitude,
-                                "longitude": longitude,
-                                "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
-                            }
-                        }))
-
-                        # Broadcast to all riders
-                        driver_location_message = json.dumps({
-                            "type": "driver-location",
-                            "data": {
-                                "driver_id": driver_id,
-                                "latitude": latitude,
-                                "longitude": longitude,
-                                "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
-                            }
-                        })
-                        await manager.broadcast_to_riders(driver_location_message)
-
-                        # Broadcast updated driver list to all riders
-                        driver_locations = driver_location_service.get_all_active_drivers()
-                        await manager.broadcast_to_riders(json.dumps({
-                            "type": "nearby-drivers",
-                            "data": [
-                                {
-                                    "id": driver_id,
-                                    "latitude": info["latitude"],
-                                    "longitude": info["longitude"],
-                                    "timestamp": info["timestamp"]
-                                }
-                                for driver_id, info in driver_locations.items()
-                            ]
-                        }))
-                elif message_type == "new-trip-request":
-                    # Handle new trip request from rider
-                    trip_data = message_data.get("data", {})
-                    print(
-                        f"🚨 New trip request received: {trip_data.get('req_id')}")
-
-                    # Broadcast to all drivers
-                    await manager.broadcast(json.dumps({
-                        "type": "new-trip-request",
-                        "data": trip_data
-                    }))
-
-                elif message_type == "bid-from-driver":
-                    # Handle driver bid/response
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"🚑 Driver bid received from driver: {bid_data.get('driver_id')}")
-                    print(f"🚑 Bid data: {bid_data}")
-                    print(f"🚑 Target rider ID: {bid_data.get('rider_id')}")
-
-                    # Send to specific rider
-                    if bid_data.get("rider_id"):
-                        message_to_send = json.dumps({
-                            "type": "bid-from-driver",
-                            "data": bid_data
-                        })
-                        print(
-                            f"🚑 Sending message to rider {bid_data['rider_id']}: {message_to_send}")
-                        success = await manager.send_to_user(message_to_send, bid_data["rider_id"])
-                        print(f"🚑 Message sent successfully: {success}")
-                    else:
-                        print("❌ No rider_id in bid data, cannot send message")
-
-                elif message_type == "driver-bid-offer":
-                    # Handle driver bid offer
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"🚑 Driver bid offer: {bid_data.get('driver_id')} -> {bid_data.get('rider_id')}")
-
-                    # Get rider name, coordinates, and create ongoing trip with coordinates
-                    rider_name = "Rider"  # Default fallback
-                    rider_latitude = None
-                    rider_longitude = None
-                    driver_latitude = None
-                    driver_longitude = None
-                    ongoing_trip_id = None
-                    dirde_id = None
-
-                    try:
-                        from db import SessionLocal
-                        from models import TripRequest, Rider, DriverLocation, OngoingTrip, Dirde
-                        session = SessionLocal()
-
-                        # Get trip request details including rider coordinates
-                        trip_request = session.query(TripRequest).filter(
-                            TripRequest.req_id == bid_data.get("req_id")
-                        ).first()
-
-                        if trip_request:
-                            # Get rider name from the rider_id
-                            rider = session.query(Rider).filter(
-                                Rider.rider_id == trip_request.rider_id
-                            ).first()
-                            if rider:
-                                rider_name = rider.name or rider.email or "Rider"
-
-                            # Get rider coordinates from trip request
-                            rider_latitude = trip_request.latitude
-                            rider_longitude = trip_request.longitude
-
-                        # Get driver coordinates from DriverLocation table
-                        driver_location = session.query(DriverLocation).filter(
-                            DriverLocation.driver_id == bid_data.get(
-                                "driver_id")
-                        ).first()
-
-                        if driver_location:
-                            driver_latitude = driver_location.latitude
-                            driver_longitude = driver_location.longitude
-
-                        # Create OngoingTrip record with coordinates when driver sends bid
-                        if trip_request:
-                            ongoing_trip = OngoingTrip(
-                                req_id=bid_data.get("req_id"),
-                                rider_id=bid_data.get("rider_id"),
-                                driver_id=bid_data.get("driver_id"),
-                                pickup_location=bid_data.get(
-                                    "pickup_location", trip_request.pickup_location),
-                                destination=bid_data.get(
-                                    "destination", trip_request.destination),
-                                fare=bid_data.get("amount", trip_request.fare),
-                                status="pending_confirmation",  # Status until rider accepts
-                                rider_latitude=rider_latitude,
-                                rider_longitude=rider_longitude,
-                                driver_latitude=driver_latitude,
-                                driver_longitude=driver_longitude
-                            )
-
-                            session.add(ongoing_trip)
-                            session.commit()
-                            session.refresh(ongoing_trip)
-                            ongoing_trip_id = ongoing_trip.trip_id
-
-                            print(f"✅ OngoingTrip created with coordinates:")
-                            print(f"   Trip ID: {ongoing_trip_id}")
-                            print(
-                                f"   Rider coordinates: {rider_latitude}, {rider_longitude}")
-                            print(
-                                f"   Driver coordinates: {driver_latitude}, {driver_longitude}")
-
-                        # Create Dirde record with coordinates when driver sends bid
-                        if rider_latitude and rider_longitude and driver_latitude and driver_longitude:
-                            # Check if Dirde record already exists for this rider-driver pair
-                            existing_dirde = session.query(Dirde).filter(
-                                Dirde.rider_id == bid_data.get("rider_id"),
-                                Dirde.driver_id == bid_data.get("driver_id")
-                            ).first()
-
-                            if existing_dirde:
-                                # Update existing record
-                                existing_dirde.rider_latitude = rider_latitude
-                                existing_dirde.rider_longitude = rider_longitude
-                                existing_dirde.driver_latitude = driver_latitude
-                                existing_dirde.driver_longitude = driver_longitude
-                                existing_dirde.timestamp = datetime.utcnow()
-                                existing_dirde.status = "active"
-
-                                session.commit()
-                                session.refresh(existing_dirde)
-                                dirde_id = existing_dirde.dirde_id
-
-                                print(
-                                    f"✅ Updated existing Dirde record: {dirde_id}")
-                            else:
-                                # Create new Dirde record
-                                new_dirde = Dirde(
-                                    rider_id=bid_data.get("rider_id"),
-                                    driver_id=bid_data.get("driver_id"),
-                                    rider_latitude=rider_latitude,
-                                    rider_longitude=rider_longitude,
-                                    driver_latitude=driver_latitude,
-                                    driver_longitude=driver_longitude,
-                                    status="active"
-                                )
-
-                                session.add(new_dirde)
-                                session.commit()
-                                session.refresh(new_dirde)
-                                dirde_id = new_dirde.dirde_id
-
-                                print(
-                                    f"✅ Created new Dirde record: {dirde_id}")
-                                print(
-                                    f"   Rider coordinates: {rider_latitude}, {rider_longitude}")
-                                print(
-                                    f"   Driver coordinates: {driver_latitude}, {driver_longitude}")
-
-                        session.close()
-                    except Exception as e:
-                        print(
-                            f"⚠️ Could not fetch coordinates or create ongoing trip: {e}")
-                        rider_name = "Rider"
-
-                    # Save notification to database
-                    notification_data = {
-                        "recipient_id": bid_data.get("rider_id"),
-                        "recipient_type": "rider",
-                        "sender_id": bid_data.get("driver_id"),
-                        "sender_type": "driver",
-                        "notification_type": "bid",
-                        "title": "Driver Bid Received",
-                        "message": f"{bid_data.get('driver_name', 'Driver')} offered ৳{bid_data.get('amount')} for your trip",
-                        "req_id": bid_data.get("req_id"),
-                        "bid_amount": bid_data.get("amount"),
-                        "pickup_location": bid_data.get("pickup_location"),
-                        "destination": bid_data.get("destination"),
-                        "driver_name": bid_data.get("driver_name"),
-                        "driver_mobile": bid_data.get("driver_mobile"),
-                        "rider_name": rider_name,
-                    }
-
-                    # Insert into Notification database table
-                    notification_id = await save_notification_to_db(notification_data)
-                    if notification_id:
-                        print(
-                            f"✅ Notification saved to database with ID: {notification_id}")
-                    else:
-                        print("❌ Failed to save notification to database")
-
-                    # Send to specific rider with trip ID and coordinates
-                    if bid_data.get("rider_id"):
-                        bid_data_with_trip = {
-                            **bid_data,
-                            "ongoing_trip_id": ongoing_trip_id,
-                            "dirde_id": dirde_id,
-                            "rider_latitude": rider_latitude,
-                            "rider_longitude": rider_longitude,
-                            "driver_latitude": driver_latitude,
-                            "driver_longitude": driver_longitude
-                        }
-
-                        await manager.send_to_user(json.dumps({
-                            "type": "driver-bid-offer",
-                            "data": bid_data_with_trip
-                        }), bid_data["rider_id"])
-
-                elif message_type == "rider-counter-offer":
-                    # Handle rider counter offer
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"🚗 Rider counter offer: {bid_data.get('rider_id')} -> {bid_data.get('driver_id')}")
-
-                    # Get rider name and driver name
-                    rider_name = "Rider"  # Default fallback
-                    driver_name = "Driver"  # Default fallback
-                    try:
-                        from db import SessionLocal
-                        from models import Rider, Driver
-                        session = SessionLocal()
-
-                        # Get rider name
-                        rider = session.query(Rider).filter(
-                            Rider.rider_id == bid_data.get("rider_id")
-                        ).first()
-                        if rider:
-                            rider_name = rider.name or rider.email or "Rider"
-
-                        # Get driver name
-                        driver = session.query(Driver).filter(
-                            Driver.driver_id == bid_data.get("driver_id")
-                        ).first()
-                        if driver:
-                            driver_name = driver.name or driver.email or "Driver"
-
-                        session.close()
-                    except Exception as e:
-                        print(f"⚠️ Could not fetch names: {e}")
-
-                    # Save notification to database
-                    notification_data = {
-                        "recipient_id": bid_data.get("driver_id"),
-                        "recipient_type": "driver",
-                        "sender_id": bid_data.get("rider_id"),
-                        "sender_type": "rider",
-                        "notification_type": "counter_offer",
-                        "title": "Rider Counter Offer",
-                        "message": f"{rider_name} offered ৳{bid_data.get('amount')} for the trip",
-                        "req_id": bid_data.get("req_id"),
-                        "bid_amount": bid_data.get("amount"),
-                        "original_amount": bid_data.get("original_amount"),
-                        "rider_name": rider_name,
-                        "driver_name": driver_name,
-                    }
-                    await save_notification_to_db(notification_data)
-
-                    # Send to specific driver
-                    if bid_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "rider-counter-offer",
-                            "data": bid_data
-                        }), bid_data["driver_id"])
-
-                elif message_type == "driver-counter-offer":
-                    # Handle driver counter offer
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"🚑 Driver counter offer: {bid_data.get('driver_id')} -> {bid_data.get('rider_id')}")
-
-                    # Save notification to database
-                    notification_data = {
-                        "recipient_id": bid_data.get("rider_id"),
-                        "recipient_type": "rider",
-                        "sender_id": bid_data.get("driver_id"),
-                        "sender_type": "driver",
-                        "notification_type": "counter_offer",
-                        "title": "Driver Counter Offer",
-                        "message": f"Driver offered ৳{bid_data.get('amount')} for your trip",
-                        "req_id": bid_data.get("req_id"),
-                        "bid_amount": bid_data.get("amount"),
-                        "original_amount": bid_data.get("original_amount"),
-                    }
-                    await save_notification_to_db(notification_data)
-
-                    # Send to specific rider
-                    if bid_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "driver-counter-offer",
-                            "data": bid_data
-                        }), bid_data["rider_id"])
-
-                elif message_type == "bid-accepted":
-                    # Handle bid acceptance
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"✅ Bid accepted: {bid_data.get('driver_id')} <-> {bid_data.get('rider_id')}")
-
-                    # Send to both parties
-                    if bid_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "bid-accepted",
-                            "data": bid_data
-                        }), bid_data["rider_id"])
-                    if bid_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "bid-accepted",
-                            "data": bid_data
-                        }), bid_data["driver_id"])
-
-                elif message_type == "bid-accepted-for-confirmation":
-                    # Handle bid acceptance requiring driver confirmation
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"🔔 Bid accepted for confirmation: {bid_data.get('driver_id')} <-> {bid_data.get('rider_id')}")
-
-                    # Create driver confirmation notification
-                    notification_data = {
-                        "recipient_id": bid_data.get("driver_id"),
-                        "recipient_type": "driver",
-                        "sender_id": bid_data.get("rider_id"),
-                        "sender_type": "rider",
-                        "notification_type": "bid_confirmation_request",
-                        "title": "Trip Confirmation Request",
-                        "message": f"Rider {bid_data.get('rider_name', 'Patient')} has accepted your bid of ৳{bid_data.get('amount')}. Please confirm or cancel this trip.",
-                        "req_id": bid_data.get("req_id"),
-                        "bid_amount": bid_data.get("amount"),
-                        "pickup_location": bid_data.get("pickup_location"),
-                        "destination": bid_data.get("destination"),
-                        "driver_name": "Driver",  # This will be filled by the driver
-                        "driver_mobile": "N/A",
-                        "rider_name": bid_data.get("rider_name", "Patient"),
-                    }
-
-                    # Insert into Notification database table
-                    notification_id = await save_notification_to_db(notification_data)
-                    if notification_id:
-                        print(
-                            f"✅ Driver confirmation notification saved with ID: {notification_id}")
-
-                    # Send confirmation request to driver
-                    if bid_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "bid-confirmation-request",
-                            "data": {
-                                **bid_data,
-                                "notification_id": notification_id,
-                                "message": "A rider has accepted your bid. Please confirm or cancel this trip."
-                            }
-                        }), bid_data["driver_id"])
-
-                elif message_type == "trip-confirmed-by-driver":
-                    # Handle trip confirmation by driver
-                    trip_data = message_data.get("data", {})
-                    print(
-                        f"✅ Trip confirmed by driver: {trip_data.get('driver_id')} <-> {trip_data.get('rider_id')}")
-
-                    # Update existing ongoing trip status in database
-                    from models import OngoingTrip, TripRequest
-                    from db import SessionLocal
-                    session = SessionLocal()
-
-                    try:
-                        # Find existing ongoing trip (created when driver sent bid)
-                        ongoing_trip = session.query(OngoingTrip).filter(
-                            OngoingTrip.req_id == trip_data.get("req_id"),
-                            OngoingTrip.driver_id == trip_data.get(
-                                "driver_id"),
-                            OngoingTrip.rider_id == trip_data.get("rider_id")
-                        ).first()
-
-                        if ongoing_trip:
-                            # Update status to ongoing
-                            ongoing_trip.status = "ongoing"
-                            session.commit()
-                            session.refresh(ongoing_trip)
-
-                            print(
-                                f"✅ Ongoing trip updated with ID: {ongoing_trip.trip_id}")
-                            print(f"   Status changed to: ongoing")
-                        else:
-                            # Create new ongoing trip if not found (fallback)
-                            ongoing_trip = OngoingTrip(
-                                req_id=trip_data.get("req_id"),
-                                rider_id=trip_data.get("rider_id"),
-                                driver_id=trip_data.get("driver_id"),
-                                pickup_location=trip_data.get(
-                                    "tripDetails", {}).get("pickup_location", ""),
-                                destination=trip_data.get(
-                                    "tripDetails", {}).get("destination", ""),
-                                fare=trip_data.get("amount"),
-                                status="ongoing"
-                            )
-
-                            session.add(ongoing_trip)
-                            session.commit()
-                            session.refresh(ongoing_trip)
-                            print(
-                                f"✅ New ongoing trip created with ID: {ongoing_trip.trip_id}")
-
-                        # Update trip request status
-                        trip_request = session.query(TripRequest).filter(
-                            TripRequest.req_id == trip_data.get("req_id")
-                        ).first()
-                        if trip_request:
-                            trip_request.status = "accepted"
-                            session.commit()
-
-                        # Notify both parties
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-confirmed",
-                            "data": {
-                                "trip_id": ongoing_trip.trip_id,
-                                "req_id": ongoing_trip.req_id,
-                                "rider_id": ongoing_trip.rider_id,
-                                "driver_id": ongoing_trip.driver_id,
-                                "pickup_location": ongoing_trip.pickup_location,
-                                "destination": ongoing_trip.destination,
-                                "fare": ongoing_trip.fare,
-                                "status": ongoing_trip.status,
-                                "start_time": ongoing_trip.start_time.isoformat(),
-                                "rider_latitude": ongoing_trip.rider_latitude,
-                                "rider_longitude": ongoing_trip.rider_longitude,
-                                "driver_latitude": ongoing_trip.driver_latitude,
-                                "driver_longitude": ongoing_trip.driver_longitude
-                            }
-                        }), ongoing_trip.rider_id)
-
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-confirmed",
-                            "data": {
-                                "trip_id": ongoing_trip.trip_id,
-                                "req_id": ongoing_trip.req_id,
-                                "rider_id": ongoing_trip.rider_id,
-                                "driver_id": ongoing_trip.driver_id,
-                                "pickup_location": ongoing_trip.pickup_location,
-                                "destination": ongoing_trip.destination,
-                                "fare": ongoing_trip.fare,
-                                "status": ongoing_trip.status,
-                                "start_time": ongoing_trip.start_time.isoformat(),
-                                "rider_latitude": ongoing_trip.rider_latitude,
-                                "rider_longitude": ongoing_trip.rider_longitude,
-                                "driver_latitude": ongoing_trip.driver_latitude,
-                                "driver_longitude": ongoing_trip.driver_longitude
-                            }
-                        }), ongoing_trip.driver_id)
-
-                    finally:
-                        session.close()
-
-                elif message_type == "trip-cancelled-by-driver":
-                    # Handle trip cancellation by driver
-                    cancel_data = message_data.get("data", {})
-                    print(
-                        f"❌ Trip cancelled by driver: {cancel_data.get('driver_id')} <-> {cancel_data.get('rider_id')}")
-
-                    # Send cancellation notification to rider
-                    if cancel_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-cancelled",
-                            "data": {
-                                **cancel_data,
-                                "message": "Driver has cancelled the trip. Please search for another driver."
-                            }
-                        }), cancel_data["rider_id"])
-
-                elif message_type == "bid-rejected":
-                    # Handle bid rejection
-                    bid_data = message_data.get("data", {})
-                    print(
-                        f"❌ Bid rejected: {bid_data.get('driver_id')} <-> {bid_data.get('rider_id')}")
-
-                    # Send to both parties
-                    if bid_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "bid-rejected",
-                            "data": bid_data
-                        }), bid_data["rider_id"])
-                    if bid_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "bid-rejected",
-                            "data": bid_data
-                        }), bid_data["driver_id"])
-
-                elif message_type == "trip-location-update":
-                    # Handle real-time trip location updates
-                    location_data = message_data.get("data", {})
-                    print(
-                        f"📍 Trip location update: {location_data.get('trip_id')}")
-
-                    # Update OngoingTrip table with real-time coordinates
-                    try:
-                        from db import SessionLocal
-                        from models import OngoingTrip, Dirde
-                        session = SessionLocal()
-
-                        # Find the ongoing trip
-                        ongoing_trip = session.query(OngoingTrip).filter(
-                            OngoingTrip.trip_id == location_data.get("trip_id")
-                        ).first()
-
-                        if ongoing_trip:
-                            # Update coordinates based on who is sending the update
-                            rider_location = location_data.get(
-                                "rider_location", {})
-                            driver_location = location_data.get(
-                                "driver_location", {})
-
-                            if rider_location and rider_location.get("latitude"):
-                                ongoing_trip.rider_latitude = rider_location.get(
-                                    "latitude")
-                                ongoing_trip.rider_longitude = rider_location.get(
-                                    "longitude")
-                                print(
-                                    f"✅ Updated rider location: {rider_location}")
-
-                            if driver_location and driver_location.get("latitude"):
-                                ongoing_trip.driver_latitude = driver_location.get(
-                                    "latitude")
-                                ongoing_trip.driver_longitude = driver_location.get(
-                                    "longitude")
-                                print(
-                                    f"✅ Updated driver location: {driver_location}")
-
-                            session.commit()
-                            print(
-                                f"✅ OngoingTrip coordinates updated for trip {ongoing_trip.trip_id}")
-
-                            # Also update Dirde table if record exists
-                            dirde_record = session.query(Dirde).filter(
-                                Dirde.rider_id == ongoing_trip.rider_id,
-                                Dirde.driver_id == ongoing_trip.driver_id,
-                                Dirde.status == "active"
-                            ).first()
-
-                            if dirde_record:
-                                if rider_location and rider_location.get("latitude"):
-                                    dirde_record.rider_latitude = rider_location.get(
-                                        "latitude")
-                                    dirde_record.rider_longitude = rider_location.get(
-                                        "longitude")
-                                    print(f"📍 Updated rider coordinates in Dirde")
-
-                                if driver_location and driver_location.get("latitude"):
-                                    dirde_record.driver_latitude = driver_location.get(
-                                        "latitude")
-                                    dirde_record.driver_longitude = driver_location.get(
-                                        "longitude")
-                                    print(
-                                        f"📍 Updated driver coordinates in Dirde")
-
-                                dirde_record.timestamp = datetime.utcnow()
-                                session.commit()
-                                print(f"✅ Dirde coordinates updated successfully")
-
-                        session.close()
-                    except Exception as e:
-                        print(f"❌ Error updating OngoingTrip coordinates: {e}")
-
-                    # Broadcast to both rider and driver
-                    if location_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-location-update",
-                            "data": location_data
-                        }), location_data["rider_id"])
-
-                    if location_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-location-update",
-                            "data": location_data
-                        }), location_data["driver_id"])
-
-                elif message_type == "trip-ended":
-                    # Handle trip end
-                    trip_data = message_data.get("data", {})
-                    print(f"🏁 Trip ended: {trip_data.get('trip_id')}")
-
-                    # Notify both parties
-                    if trip_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-ended",
-                            "data": trip_data
-                        }), trip_data["rider_id"])
-
-                    if trip_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "trip-ended",
-                            "data": trip_data
-                        }), trip_data["driver_id"])
-
-                elif message_type == "end-emergency-request":
-                    # Handle end emergency request from driver
-                    request_data = message_data.get("data", {})
-                    print(
-                        f"🚑 End emergency request from driver: {request_data.get('driver_id')} -> rider: {request_data.get('rider_id')}")
-
-                    # Get req_id from OngoingTrip if trip_id is provided
-                    from models import OngoingTrip
-                    from db import SessionLocal
-                    session = SessionLocal()
-                    
-                    req_id = None
-                    try:
-                        if request_data.get("trip_id"):
-                            ongoing_trip = session.query(OngoingTrip).filter(
-                                OngoingTrip.trip_id == request_data.get("trip_id")
-                            ).first()
-                            if ongoing_trip:
-                                req_id = ongoing_trip.req_id
-                                print(f"✅ Found req_id: {req_id} for trip_id: {request_data.get('trip_id')}")
-                        session.close()
-                    except Exception as e:
-                        print(f"❌ Error finding req_id: {e}")
-                        session.close()
-
-                    # Create notification for rider
-                    notification_data = {
-                        "recipient_id": request_data.get("rider_id"),
-                        "recipient_type": "rider",
-                        "sender_id": request_data.get("driver_id"),
-                        "sender_type": "driver",
-                        "notification_type": "end_emergency_request",
-                        "title": "End Emergency Request",
-                        "message": f"{request_data.get('driver_name', 'Driver')} wants to end the emergency trip. Please confirm.",
-                        "req_id": req_id,
-                        "trip_id": request_data.get("trip_id"),
-                        "pickup_location": request_data.get("pickup_location"),
-                        "destination": request_data.get("destination"),
-                        "driver_name": request_data.get("driver_name", "Driver"),
-                        "rider_name": "Rider",
-                    }
-
-                    # Save notification to database
-                    notification_id = await save_notification_to_db(notification_data)
-                    if notification_id:
-                        print(
-                            f"✅ End emergency request notification saved with ID: {notification_id}")
-
-                    # Send to rider
-                    if request_data.get("rider_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "end-emergency-request",
-                            "data": {
-                                **request_data,
-                                "notification_id": notification_id,
-                                "req_id": req_id,
-                                "message": f"{request_data.get('driver_name', 'Driver')} wants to end the emergency trip."
-                            }
-                        }), request_data["rider_id"])
-
-                elif message_type == "end-emergency-confirmed":
-                    # Handle end emergency confirmation from rider
-                    confirm_data = message_data.get("data", {})
-                    print(
-                        f"✅ End emergency confirmed by rider: {confirm_data.get('rider_id')} -> driver: {confirm_data.get('driver_id')}")
-
-                    # Update ongoing trip status to completed
-                    from models import OngoingTrip
-                    from db import SessionLocal
-                    session = SessionLocal()
-
-                    try:
-                        ongoing_trip = session.query(OngoingTrip).filter(
-                            OngoingTrip.trip_id == confirm_data.get("trip_id")
-                        ).first()
-
-                        if ongoing_trip:
-                            ongoing_trip.status = "completed"
-                            ongoing_trip.end_time = datetime.utcnow()
-                            session.commit()
-                            print(
-                                f"✅ OngoingTrip {ongoing_trip.trip_id} marked as completed")
-
-                        session.close()
-                    except Exception as e:
-                        print(f"❌ Error updating trip status: {e}")
-                        session.close()
-
-                    # Notify driver
-                    if confirm_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "end-emergency-confirmed",
-                            "data": {
-                                **confirm_data,
-                                "message": "Rider confirmed. Emergency trip ended successfully."
-                            }
-                        }), confirm_data["driver_id"])
-
-                elif message_type == "end-emergency-cancelled":
-                    # Handle end emergency cancellation from rider
-                    cancel_data = message_data.get("data", {})
-                    print(
-                        f"❌ End emergency cancelled by rider: {cancel_data.get('rider_id')} -> driver: {cancel_data.get('driver_id')}")
-
-                    # Notify driver
-                    if cancel_data.get("driver_id"):
-                        await manager.send_to_user(json.dumps({
-                            "type": "end-emergency-cancelled",
-                            "data": {
-                                **cancel_data,
-                                "message": "Rider cancelled the end emergency request. Trip continues."
-                            }
-                        }), cancel_data["driver_id"])
-
-                elif message_type == "broadcast":
-                    # Broadcast message to all connected clients
-                    await manager.broadcast(json.dumps({
-                        "type": "broadcast_message",
-                        "message": message_data.get("message", ""),
-                        "from_user": user_id
-                    }))
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                if frame.get("bytes") is not None:
+                    await dispatcher.dispatch_frame(context, frame["bytes"])
                 else:
-                    # Echo back unknown messages
-                    await websocket.send_text(json.dumps({
-                        "type": "echo",
-                        "original_message": message_data
-                    }))
-
+                    await dispatcher.dispatch(context, loads(frame["text"]))
             except WebSocketDisconnect:
                 break
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "message": "Invalid JSON format"
-                }))
+                await context.send_error("Invalid JSON format")
             except Exception as e:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "message": f"Error processing message: {str(e)}"
-                }))
+                await context.send_error(f"Error processing message: {str(e)}")
 
     except WebSocketDisconnect:
         pass
@@ -2585,50 +1731,31 @@ async def create_notification(
 
 @app.get("/notifications")
 async def get_notifications(
+    before: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: TokenData = Depends(get_current_user_flexible),
     session: Session = Depends(get_session)
 ):
-    """Get notifications for the current user."""
+    """
+    Get a page of notifications for the current user, newest first.
+
+    Pass the previous page's next_cursor as before to get the next page.
+    """
+    try:
+        cursor = parse_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
     try:
+        notifications, next_cursor = inbox_page(
+            session, current_user.sub, current_user.role, cursor, limit)
         print(
-            f"🔍 Getting notifications for user: {current_user.sub}, role: {current_user.role}")
-        notifications = session.query(Notification).filter(
-            Notification.recipient_id == current_user.sub,
-            Notification.recipient_type == current_user.role,
-            Notification.status.in_(["unread", "read"])
-        ).order_by(Notification.timestamp.desc()).all()
-
-        print(f"📊 Found {len(notifications)} notifications")
-        for notif in notifications:
-            print(
-                f"📋 Notification: ID={notif.notification_id}, Type={notif.notification_type}, Bid={notif.bid_amount}, Recipient={notif.recipient_id}")
+            f"📊 Found {len(notifications)} notifications for {current_user.role} {current_user.sub}")
 
         return {
             "success": True,
-            "notifications": [
-                {
-                    "notification_id": notif.notification_id,
-                    "recipient_id": notif.recipient_id,
-                    "recipient_type": notif.recipient_type,
-                    "sender_id": notif.sender_id,
-                    "sender_type": notif.sender_type,
-                    "notification_type": notif.notification_type,
-                    "title": notif.title,
-                    "message": notif.message,
-                    "req_id": notif.req_id,
-                    "trip_id": notif.trip_id,
-                    "bid_amount": notif.bid_amount,
-                    "original_amount": notif.original_amount,
-                    "status": notif.status,
-                    "timestamp": notif.timestamp.isoformat(),
-                    "pickup_location": notif.pickup_location,
-                    "destination": notif.destination,
-                    "driver_name": notif.driver_name,
-                    "driver_mobile": notif.driver_mobile,
-                    "rider_name": notif.rider_name,
-                }
-                for notif in notifications
-            ]
+            "notifications": [notification_view(notif) for notif in notifications],
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(
@@ -2669,31 +1796,18 @@ async def update_notification_status(
 
 
 @app.get("/notifications/count")
-async def get_notification_count():
+def get_notification_count(session: Session = Depends(get_session)):
     """Get total count of notifications in database"""
     try:
-        from db import SessionLocal
-        session = SessionLocal()
-
-        total_count = session.query(Notification).count()
-
-        # Get count by status
-        unread_count = session.query(Notification).filter(
-            Notification.status == "unread").count()
-        read_count = session.query(Notification).filter(
-            Notification.status == "read").count()
-        accepted_count = session.query(Notification).filter(
-            Notification.status == "accepted").count()
-
-        session.close()
+        counts = counter_cache.notification_counts(session)
 
         return {
             "success": True,
             "data": {
-                "total": total_count,
-                "unread": unread_count,
-                "read": read_count,
-                "accepted": accepted_count
+                "total": counts["total"],
+                "unread": counts.get("unread", 0),
+                "read": counts.get("read", 0),
+                "accepted": counts.get("accepted", 0)
             }
         }
 
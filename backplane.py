@@ -0,0 +1,375 @@
+"""
+Cross-process message routing for ConnectionManager.
+
+Each worker process only holds its own WebSocket connections. The backplane
+forwards sends that the local worker cannot complete (a user connected
+elsewhere) and broadcasts (which every worker must repeat for its own
+sockets) to the other workers as small JSON envelopes.
+
+Implementations:
+    InProcessBackplane: peers are managers in the same process sharing a hub;
+        with the default private hub it is a no-op for single-process runs.
+    UnixSocketBackplane: workers on one host exchange newline-delimited JSON
+        through a broker on a Unix domain socket. The first worker that finds
+        no broker starts one inside itself; run `python backplane.py` to keep
+        the broker in its own process instead.
+
+Select with BACKPLANE=inprocess|unix and BACKPLANE_SOCKET=<path>. The socket
+defaults to $XDG_RUNTIME_DIR, or a per-user directory under the system temp
+dir. Whatever the path, its directory must belong to this user and be closed
+to everyone else, and workers only connect to a socket this user owns, so
+another local account cannot stand in as the broker.
+"""
+import asyncio
+import os
+import stat
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional, Set
+
+from serialization import dumps, loads
+
+
+
+
+def _default_socket_path() -> str:
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"ambulance-backplane-{os.getuid()}")
+    return os.path.join(runtime_dir, "ambulance-backplane.sock")
+
+
+BACKPLANE = os.getenv("BACKPLANE", "inprocess")
+BACKPLANE_SOCKET = os.getenv("BACKPLANE_SOCKET") or _default_socket_path()
+BACKPLANE_RECONNECT_SECONDS = 1.0
+# A worker whose unread envelopes exceed this is disconnected by the broker
+BACKPLANE_MAX_BUFFER_BYTES = int(os.getenv("BACKPLANE_MAX_BUFFER_BYTES", str(4 * 1024 * 1024)))
+
+# Called with each envelope published by another worker
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """Interface shared by all backplanes."""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._deliver: Optional[Deliver] = None
+        self._stats = {
+            "published": 0,
+            "received": 0,
+            "errors": 0,
+            "latency_ms_total": 0.0,
+            "max_latency_ms": 0.0,
+        }
+
+    async def start(self, deliver: Deliver) -> None:
+        """
+        Begin receiving envelopes from other workers.
+
+        Args:
+            deliver: Coroutine run for every envelope from another worker
+        """
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+    @abstractmethod
+    async def publish(self, envelope: dict) -> bool:
+        """
+        Send an envelope to every other worker.
+
+        Args:
+            envelope: JSON-compatible routing envelope (see ConnectionManager)
+
+        Returns:
+            bool: True if it was handed to at least one peer or broker
+        """
+
+    def _stamp(self, envelope: dict) -> dict:
+        self._stats["published"] += 1
+        return {**envelope, "origin": self.worker_id, "sent_at": time.time()}
+
+    async def _receive(self, envelope: dict) -> None:
+        if envelope.get("origin") == self.worker_id or self._deliver is None:
+            return
+        self._stats["received"] += 1
+        latency_ms = (time.time() - envelope.get("sent_at", time.time())) * 1000
+        self._stats["latency_ms_total"] += latency_ms
+        self._stats["max_latency_ms"] = max(self._stats["max_latency_ms"], round(latency_ms, 3))
+        try:
+            await self._deliver(envelope)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"❌ Error delivering backplane message: {e}")
+
+    def metrics(self) -> dict:
+        """Envelope counts and delivery latency from publishing worker to this one."""
+        stats = dict(self._stats)
+        total = stats.pop("latency_ms_total")
+        stats["avg_latency_ms"] = round(total / stats["received"], 3) if stats["received"] else 0.0
+        return {"backend": type(self).__name__, "worker_id": self.worker_id, **stats}
+
+
+class InProcessBackplane(Backplane):
+    """Peers are the other backplanes registered on the same hub."""
+
+    def __init__(self, hub: Optional[Set["InProcessBackplane"]] = None):
+        super().__init__()
+        self.hub = hub if hub is not None else set()
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        self.hub.add(self)
+
+    async def stop(self) -> None:
+        self.hub.discard(self)
+        await super().stop()
+
+    async def publish(self, envelope: dict) -> bool:
+        peers = [peer for peer in self.hub if peer is not self]
+        if not peers:
+            return False
+        envelope = self._stamp(envelope)
+        for peer in peers:
+            await peer._receive(envelope)
+        return True
+
+
+class BackplaneBroker:
+    """
+    Relays every line a client writes to all other connected clients.
+
+    Writes are never awaited, so one worker that stops reading cannot stall
+    the others; instead a client whose write buffer grows past max_buffer
+    bytes is disconnected and reconnects once it catches up.
+    """
+
+    def __init__(self, path: str = BACKPLANE_SOCKET, max_buffer: int = BACKPLANE_MAX_BUFFER_BYTES):
+        self.path = path
+        self.max_buffer = max_buffer
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self.slow_clients_dropped = 0
+
+    async def start(self) -> None:
+        """
+        Bind the Unix socket.
+
+        Raises:
+            OSError: If another broker is already listening on the path
+            PermissionError: If the socket or its directory is not private to this user
+        """
+        _ensure_private_dir(self.path)
+        if os.path.exists(self.path):
+            _check_socket_owner(self.path)
+            if await _is_listening(self.path):
+                raise OSError(f"Backplane broker already running on {self.path}")
+            # Left behind by a worker that exited without cleaning up
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        print(f"🔀 Backplane broker listening on {self.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for client in list(self._clients):
+                    if client is writer:
+                        continue
+                    try:
+                        client.write(line)
+                    except Exception:
+                        self._clients.discard(client)
+                        continue
+                    if client.transport.get_write_buffer_size() > self.max_buffer:
+                        self._drop_slow_client(client)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _drop_slow_client(self, client: asyncio.StreamWriter) -> None:
+        self._clients.discard(client)
+        self.slow_clients_dropped += 1
+        print(f"🐢 Backplane broker disconnecting a worker with "
+              f"{client.transport.get_write_buffer_size()} bytes unread")
+        # abort() discards the buffer; close() would wait to flush it
+        client.transport.abort()
+
+
+def _ensure_private_dir(path: str) -> None:
+    """
+    Create the socket's directory (mode 0700) and check nobody else controls it.
+
+    Raises:
+        PermissionError: If the directory belongs to another user or others can write to it
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(
+            f"Backplane socket directory {directory} must be owned by this user and not "
+            f"writable by others")
+
+
+def _check_socket_owner(path: str) -> None:
+    """
+    Check that the socket at path was created by this user.
+
+    Raises:
+        PermissionError: If the socket at path was created by another user
+    """
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"Backplane socket {path} is owned by another user")
+
+
+async def _is_listening(path: str) -> bool:
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+class UnixSocketBackplane(Backplane):
+    """Exchanges envelopes with other workers on this host through a BackplaneBroker."""
+
+    def __init__(self, path: str = BACKPLANE_SOCKET, embed_broker: bool = True):
+        super().__init__()
+        self.path = path
+        self.embed_broker = embed_broker
+        self.broker: Optional[BackplaneBroker] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Event] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected is not None and self._connected.is_set()
+
+    async def start(self, deliver: Deliver) -> None:
+        """Connect to the broker, starting an embedded one if none is running."""
+        await super().start(deliver)
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            print(f"❌ Backplane not connected to {self.path}, retrying in the background")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+        await super().stop()
+
+    async def publish(self, envelope: dict) -> bool:
+        if not self.connected:
+            self._stats["errors"] += 1
+            return False
+        self._writer.write(dumps(self._stamp(envelope)) + b"\n")
+        await self._writer.drain()
+        return True
+
+    async def _connect(self) -> asyncio.StreamReader:
+        _ensure_private_dir(self.path)
+        try:
+            _check_socket_owner(self.path)
+            reader, self._writer = await asyncio.open_unix_connection(self.path)
+            return reader
+        except PermissionError:
+            raise
+        except OSError:
+            if not self.embed_broker:
+                raise
+        broker = BackplaneBroker(self.path)
+        try:
+            await broker.start()
+            self.broker = broker
+        except OSError:
+            pass  # Another worker won the race; connect to its broker
+        _check_socket_owner(self.path)
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        return reader
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader = await self._connect()
+                self._connected.set()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._receive(loads(line))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"❌ Backplane connection error: {e}")
+            finally:
+                self._connected.clear()
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(BACKPLANE_RECONNECT_SECONDS)
+
+    def metrics(self) -> dict:
+        return {**super().metrics(), "connected": self.connected, "embedded_broker": self.broker is not None}
+
+
+def create_backplane(kind: str = BACKPLANE) -> Backplane:
+    """
+    Build the backplane selected by BACKPLANE.
+
+    Raises:
+        ValueError: For an unknown backplane name
+    """
+    if kind == "inprocess":
+        return InProcessBackplane()
+    if kind == "unix":
+        return UnixSocketBackplane(BACKPLANE_SOCKET)
+    raise ValueError(f"Unknown BACKPLANE: {kind}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the WebSocket backplane broker")
+    parser.add_argument("--socket", default=BACKPLANE_SOCKET, help="Unix socket path")
+    args = parser.parse_args()
+    try:
+        asyncio.run(BackplaneBroker(args.socket).serve_forever())
+    except KeyboardInterrupt:
+        pass
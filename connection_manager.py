@@ -0,0 +1,397 @@
+"""
+WebSocket connection registry used by the /ws endpoint and REST handlers that push events.
+
+Sends that this worker cannot finish locally are forwarded to the other
+workers through the configured backplane (see backplane.py).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from backplane import Backplane, create_backplane
+from fanout import FanoutResult, fan_out
+from location_codec import FRAME_DRIVER_LOCATION, LocationFrame, encode_frame
+from outbound import OutboundQueue
+from spatial_index import AreaIndex, SubscriptionArea
+
+
+class ConnectionManager:
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.backplane = backplane if backplane is not None else create_backplane("inprocess")
+
+        self.active_connections: Dict[str, WebSocket] = {}
+
+        self.user_connections: Dict[int, str] = {}
+
+        self.user_info: Dict[int, dict] = {}
+
+        self.driver_locations: Dict[int, dict] = {}
+
+        # role -> {connection_id: websocket}, so role broadcasts only touch their audience
+        self.role_connections: Dict[str, Dict[str, WebSocket]] = {}
+
+        self.connection_roles: Dict[str, str] = {}
+
+        self.connection_users: Dict[str, int] = {}
+
+        # connection_id -> area; location updates go only to areas containing the driver
+        self.rider_areas = AreaIndex()
+
+        # Riders that never subscribed to an area still get every location update
+        self.unscoped_riders: Dict[str, WebSocket] = {}
+
+        # connection_id -> send queue drained by that connection's writer task
+        self.outbound: Dict[str, OutboundQueue] = {}
+
+        # Connections that negotiated the binary location subprotocol
+        self.binary_connections: Set[str] = set()
+
+        # (user_id, role) -> connection subscribed to the notifications channel;
+        # rider and driver ids overlap, so the role is part of the key
+        self.notification_connections: Dict[Tuple[int, str], str] = {}
+
+        self.fanout_stats = {"broadcasts": 0, "delivered": 0, "failed": 0, "dropped": 0, "evicted": 0}
+        self.slow_consumer_disconnects = 0
+        self.send_timeout_disconnects = 0
+
+    async def start(self) -> None:
+        """Start receiving sends and broadcasts from other workers."""
+        await self.backplane.start(self._deliver_remote)
+
+    async def stop(self) -> None:
+        await self.backplane.stop()
+        for queue in self.outbound.values():
+            queue.close()
+
+    async def _deliver_remote(self, envelope: dict) -> None:
+        """Complete a send published by another worker for the connections held here."""
+        op = envelope.get("op")
+        message = envelope["message"]
+        if op == "user":
+            connection_id = self.user_connections.get(int(envelope["user_id"]))
+            if connection_id is not None:
+                await self.send_personal_message(message, connection_id)
+        elif op == "broadcast":
+            self._fan_out(self.active_connections, message)
+        elif op == "role":
+            self._fan_out(self.connections_for_role(envelope["role"]), message)
+        elif op == "notification":
+            self._send_notification_local(envelope["message"], int(envelope["user_id"]), envelope["role"])
+        elif op == "area":
+            location = envelope.get("location")
+            self._fan_out(self.riders_for_points(envelope["points"]), message, droppable=True,
+                          location=LocationFrame(*location) if location else None)
+
+    async def _publish(self, envelope: dict) -> bool:
+        # Local delivery must not fail because another worker is unreachable
+        try:
+            return await self.backplane.publish(envelope)
+        except Exception as e:
+            print(f"❌ Error publishing to backplane: {e}")
+            return False
+
+    async def connect(self, websocket: WebSocket, connection_id: str, user_id: int = None, user_role: str = None,
+                      binary: bool = False):
+
+        self.active_connections[connection_id] = websocket
+        if binary:
+            self.binary_connections.add(connection_id)
+        queue = OutboundQueue(connection_id, websocket, self._on_queue_closed)
+        queue.start()
+        self.outbound[connection_id] = queue
+        if user_id:
+            self.user_connections[user_id] = connection_id
+            self.user_info[user_id] = {
+                "role": user_role, "connection_id": connection_id}
+            self.connection_users[connection_id] = user_id
+        if user_role:
+            self.role_connections.setdefault(user_role, {})[connection_id] = websocket
+            self.connection_roles[connection_id] = user_role
+            if user_role == "rider":
+                self.unscoped_riders[connection_id] = websocket
+
+    def disconnect(self, connection_id: str, user_id: int = None):
+        if connection_id in self.active_connections:
+            del self.active_connections[connection_id]
+        queue = self.outbound.pop(connection_id, None)
+        if queue is not None:
+            queue.close()
+        self.binary_connections.discard(connection_id)
+        user_id = user_id or self.connection_users.get(connection_id)
+        self.connection_users.pop(connection_id, None)
+        self.rider_areas.remove(connection_id)
+        self.unscoped_riders.pop(connection_id, None)
+        role = self.connection_roles.pop(connection_id, None)
+        if role is not None:
+            self.role_connections.get(role, {}).pop(connection_id, None)
+            if self.notification_connections.get((user_id, role)) == connection_id:
+                del self.notification_connections[(user_id, role)]
+        # A reconnect may already have replaced this user's connection
+        if user_id and self.user_connections.get(user_id) == connection_id:
+            del self.user_connections[user_id]
+            if user_id in self.user_info:
+                del self.user_info[user_id]
+
+            if user_id in self.driver_locations:
+                del self.driver_locations[user_id]
+
+    def connections_for_role(self, role: str) -> Dict[str, WebSocket]:
+        """Live connections of one role, keyed by connection_id."""
+        return self.role_connections.get(role, {})
+
+    def subscribe_area(self, connection_id: str, area: SubscriptionArea) -> bool:
+        """
+        Limit location updates for a connection to one area, replacing any earlier area.
+
+        Args:
+            connection_id: Subscribing connection
+            area: Circle or bounding box to receive driver updates for
+
+        Returns:
+            bool: False if the connection is not active
+        """
+        if connection_id not in self.active_connections:
+            return False
+        self.rider_areas.insert(connection_id, area)
+        self.unscoped_riders.pop(connection_id, None)
+        return True
+
+    def unsubscribe_area(self, connection_id: str) -> None:
+        """Drop a connection's area; riders go back to receiving every update."""
+        self.rider_areas.remove(connection_id)
+        if self.connection_roles.get(connection_id) == "rider":
+            self.unscoped_riders[connection_id] = self.active_connections[connection_id]
+
+    def area_for(self, connection_id: str) -> Optional[SubscriptionArea]:
+        return self.rider_areas.get(connection_id)
+
+    def subscribe_notifications(self, connection_id: str) -> bool:
+        """
+        Push new notifications for the connection's user to it.
+
+        Returns:
+            bool: False if the connection is not active or not signed in
+        """
+        user_id = self.connection_users.get(connection_id)
+        role = self.connection_roles.get(connection_id)
+        if connection_id not in self.active_connections or user_id is None or role is None:
+            return False
+        self.notification_connections[(user_id, role)] = connection_id
+        return True
+
+    def riders_for_points(self, points: Iterable[Tuple[float, float]]) -> Dict[str, WebSocket]:
+        """
+        Connections that should see location changes at any of the given points.
+
+        Args:
+            points: (latitude, longitude) pairs
+
+        Returns:
+            dict: connection_id -> websocket of covering subscribers and unscoped riders
+        """
+        targets = dict(self.unscoped_riders)
+        if len(self.rider_areas):
+            for latitude, longitude in points:
+                for connection_id in self.rider_areas.covering(latitude, longitude):
+                    websocket = self.active_connections.get(connection_id)
+                    if websocket is not None:
+                        targets[connection_id] = websocket
+        return targets
+
+    def _on_queue_closed(self, connection_id: str, reason: str) -> None:
+        if reason == "slow_consumer":
+            self.slow_consumer_disconnects += 1
+            print(f"🐢 Disconnecting slow consumer {connection_id}")
+        elif reason == "send_timeout":
+            self.send_timeout_disconnects += 1
+            print(f"🐢 Disconnecting {connection_id} after a stalled send")
+        self.disconnect(connection_id)
+
+    async def send_personal_message(self, message: str, connection_id: str) -> bool:
+        """Queue a frame that is never dropped for one connection"""
+        queue = self.outbound.get(connection_id)
+        if queue is None:
+            return False
+        return queue.put(message)
+
+    async def drain(self) -> None:
+        """Wait until every queued frame has been written."""
+        for queue in list(self.outbound.values()):
+            await queue.join()
+
+    async def flush(self, connection_id: str) -> None:
+        """Wait until the frames queued for one connection have been written."""
+        queue = self.outbound.get(connection_id)
+        if queue is not None:
+            await queue.join()
+
+    async def send_to_user(self, message: str, user_id) -> Optional[bool]:
+        """
+        Queue a frame for a user's connection, here or on another worker.
+
+        Returns:
+            Optional[bool]: True if queued on a connection held here; None if
+                forwarded to the other workers, which may not hold the user
+                either; False if it could not be sent anywhere
+        """
+        user_id_int = int(user_id)
+
+        connection_id = self.user_connections.get(user_id_int)
+        if connection_id is not None:
+            return await self.send_personal_message(message, connection_id)
+        elif await self._publish({"op": "user", "user_id": user_id_int, "message": message}):
+            # The user may be connected to another worker
+            return None
+        else:
+            print(f"❌ No connection found for user {user_id_int}")
+            return False
+
+    def _send_notification_local(self, message: str, user_id: int, role: str) -> Optional[bool]:
+        """None if the user has no subscribed connection here, else whether the frame was queued."""
+        connection_id = self.notification_connections.get((user_id, role))
+        if connection_id is None:
+            return None
+        queue = self.outbound.get(connection_id)
+        return queue is not None and queue.put(message)
+
+    async def send_notification(self, message: str, user_id: int, role: str) -> Optional[bool]:
+        """
+        Send a notifications-channel frame to a user if they subscribed to the channel.
+
+        Args:
+            message: Serialized frame
+            user_id: Rider or driver id
+            role: "rider" or "driver"
+
+        Returns:
+            Optional[bool]: True if queued on a subscribed connection here; None
+                if forwarded to the other workers; False if it went nowhere
+        """
+        delivered = self._send_notification_local(message, int(user_id), role)
+        if delivered is not None:
+            return delivered
+        if await self._publish({"op": "notification", "user_id": int(user_id), "role": role, "message": message}):
+            return None
+        return False
+
+    async def broadcast_to_riders(self, message: str) -> FanoutResult:
+        """Broadcast message only to riders"""
+        await self._publish({"op": "role", "role": "rider", "message": message})
+        return self._fan_out(self.connections_for_role("rider"), message)
+
+    async def broadcast_to_area(self, latitude: float, longitude: float, message: str,
+                                location: Optional[LocationFrame] = None) -> FanoutResult:
+        """
+        Send a location update to riders whose area contains the point.
+
+        Args:
+            latitude: Driver latitude
+            longitude: Driver longitude
+            message: driver-location JSON text frame
+            location: Same update for binary connections; without it they get the JSON frame
+        """
+        envelope = {"op": "area", "points": [[latitude, longitude]], "message": message}
+        if location is not None:
+            envelope["location"] = list(location)
+        await self._publish(envelope)
+        return self._fan_out(self.riders_for_points([(latitude, longitude)]), message, droppable=True,
+                             location=location)
+
+    async def broadcast_to_points(self, points: List[Tuple[float, float]], message: str) -> FanoutResult:
+        """
+        Send one frame to riders whose area contains any of the points.
+
+        Stays on this worker: nearby-drivers deltas describe this worker's
+        driver state and carry its own sequence numbers.
+        """
+        return self._fan_out(self.riders_for_points(points), message, droppable=True)
+
+    async def broadcast(self, message: str) -> FanoutResult:
+        """Send to every connection on every worker; the result counts local sockets"""
+        await self._publish({"op": "broadcast", "message": message})
+        return self._fan_out(self.active_connections, message)
+
+    def _fan_out(self, targets: Dict[str, WebSocket], message: str, droppable: bool = False,
+                 location: Optional[LocationFrame] = None) -> FanoutResult:
+        binary_targets = []
+        if location is not None and self.binary_connections:
+            binary_targets = [connection_id for connection_id in targets if connection_id in self.binary_connections]
+        if binary_targets:
+            text_targets = [connection_id for connection_id in targets if connection_id not in self.binary_connections]
+            result = fan_out(text_targets, self.outbound, message, droppable)
+            result.merge(fan_out(binary_targets, self.outbound,
+                                 encode_frame(FRAME_DRIVER_LOCATION, location), droppable))
+        else:
+            result = fan_out(list(targets), self.outbound, message, droppable)
+
+        # Remove disconnected connections once nothing is iterating the registry
+        for connection_id in result.dead:
+            self.disconnect(connection_id)
+
+        stats = self.fanout_stats
+        stats["broadcasts"] += 1
+        stats["delivered"] += result.delivered
+        stats["failed"] += result.failed
+        stats["dropped"] += result.dropped
+        stats["evicted"] += len(result.dead)
+        if result.failed:
+            print(f"📡 Broadcast: {result.delivered} queued, {result.failed} failed")
+        return result
+
+    def queue_metrics(self) -> dict:
+        """Send queue totals plus depth and drops of every connection that is backed up or dropped frames."""
+        connections = {}
+        depth = dropped = 0
+        for connection_id, queue in self.outbound.items():
+            queue_stats = queue.metrics()
+            depth += queue_stats["depth"]
+            dropped += queue_stats["dropped"]
+            if queue_stats["depth"] or queue_stats["dropped"]:
+                connections[connection_id] = queue_stats
+        return {
+            "total_depth": depth,
+            "total_dropped": dropped,
+            "send_timeout_disconnects": self.send_timeout_disconnects,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "connections": connections,
+        }
+
+    def metrics(self) -> dict:
+        """Connection counts per role and cumulative fan-out outcomes."""
+        return {
+            "connections": len(self.active_connections),
+            "by_role": {role: len(connections) for role, connections in self.role_connections.items()},
+            "area_subscriptions": len(self.rider_areas),
+            "unscoped_riders": len(self.unscoped_riders),
+            "binary_connections": len(self.binary_connections),
+            "notification_subscriptions": len(self.notification_connections),
+            "fanout": dict(self.fanout_stats),
+            "send_queues": self.queue_metrics(),
+            "backplane": self.backplane.metrics(),
+        }
+
+    def update_driver_location(self, driver_id: int, latitude: float, longitude: float):
+        """Update driver location and return nearby riders"""
+        self.driver_locations[driver_id] = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "timestamp": datetime.now().isoformat()
+        }
+        return self.get_nearby_riders(driver_id, latitude, longitude)
+
+    def get_nearby_riders(self, driver_id: int, latitude: float, longitude: float):
+        """User ids of riders whose subscription area contains the driver, plus unscoped riders"""
+        return [
+            self.connection_users[connection_id]
+            for connection_id in self.riders_for_points([(latitude, longitude)])
+            if connection_id in self.connection_users
+        ]
+
+    def get_all_driver_locations(self):
+
+        return self.driver_locations
+
+
+# Global instance
+manager = ConnectionManager(create_backplane())
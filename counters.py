@@ -0,0 +1,229 @@
+"""
+Cached notification and driver counters for the dashboard endpoints.
+
+The counts are loaded with one aggregate query per table and then kept up
+to date from ORM session events: every flush records how it changes
+Notification.status and Driver.is_available, and the change is applied
+once the transaction commits (or dropped on rollback). Reads are then a
+dict lookup.
+
+Writes that bypass the ORM, or come from another worker process, are not
+seen by the events, so the cache is reloaded when it is older than
+COUNTER_REFRESH_S. Set it to 0 to rely on the events alone. Changes
+committed while a load query runs may be missing from its result, so they
+are replayed onto it before it replaces the cache.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Driver, Notification
+
+
+COUNTER_REFRESH_S = float(os.getenv("COUNTER_REFRESH_S", "60"))
+
+# session.info key for changes flushed but not yet committed, per cache
+_PENDING = "counter_deltas"
+
+
+def count_notifications(session: Session) -> Dict[str, int]:
+    """Notifications per status in one GROUP BY pass."""
+    rows = session.execute(
+        select(Notification.status, func.count()).group_by(Notification.status))
+    return {status: count for status, count in rows}
+
+
+def count_drivers(session: Session) -> Dict[str, int]:
+    """Total and available drivers in one pass, with COUNT(*) FILTER (WHERE ...)."""
+    total, available = session.execute(select(
+        func.count(),
+        func.count().filter(Driver.is_available.is_(True)),
+    ).select_from(Driver)).one()
+    return {"total": total, "available": available}
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Setting an expired attribute normally skips loading the value it replaces;
+# the cache needs it to tell a real change from a rewrite of the same value
+for _attribute in (Notification.status, Driver.is_available):
+    event.listen(_attribute, "set", _load_old_value, active_history=True)
+
+
+def _attribute_change(instance, name: str):
+    """(old, new) if the attribute changed in this flush, else None."""
+    history = inspect(instance).attrs[name].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+class CounterCache:
+    """Notification counts by status and driver availability counts, kept in memory."""
+
+    def __init__(self, refresh_s: float = COUNTER_REFRESH_S):
+        self.refresh_s = refresh_s
+        self._lock = threading.Lock()
+        self._notifications: Optional[Counter] = None
+        self._drivers: Optional[Counter] = None
+        self._notifications_loaded_at = 0.0
+        self._drivers_loaded_at = 0.0
+        # "notifications"/"drivers" -> deltas applied during each load in progress
+        self._loading: Dict[str, List[Counter]] = {"notifications": [], "drivers": []}
+        self._stats = {"reads": 0, "refreshes": 0, "deltas_applied": 0, "deltas_replayed": 0}
+
+    def listen(self, target=Session) -> None:
+        """Follow commits of every session made by target (a Session class or sessionmaker)."""
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_soft_rollback", self._after_rollback)
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        deltas = session.info.setdefault(_PENDING, {}).setdefault(
+            self, {"notifications": Counter(), "drivers": Counter()})
+        notifications, drivers = deltas["notifications"], deltas["drivers"]
+        for instance in session.new:
+            if isinstance(instance, Notification):
+                notifications[instance.status] += 1
+            elif isinstance(instance, Driver):
+                drivers["total"] += 1
+                drivers["available"] += bool(instance.is_available)
+        for instance in session.deleted:
+            if isinstance(instance, Notification):
+                notifications[instance.status] -= 1
+            elif isinstance(instance, Driver):
+                drivers["total"] -= 1
+                drivers["available"] -= bool(instance.is_available)
+        for instance in session.dirty:
+            if isinstance(instance, Notification):
+                change = _attribute_change(instance, "status")
+                if change is not None and change[0] != change[1]:
+                    notifications[change[0]] -= 1
+                    notifications[change[1]] += 1
+            elif isinstance(instance, Driver):
+                change = _attribute_change(instance, "is_available")
+                if change is not None and bool(change[0]) != bool(change[1]):
+                    drivers["available"] += 1 if change[1] else -1
+
+    def _after_commit(self, session: Session) -> None:
+        deltas = session.info.get(_PENDING, {}).pop(self, None)
+        if deltas:
+            self.apply(deltas["notifications"], deltas["drivers"])
+
+    def apply(self, notifications: Optional[Counter] = None, drivers: Optional[Counter] = None) -> None:
+        """
+        Add committed changes made outside ORM sessions, e.g. Core bulk inserts.
+
+        Args:
+            notifications: Change in notifications per status
+            drivers: Change in "total" and "available" drivers
+        """
+        with self._lock:
+            if notifications:
+                self._apply_locked("notifications", notifications)
+            if drivers:
+                self._apply_locked("drivers", drivers)
+
+    def _apply_locked(self, kind: str, delta: Counter) -> None:
+        cached = getattr(self, f"_{kind}")
+        if cached is not None:
+            cached.update(delta)
+            self._stats["deltas_applied"] += 1
+        for missed in self._loading[kind]:
+            missed.update(delta)
+
+    def _after_rollback(self, session: Session, previous_transaction) -> None:
+        session.info.get(_PENDING, {}).pop(self, None)
+
+    def _stale(self, loaded_at: float) -> bool:
+        return self.refresh_s > 0 and time.monotonic() - loaded_at >= self.refresh_s
+
+    def _load(self, kind: str, count: Callable[[Session], Dict[str, int]], session: Session) -> Counter:
+        """Reload one cache with count(), replaying changes committed while it ran."""
+        missed = Counter()
+        with self._lock:
+            self._loading[kind].append(missed)
+        try:
+            counts = Counter(count(session))
+        except Exception:
+            with self._lock:
+                self._stop_loading(kind, missed)
+            raise
+        with self._lock:
+            self._stop_loading(kind, missed)
+            if missed:
+                # The query may not have seen these commits, and the cache
+                # they were applied to is the one being replaced
+                counts.update(missed)
+                self._stats["deltas_replayed"] += 1
+            setattr(self, f"_{kind}", counts)
+            setattr(self, f"_{kind}_loaded_at", time.monotonic())
+            self._stats["refreshes"] += 1
+            return Counter(counts)
+
+    def _stop_loading(self, kind: str, missed: Counter) -> None:
+        self._loading[kind] = [other for other in self._loading[kind] if other is not missed]
+
+    def notification_counts(self, session: Session) -> Dict[str, int]:
+        """
+        Notifications per status plus "total".
+
+        Args:
+            session: Used only when the cache is empty or older than refresh_s
+        """
+        with self._lock:
+            self._stats["reads"] += 1
+            cached = self._notifications
+            if cached is not None and not self._stale(self._notifications_loaded_at):
+                counts = dict(cached)
+                return {**counts, "total": sum(counts.values())}
+        counts = dict(self._load("notifications", count_notifications, session))
+        return {**counts, "total": sum(counts.values())}
+
+    def driver_counts(self, session: Session) -> Dict[str, int]:
+        """
+        "total" and "available" drivers.
+
+        Args:
+            session: Used only when the cache is empty or older than refresh_s
+        """
+        with self._lock:
+            self._stats["reads"] += 1
+            cached = self._drivers
+            if cached is not None and not self._stale(self._drivers_loaded_at):
+                return {"total": cached["total"], "available": cached["available"]}
+        counts = self._load("drivers", count_drivers, session)
+        return {"total": counts["total"], "available": counts["available"]}
+
+    def invalidate(self) -> None:
+        """Drop both caches so the next read reloads them."""
+        with self._lock:
+            self._notifications = self._drivers = None
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "refresh_s": self.refresh_s,
+                "notifications_loaded": self._notifications is not None,
+                "drivers_loaded": self._drivers is not None,
+                "notifications_age_s": round(now - self._notifications_loaded_at, 3)
+                if self._notifications is not None else None,
+                "drivers_age_s": round(now - self._drivers_loaded_at, 3)
+                if self._drivers is not None else None,
+                **self._stats,
+            }
+
+
+# Global instance
+counter_cache = CounterCache()
+counter_cache.listen()
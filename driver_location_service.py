@@ -1,42 +1,182 @@
 """
 Driver Location Service for managing driver positions and nearby driver queries.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Mapping, Optional, Set, Tuple
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from types import MappingProxyType
+import asyncio
+import heapq
 import math
+import time
 from sqlalchemy.orm import Session
 from models import DriverLocation, Driver
 from db import engine
+from location_service import to_geography_wkt
+from location_filter import LocationDecision, LocationUpdateFilter, create_update_filter
+from location_writer import LOCATION_WRITE_MODE, LocationWriteBehindBuffer, location_writer
 from fastapi import WebSocket
+from serialization import dumps_text
+from spatial_index import CoordinateArrays, GridIndex, SubscriptionArea, nearest_within
+
+
+STALE_AFTER = timedelta(minutes=5)
+STALE_AFTER_SECONDS = STALE_AFTER.total_seconds()
+
+
+@dataclass(slots=True)
+class DriverState:
+    """
+    Cached position of one active driver.
+    
+    Updated in place on every accepted ping. seen_at is time.monotonic(), so
+    nothing is formatted until a payload is built (see iso_timestamp).
+    """
+    latitude: float
+    longitude: float
+    seen_at: float
+    north_mps: Optional[float] = None
+    east_mps: Optional[float] = None
+    
+    def iso_timestamp(self, clock_offset: Optional[float] = None) -> str:
+        """
+        Local ISO time the driver was last seen.
+        
+        Args:
+            clock_offset: wall_clock_offset() to reuse when formatting many drivers
+        """
+        if clock_offset is None:
+            clock_offset = wall_clock_offset()
+        return datetime.fromtimestamp(self.seen_at + clock_offset).isoformat()
+    
+    def velocity(self) -> Optional[dict]:
+        if self.north_mps is None:
+            return None
+        return {"north_mps": self.north_mps, "east_mps": self.east_mps}
+
+
+def wall_clock_offset() -> float:
+    """Seconds to add to a time.monotonic() reading to get an epoch timestamp."""
+    return time.time() - time.monotonic()
+
+
+# listener(event, driver_id, state) with event "updated", "removed" (driver went
+# off duty; state is None) or "expired" (not seen for STALE_AFTER; state is the
+# last one). Updates reuse the same DriverState, so it always holds the latest position.
+DriverListener = Callable[[str, int, Optional[DriverState]], None]
+
+
+def rider_view(driver_id: int, state: DriverState, clock_offset: Optional[float] = None) -> dict:
+    """Driver entry as sent to riders in nearby-drivers messages."""
+    view = {
+        "id": driver_id,
+        "latitude": state.latitude,
+        "longitude": state.longitude,
+        "timestamp": state.iso_timestamp(clock_offset)
+    }
+    if state.north_mps is not None:
+        view["velocity"] = state.velocity()
+    return view
 
 
 class DriverLocationService:
     """Service for managing driver locations and finding nearby drivers."""
     
-    def __init__(self):
-        self.active_drivers: Dict[int, dict] = {}
+    def __init__(self, location_writer: Optional[LocationWriteBehindBuffer] = None,
+                 update_filter: Optional[LocationUpdateFilter] = None):
+        self.location_writer = location_writer
+        self.update_filter = update_filter
+        self.active_drivers: Dict[int, DriverState] = {}
         self.connected_riders: set = set()  # Store WebSocket connections for riders
+        self.spatial_index = GridIndex()
+        self.coordinates = CoordinateArrays()
+        # Bumped on every change to active_drivers so encoded views can be reused
+        self.version = 0
+        self._drivers_json: Optional[Tuple[int, str]] = None
+        self._listeners: List[DriverListener] = []
+        # Read-only view handed to callers instead of filtered copies
+        self.active_view: Mapping[int, DriverState] = MappingProxyType(self.active_drivers)
+        # (deadline, driver_id) min-heap with at most one entry per driver; an
+        # entry whose driver was seen again is pushed back with the new deadline
+        self._expiry_heap: List[Tuple[float, int]] = []
+        self._scheduled: Set[int] = set()
+        self._expiry_task: Optional[asyncio.Task] = None
+        self.expired_count = 0
+    
+    def add_listener(self, listener: DriverListener) -> None:
+        """
+        Register a callback for driver position changes and removals.
+        
+        Listeners run synchronously inside the update, so they should only
+        record the change and return.
+        
+        Args:
+            listener: Called as listener(event, driver_id, location)
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, driver_id: int, location: Optional[DriverState] = None) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, driver_id, location)
+            except Exception as e:
+                print(f"❌ Driver listener failed for driver {driver_id}: {e}")
+    
+    def report_location(self, driver_id: int, latitude: float, longitude: float,
+                        force: bool = False) -> LocationDecision:
+        """
+        Handle a position reported by a driver, storing it only if the update filter accepts it.
+        
+        Suppressed updates change nothing: no cache update, database write or
+        listener notification, so riders keep extrapolating from the last
+        accepted sample.
+        
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+            force: Bypass the filter, e.g. for the first position after going online
+            
+        Returns:
+            LocationDecision: Whether the update was accepted, why, and the velocity estimate
+        """
+        if self.update_filter is None:
+            self.update_driver_location(driver_id, latitude, longitude)
+            return LocationDecision(True, "unfiltered", None)
+        decision = self.update_filter.check(driver_id, latitude, longitude, force)
+        if decision.accepted:
+            self.update_driver_location(driver_id, latitude, longitude, decision.velocity)
+        return decision
+    
+    def filter_metrics(self) -> dict:
+        if self.update_filter is None:
+            return {"enabled": False}
+        return self.update_filter.metrics()
     
-    def update_driver_location(self, driver_id: int, latitude: float, longitude: float) -> bool:
+    def update_driver_location(self, driver_id: int, latitude: float, longitude: float,
+                               velocity: Optional[dict] = None) -> bool:
         """
         Update driver location in memory and database.
         
+        With a running write-behind buffer the database write is deferred to
+        its next bulk flush; otherwise the row is upserted immediately.
+        
         Args:
             driver_id: ID of the driver
             latitude: Latitude coordinate
             longitude: Longitude coordinate
+            velocity: {"north_mps", "east_mps"} estimate passed on to riders
             
         Returns:
             bool: True if update was successful
         """
         try:
             # Update in-memory cache
-            self.active_drivers[driver_id] = {
-                "latitude": latitude,
-                "longitude": longitude,
-                "timestamp": datetime.now().isoformat(),
-                "last_seen": datetime.now()
-            }
+            self._cache_location(driver_id, latitude, longitude, velocity)
+            
+            if self.location_writer is not None and self.location_writer.running:
+                self.location_writer.enqueue(driver_id, latitude, longitude)
+                return True
             
             # Update database
             with Session(bind=engine) as db:
@@ -49,12 +189,14 @@ class DriverLocationService:
                     # Update existing location
                     existing_location.latitude = latitude
                     existing_location.longitude = longitude
+                    existing_location.location = to_geography_wkt(latitude, longitude)
                 else:
                     # Create new location record
                     new_location = DriverLocation(
                         driver_id=driver_id,
                         latitude=latitude,
-                        longitude=longitude
+                        longitude=longitude,
+                        location=to_geography_wkt(latitude, longitude)
                     )
                     db.add(new_location)
                 
@@ -81,6 +223,28 @@ class DriverLocationService:
             # Still return True for in-memory update even if DB fails
             return True
     
+    def _cache_location(self, driver_id: int, latitude: float, longitude: float,
+                        velocity: Optional[dict] = None) -> None:
+        """Store the latest position in memory and keep the spatial index in step."""
+        now = time.monotonic()
+        state = self.active_drivers.get(driver_id)
+        if state is None:
+            state = self.active_drivers[driver_id] = DriverState(latitude, longitude, now)
+        else:
+            state.latitude = latitude
+            state.longitude = longitude
+            state.seen_at = now
+        if velocity is not None:
+            state.north_mps = velocity["north_mps"]
+            state.east_mps = velocity["east_mps"]
+        self.spatial_index.insert(driver_id, latitude, longitude)
+        self.coordinates.upsert(driver_id, latitude, longitude, now)
+        if driver_id not in self._scheduled:
+            heapq.heappush(self._expiry_heap, (now + STALE_AFTER_SECONDS, driver_id))
+            self._scheduled.add(driver_id)
+        self.version += 1
+        self._notify("updated", driver_id, state)
+    
     def get_driver_location(self, driver_id: int) -> Optional[dict]:
         """
         Get current location of a specific driver.
@@ -89,32 +253,152 @@ class DriverLocationService:
             driver_id: ID of the driver
             
         Returns:
-            dict: Driver location data or None if not found
+            dict: latitude, longitude, timestamp and velocity, or None if not found
         """
-        return self.active_drivers.get(driver_id)
+        state = self.active_drivers.get(driver_id)
+        if state is None:
+            return None
+        return {
+            "latitude": state.latitude,
+            "longitude": state.longitude,
+            "timestamp": state.iso_timestamp(),
+            "velocity": state.velocity()
+        }
     
-    def get_all_active_drivers(self) -> Dict[int, dict]:
+    def get_all_active_drivers(self) -> Mapping[int, DriverState]:
         """
         Get all currently active drivers.
         
+        The result is a live read-only view, not a copy: it changes as drivers
+        move or expire, so copy it before awaiting if a stable list is needed.
+        
         Returns:
-            dict: Dictionary of active drivers with their locations
+            Mapping: driver_id -> DriverState
         """
-        # Filter out drivers that haven't been seen in the last 5 minutes
-        cutoff_time = datetime.now() - timedelta(minutes=5)
-        active_drivers = {
-            driver_id: data for driver_id, data in self.active_drivers.items()
-            if data.get("last_seen", datetime.min) > cutoff_time
-        }
+        self.expire_stale_drivers()
+        return self.active_view
+    
+    def expire_stale_drivers(self, now: Optional[float] = None) -> List[int]:
+        """
+        Remove drivers not seen for STALE_AFTER.
         
-        # Remove inactive drivers from cache
-        inactive_drivers = set(self.active_drivers.keys()) - set(active_drivers.keys())
-        for driver_id in inactive_drivers:
+        Only heap entries that are due are touched, so the cost is proportional
+        to the drivers expiring (plus those seen again since being scheduled),
+        not to the number of active drivers.
+        
+        Args:
+            now: time.monotonic() reading to expire against; defaults to now
+            
+        Returns:
+            list: IDs of the drivers that expired
+        """
+        now = time.monotonic() if now is None else now
+        heap = self._expiry_heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, driver_id = heapq.heappop(heap)
+            state = self.active_drivers.get(driver_id)
+            if state is None:
+                # Removed explicitly after it was scheduled
+                self._scheduled.discard(driver_id)
+                continue
+            deadline = state.seen_at + STALE_AFTER_SECONDS
+            if deadline > now:
+                heapq.heappush(heap, (deadline, driver_id))
+                continue
+            self._scheduled.discard(driver_id)
             del self.active_drivers[driver_id]
+            self.spatial_index.remove(driver_id)
+            self.coordinates.remove(driver_id)
+            if self.update_filter is not None:
+                self.update_filter.forget(driver_id)
+            expired.append(driver_id)
+            self.version += 1
+            self._notify("expired", driver_id, state)
+        self.expired_count += len(expired)
+        return expired
+    
+    async def start(self) -> None:
+        """Start expiring stale drivers in the background on the running event loop."""
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._run_expiry())
+            print(f"⏲️ Driver expiry started (after {STALE_AFTER_SECONDS:.0f} s without updates)")
+    
+    async def stop(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            try:
+                await self._expiry_task
+            except asyncio.CancelledError:
+                pass
+            self._expiry_task = None
+    
+    async def _run_expiry(self) -> None:
+        while True:
+            # New drivers always expire after every scheduled one, so sleeping
+            # until the earliest deadline never misses anything
+            if self._expiry_heap:
+                delay = max(self._expiry_heap[0][0] - time.monotonic(), 0)
+            else:
+                delay = STALE_AFTER_SECONDS
+            await asyncio.sleep(delay)
+            try:
+                expired = self.expire_stale_drivers()
+                if expired:
+                    print(f"⏲️ {len(expired)} drivers went offline: {expired}")
+            except Exception as e:
+                print(f"❌ Error expiring stale drivers: {e}")
+    
+    def expiry_metrics(self) -> dict:
+        return {
+            "active": len(self.active_drivers),
+            "scheduled": len(self._expiry_heap),
+            "expired": self.expired_count,
+            "expiry_running": self._expiry_task is not None and not self._expiry_task.done(),
+        }
+    
+    def active_drivers_json(self) -> str:
+        """
+        Get all active drivers as an encoded JSON array of rider-facing entries.
+        
+        The text is rebuilt only when a driver moved, appeared or expired
+        since the last call, and the same string is shared by every recipient.
         
-        return active_drivers
+        Returns:
+            str: JSON array of {"id", "latitude", "longitude", "timestamp"}
+        """
+        driver_locations = self.get_all_active_drivers()
+        cached = self._drivers_json
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        
+        clock_offset = wall_clock_offset()
+        encoded = dumps_text([
+            rider_view(driver_id, state, clock_offset) for driver_id, state in driver_locations.items()
+        ])
+        self._drivers_json = (self.version, encoded)
+        return encoded
     
-    def find_nearby_drivers(self, latitude: float, longitude: float, radius_km: float = 5.0) -> List[dict]:
+    def drivers_in_area(self, area: SubscriptionArea) -> Dict[int, DriverState]:
+        """
+        Get active drivers inside a rider's subscription area.
+        
+        Args:
+            area: Circle or bounding box to search
+            
+        Returns:
+            dict: driver_id -> DriverState of matching drivers
+        """
+        cutoff = time.monotonic() - STALE_AFTER_SECONDS
+        matches = {}
+        for driver_id in self.spatial_index.candidates_in_box(area.south, area.north, area.west, area.east):
+            state = self.active_drivers[driver_id]
+            if state.seen_at > cutoff and area.contains(state.latitude, state.longitude):
+                matches[driver_id] = state
+        return matches
+    
+    def find_nearby_drivers(self, latitude: float, longitude: float, radius_km: float = 5.0,
+                            limit: Optional[int] = None) -> List[dict]:
         """
         Find drivers within a specified radius of given coordinates.
         
@@ -122,30 +406,31 @@ class DriverLocationService:
             latitude: Center latitude
             longitude: Center longitude
             radius_km: Search radius in kilometers
+            limit: Return only the closest N drivers
             
         Returns:
             list: List of nearby drivers with their details
         """
+        # Only drivers in grid cells overlapping the search circle are checked,
+        # and their distances are computed in a single vectorized call
+        slots = self.coordinates.slots_for(
+            self.spatial_index.candidates(latitude, longitude, radius_km))
+        driver_ids, distances = nearest_within(
+            self.coordinates, slots, latitude, longitude, radius_km,
+            min_seen_at=time.monotonic() - STALE_AFTER_SECONDS, limit=limit)
+        
+        clock_offset = wall_clock_offset()
         nearby_drivers = []
-        active_drivers = self.get_all_active_drivers()
+        for driver_id, distance in zip(driver_ids.tolist(), distances.tolist()):
+            state = self.active_drivers[driver_id]
+            nearby_drivers.append({
+                "driver_id": driver_id,
+                "latitude": state.latitude,
+                "longitude": state.longitude,
+                "timestamp": state.iso_timestamp(clock_offset),
+                "distance_km": round(distance, 2)
+            })
         
-        for driver_id, location_data in active_drivers.items():
-            distance = self._calculate_distance(
-                latitude, longitude,
-                location_data["latitude"], location_data["longitude"]
-            )
-            
-            if distance <= radius_km:
-                nearby_drivers.append({
-                    "driver_id": driver_id,
-                    "latitude": location_data["latitude"],
-                    "longitude": location_data["longitude"],
-                    "timestamp": location_data["timestamp"],
-                    "distance_km": round(distance, 2)
-                })
-        
-        # Sort by distance
-        nearby_drivers.sort(key=lambda x: x["distance_km"])
         return nearby_drivers
     
     def remove_driver(self, driver_id: int) -> bool:
@@ -160,6 +445,12 @@ class DriverLocationService:
         """
         if driver_id in self.active_drivers:
             del self.active_drivers[driver_id]
+            self.spatial_index.remove(driver_id)
+            self.coordinates.remove(driver_id)
+            if self.update_filter is not None:
+                self.update_filter.forget(driver_id)
+            self.version += 1
+            self._notify("removed", driver_id)
             return True
         return False
     
@@ -170,7 +461,8 @@ class DriverLocationService:
         Returns:
             int: Number of active drivers
         """
-        return len(self.get_all_active_drivers())
+        self.expire_stale_drivers()
+        return len(self.active_drivers)
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """
@@ -198,7 +490,9 @@ class DriverLocationService:
 
 
 # Global instance
-driver_location_service = DriverLocationService()
+driver_location_service = DriverLocationService(
+    location_writer if LOCATION_WRITE_MODE == "write_behind" else None,
+    create_update_filter())
 
 # This is a simplified example. Adjust for your actual connection/session management.
 
@@ -0,0 +1,250 @@
+"""
+Snapshot-plus-delta stream of live driver positions for riders.
+
+Riders receive one "nearby-drivers-snapshot" when they connect and then
+"nearby-drivers-delta" frames containing only drivers that moved, appeared or
+went away. Every frame carries a sequence number; a delta with seq N applies
+on top of state N - 1, so a client that sees a gap sends
+"nearby-drivers-resync" and gets a fresh snapshot.
+
+Updates are coalesced for DRIVER_STREAM_COALESCE_MS: a driver that pings
+several times inside one window appears once, with its latest position, in a
+single frame.
+
+A driver that stops reporting for STALE_AFTER is removed in the next delta
+and additionally announced with a "driver-offline" frame carrying its last
+known position, sent to riders whose area contains that position.
+
+Riders with a subscription area only receive frames that touch it (a driver
+now inside it, or last published inside it), so for them seq only orders
+frames and skipped numbers are expected; their snapshots cover just the area.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from connection_manager import manager
+from driver_location_service import (
+    DriverLocationService,
+    DriverState,
+    driver_location_service,
+    rider_view,
+    wall_clock_offset,
+)
+from serialization import dumps_text
+from spatial_index import SubscriptionArea
+
+
+DRIVER_STREAM_COALESCE_MS = int(os.getenv("DRIVER_STREAM_COALESCE_MS", "200"))
+
+
+class DeltaFrame(NamedTuple):
+    text: str
+    # Old and new positions of every driver in the frame, for area routing
+    points: List[Tuple[float, float]]
+
+
+class DriverDeltaStream:
+    """Collects driver changes from the location service and publishes them as deltas."""
+
+    def __init__(
+        self,
+        service: DriverLocationService,
+        publish: Optional[Callable[[List[Tuple[float, float]], str], Awaitable[object]]] = None,
+        coalesce_ms: int = DRIVER_STREAM_COALESCE_MS,
+    ):
+        self.service = service
+        self.publish = publish
+        self.coalesce_window = coalesce_ms / 1000
+        self.seq = 0
+        self._upserted: Dict[int, DriverState] = {}
+        self._removed: Set[int] = set()
+        # Drivers that expired since the last flush, with their last location
+        self._offline: Dict[int, DriverState] = {}
+        # Last position sent per driver, so riders whose area a driver leaves hear about it
+        self._published: Dict[int, Tuple[float, float]] = {}
+        self._dirty: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "frames": 0,
+            "changes": 0,
+            "coalesced": 0,
+            "snapshots": 0,
+            "offline_notices": 0,
+            "last_frame_bytes": 0,
+            "last_publish_ms": 0.0,
+        }
+        service.add_listener(self._on_driver_event)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _on_driver_event(self, event: str, driver_id: int, location: Optional[DriverState]) -> None:
+        if driver_id in self._upserted or driver_id in self._removed:
+            self._stats["coalesced"] += 1
+        self._stats["changes"] += 1
+        if event in ("removed", "expired"):
+            self._upserted.pop(driver_id, None)
+            self._removed.add(driver_id)
+            if event == "expired":
+                self._offline[driver_id] = location
+        else:
+            self._offline.pop(driver_id, None)
+            self._removed.discard(driver_id)
+            self._upserted[driver_id] = location
+        if self._dirty is not None:
+            self._dirty.set()
+
+    def snapshot_payload(self, area: Optional[SubscriptionArea] = None) -> str:
+        """
+        Encode the driver list at the current sequence number.
+
+        Changes still waiting for the next delta may already be included;
+        applying that delta again is harmless because entries are upserts
+        and removals by id.
+
+        Args:
+            area: Only include drivers inside this subscription area
+
+        Returns:
+            str: "nearby-drivers-snapshot" text frame
+        """
+        self._stats["snapshots"] += 1
+        if area is not None:
+            clock_offset = wall_clock_offset()
+            drivers_json = dumps_text([
+                rider_view(driver_id, state, clock_offset)
+                for driver_id, state in self.service.drivers_in_area(area).items()
+            ])
+        else:
+            drivers_json = self.service.active_drivers_json()
+        # Splice the cached driver array instead of decoding and re-encoding it
+        return f'{{"type":"nearby-drivers-snapshot","seq":{self.seq},"data":{drivers_json}}}'
+
+    def take_delta(self) -> Optional[DeltaFrame]:
+        """
+        Drain pending changes into the next delta frame.
+
+        Returns:
+            DeltaFrame: "nearby-drivers-delta" text and affected points, or None if nothing changed
+        """
+        if not self._upserted and not self._removed:
+            return None
+        upserted, self._upserted = self._upserted, {}
+        removed, self._removed = self._removed, set()
+        self.seq += 1
+
+        points = []
+        for driver_id, location in upserted.items():
+            previous = self._published.get(driver_id)
+            if previous is not None:
+                points.append(previous)
+            position = (location.latitude, location.longitude)
+            if position != previous:
+                points.append(position)
+            self._published[driver_id] = position
+        for driver_id in removed:
+            previous = self._published.pop(driver_id, None)
+            if previous is not None:
+                points.append(previous)
+
+        clock_offset = wall_clock_offset()
+        frame = dumps_text({
+            "type": "nearby-drivers-delta",
+            "seq": self.seq,
+            "upserted": [rider_view(driver_id, state, clock_offset) for driver_id, state in upserted.items()],
+            "removed": sorted(removed),
+        })
+        self._stats["frames"] += 1
+        self._stats["last_frame_bytes"] = len(frame)
+        return DeltaFrame(frame, points)
+
+    def take_offline_notices(self) -> List[DeltaFrame]:
+        """
+        Drain drivers that expired into "driver-offline" frames, one per driver.
+
+        Returns:
+            list: Frames routed to the driver's last known position
+        """
+        offline, self._offline = self._offline, {}
+        frames = []
+        for driver_id, state in offline.items():
+            frames.append(DeltaFrame(dumps_text({
+                "type": "driver-offline",
+                "data": {
+                    "driver_id": driver_id,
+                    "latitude": state.latitude,
+                    "longitude": state.longitude,
+                    "last_seen": state.iso_timestamp(),
+                },
+            }), [(state.latitude, state.longitude)]))
+        self._stats["offline_notices"] += len(frames)
+        return frames
+
+    async def flush(self) -> bool:
+        """
+        Publish pending changes as one delta frame, followed by any driver-offline notices.
+
+        Returns:
+            bool: True if a frame was published
+        """
+        frame = self.take_delta()
+        if frame is None:
+            return False
+        if self.publish is not None:
+            await self.publish(frame.points, frame.text)
+            for notice in self.take_offline_notices():
+                await self.publish(notice.points, notice.text)
+        else:
+            self._offline.clear()
+        return True
+
+    async def start(self) -> None:
+        """Start the coalescing loop on the running event loop."""
+        if self.running:
+            return
+        self._dirty = asyncio.Event()
+        if self._upserted or self._removed:
+            self._dirty.set()
+        self._task = asyncio.create_task(self._run())
+        print(f"🛰️ Driver delta stream started ({self.coalesce_window * 1000:.0f} ms window)")
+
+    async def stop(self) -> None:
+        """Stop the coalescing loop without publishing pending changes."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._dirty = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._dirty.wait()
+            # Let more changes accumulate before building the frame
+            if self.coalesce_window > 0:
+                await asyncio.sleep(self.coalesce_window)
+            self._dirty.clear()
+            started = time.perf_counter()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Error publishing driver delta: {e}")
+            self._stats["last_publish_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def metrics(self) -> dict:
+        """Sequence number, pending changes and frame statistics."""
+        return {
+            "seq": self.seq,
+            "pending": len(self._upserted) + len(self._removed),
+            "coalesce_window_ms": self.coalesce_window * 1000,
+            **self._stats,
+        }
+
+
+# Global instance
+driver_stream = DriverDeltaStream(driver_location_service, manager.broadcast_to_points)
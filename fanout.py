@@ -0,0 +1,76 @@
+"""
+Failure-isolated WebSocket fan-out.
+
+A broadcast appends one pre-encoded message to each recipient's outbound
+queue (see outbound.py) instead of awaiting every socket, so a slow client
+delays only its own delivery and a dead client is reported back instead of
+aborting the whole broadcast.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from outbound import Frame, OutboundQueue
+
+
+@dataclass
+class FanoutResult:
+    """Outcome of one fan-out."""
+    delivered: int = 0
+    failed: int = 0
+    dropped: int = 0
+    # connection_ids whose queue is closed; callers evict these after the loop
+    dead: List[str] = field(default_factory=list)
+
+    @property
+    def attempted(self) -> int:
+        return self.delivered + self.failed + self.dropped
+
+    def merge(self, other: "FanoutResult") -> "FanoutResult":
+        """Add another fan-out of the same broadcast (e.g. its binary recipients) into this one."""
+        self.delivered += other.delivered
+        self.failed += other.failed
+        self.dropped += other.dropped
+        self.dead.extend(other.dead)
+        return self
+
+    def as_dict(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def fan_out(
+    connection_ids: Iterable[str],
+    queues: Dict[str, OutboundQueue],
+    message: Frame,
+    droppable: bool = False,
+) -> FanoutResult:
+    """
+    Queue message for every target connection.
+
+    Args:
+        connection_ids: Recipients; callers may mutate their registry afterwards
+        queues: connection_id -> outbound queue
+        message: Pre-encoded frame shared by all recipients
+        droppable: True for location frames the slow-consumer policy may drop
+
+    Returns:
+        FanoutResult: queued/failed/dropped counts and dead connection ids
+    """
+    result = FanoutResult()
+    for connection_id in connection_ids:
+        queue = queues.get(connection_id)
+        if queue is None or queue.closed:
+            result.failed += 1
+            result.dead.append(connection_id)
+        elif queue.put(message, droppable):
+            result.delivered += 1
+        elif queue.closed:
+            # This frame pushed the client over the high-water mark
+            result.failed += 1
+            result.dead.append(connection_id)
+        else:
+            result.dropped += 1
+    return result
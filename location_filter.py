@@ -0,0 +1,162 @@
+"""
+Per-driver filter that decides which location updates are worth storing and
+broadcasting.
+
+Every accepted update carries a velocity estimate (metres per second north
+and east) from the previous accepted sample. Riders extrapolate the driver's
+position from the last accepted sample with that velocity, so the server
+only needs to accept an update when the extrapolation has drifted more than
+LOCATION_MAX_ERROR_M from where the driver really is:
+
+    first:        first update from a driver, always accepted
+    too_soon:     within LOCATION_MIN_INTERVAL_MS of the last accepted update, suppressed
+    deviated:     further than LOCATION_MAX_ERROR_M from the extrapolated position, accepted
+    heartbeat:    nothing accepted for LOCATION_MAX_SILENCE_S, accepted so the
+                  driver does not go stale
+    within_error: otherwise suppressed
+
+For a parked ambulance the velocity is zero and the rule reduces to a plain
+distance threshold. Set LOCATION_FILTER=off to accept every update.
+"""
+import math
+import os
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+
+LOCATION_FILTER = os.getenv("LOCATION_FILTER", "on")
+LOCATION_MIN_INTERVAL_MS = int(os.getenv("LOCATION_MIN_INTERVAL_MS", "1000"))
+LOCATION_MAX_ERROR_M = float(os.getenv("LOCATION_MAX_ERROR_M", "25"))
+LOCATION_MAX_SILENCE_S = float(os.getenv("LOCATION_MAX_SILENCE_S", "30"))
+
+METRES_PER_DEGREE = 111_320
+
+ACCEPT_REASONS = ("first", "deviated", "heartbeat")
+SUPPRESS_REASONS = ("too_soon", "within_error")
+
+
+class LocationDecision(NamedTuple):
+    accepted: bool
+    reason: str
+    # {"north_mps", "east_mps"} of the driver's track after this update; None when unfiltered
+    velocity: Optional[dict]
+
+
+class _Track:
+    __slots__ = ("latitude", "longitude", "at", "north_mps", "east_mps")
+
+    def __init__(self, latitude: float, longitude: float, at: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.at = at
+        self.north_mps = 0.0
+        self.east_mps = 0.0
+
+    def offset_m(self, latitude: float, longitude: float):
+        """(north, east) metres from the last accepted sample to a point."""
+        north = (latitude - self.latitude) * METRES_PER_DEGREE
+        east = (longitude - self.longitude) * METRES_PER_DEGREE * math.cos(math.radians(self.latitude))
+        return north, east
+
+    def velocity(self) -> dict:
+        return {"north_mps": round(self.north_mps, 2), "east_mps": round(self.east_mps, 2)}
+
+
+class LocationUpdateFilter:
+    """Suppresses location updates riders can already extrapolate."""
+
+    def __init__(
+        self,
+        min_interval_ms: int = LOCATION_MIN_INTERVAL_MS,
+        max_error_m: float = LOCATION_MAX_ERROR_M,
+        max_silence_s: float = LOCATION_MAX_SILENCE_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_interval = min_interval_ms / 1000
+        self.max_error_m = max_error_m
+        self.max_silence = max_silence_s
+        self.clock = clock
+        self._tracks: Dict[int, _Track] = {}
+        self._counts = {reason: 0 for reason in ACCEPT_REASONS + SUPPRESS_REASONS}
+
+    def check(self, driver_id: int, latitude: float, longitude: float, force: bool = False) -> LocationDecision:
+        """
+        Decide whether an update should be stored and broadcast.
+
+        Accepting an update makes it the new sample riders extrapolate from.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Reported latitude
+            longitude: Reported longitude
+            force: Accept and restart the track, e.g. when the driver comes online
+
+        Returns:
+            LocationDecision: Whether to accept, why, and the velocity estimate
+        """
+        now = self.clock()
+        track = self._tracks.get(driver_id)
+        if track is None or force:
+            self._tracks[driver_id] = track = _Track(latitude, longitude, now)
+            return self._decide(True, "first", track)
+
+        elapsed = now - track.at
+        if elapsed < self.min_interval:
+            return self._decide(False, "too_soon", track)
+
+        north, east = track.offset_m(latitude, longitude)
+        error_m = math.hypot(north - track.north_mps * elapsed, east - track.east_mps * elapsed)
+        if error_m > self.max_error_m:
+            reason = "deviated"
+        elif elapsed >= self.max_silence:
+            reason = "heartbeat"
+        else:
+            return self._decide(False, "within_error", track)
+
+        # A driver silent for longer than a heartbeat tells us nothing about current speed
+        if elapsed <= 2 * self.max_silence:
+            track.north_mps = north / elapsed
+            track.east_mps = east / elapsed
+        else:
+            track.north_mps = track.east_mps = 0.0
+        track.latitude, track.longitude, track.at = latitude, longitude, now
+        return self._decide(True, reason, track)
+
+    def _decide(self, accepted: bool, reason: str, track: _Track) -> LocationDecision:
+        self._counts[reason] += 1
+        return LocationDecision(accepted, reason, track.velocity())
+
+    def forget(self, driver_id: int) -> None:
+        """Drop a driver's track so its next update is accepted as a first sample."""
+        self._tracks.pop(driver_id, None)
+
+    def metrics(self) -> dict:
+        """Accepted and suppressed counts, overall and per reason."""
+        accepted = sum(self._counts[reason] for reason in ACCEPT_REASONS)
+        suppressed = sum(self._counts[reason] for reason in SUPPRESS_REASONS)
+        total = accepted + suppressed
+        return {
+            "enabled": True,
+            "accepted": accepted,
+            "suppressed": suppressed,
+            "suppressed_ratio": round(suppressed / total, 3) if total else 0.0,
+            "by_reason": dict(self._counts),
+            "tracked_drivers": len(self._tracks),
+            "max_error_m": self.max_error_m,
+            "min_interval_ms": self.min_interval * 1000,
+            "max_silence_s": self.max_silence,
+        }
+
+
+def create_update_filter(setting: str = LOCATION_FILTER) -> Optional[LocationUpdateFilter]:
+    """
+    Build the filter selected by LOCATION_FILTER.
+
+    Raises:
+        ValueError: For a setting other than on/off
+    """
+    if setting == "on":
+        return LocationUpdateFilter()
+    if setting == "off":
+        return None
+    raise ValueError(f"Unknown LOCATION_FILTER: {setting}")
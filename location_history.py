@@ -0,0 +1,386 @@
+"""
+Append-only history of driver positions, for replaying trip routes and
+auditing response times.
+
+Unlike the write-behind buffer in location_writer, nothing is coalesced:
+every accepted location becomes a row. Rows are buffered and written in
+batches, with COPY on PostgreSQL and a bulk INSERT elsewhere.
+
+On PostgreSQL the table is range-partitioned by day on recorded_at (UTC).
+Maintenance creates the partitions for the next LOCATION_HISTORY_PRECREATE_DAYS
+days and drops whole partitions older than LOCATION_HISTORY_RETENTION_DAYS,
+so retention never deletes row by row. Other databases (SQLite in tests and
+local development) keep a plain table and retention falls back to a DELETE.
+"""
+import asyncio
+import csv
+import io
+import os
+import re
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Deque, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, Table, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db import engine
+from models import DriverLocationHistory
+
+
+LOCATION_HISTORY = os.getenv("LOCATION_HISTORY", "on")
+LOCATION_HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("LOCATION_HISTORY_FLUSH_INTERVAL_MS", "1000"))
+# Flush early once this many rows are waiting
+LOCATION_HISTORY_HIGH_WATER = int(os.getenv("LOCATION_HISTORY_HIGH_WATER", "5000"))
+# Oldest rows are dropped beyond this while the database is unreachable
+LOCATION_HISTORY_MAX_PENDING = int(os.getenv("LOCATION_HISTORY_MAX_PENDING", "200000"))
+LOCATION_HISTORY_RETENTION_DAYS = int(os.getenv("LOCATION_HISTORY_RETENTION_DAYS", "30"))
+LOCATION_HISTORY_PRECREATE_DAYS = int(os.getenv("LOCATION_HISTORY_PRECREATE_DAYS", "3"))
+LOCATION_HISTORY_MAINTENANCE_S = float(os.getenv("LOCATION_HISTORY_MAINTENANCE_S", "3600"))
+# Keep each INSERT well below PostgreSQL's bind parameter limit
+INSERT_CHUNK_SIZE = 5000
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+HISTORY_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+ROUTE_MAX_POINTS = 500
+
+COLUMNS = ("driver_id", "recorded_at", "latitude", "longitude", "trip_id")
+
+# (driver_id, recorded_at, latitude, longitude, trip_id)
+HistoryRow = Tuple[int, datetime, float, float, Optional[int]]
+
+
+def partition_name(table_name: str, day: date) -> str:
+    return f"{table_name}_p{day:%Y%m%d}"
+
+
+def partition_ddl(table_name: str, day: date) -> str:
+    """CREATE TABLE for the partition holding one UTC day."""
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table_name, day)}" '
+        f'PARTITION OF "{table_name}" '
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def ensure_partitions(bind: Engine, table: Table, days: Sequence[date]) -> List[str]:
+    """
+    Create the daily partitions covering the given days on PostgreSQL.
+
+    Returns:
+        list: Names of the partitions checked, empty for other databases
+    """
+    if bind.dialect.name != "postgresql":
+        return []
+    with bind.begin() as conn:
+        for day in sorted(set(days)):
+            conn.execute(text(partition_ddl(table.name, day)))
+    return [partition_name(table.name, day) for day in sorted(set(days))]
+
+
+def drop_expired_history(bind: Engine, table: Table, cutoff: date) -> int:
+    """
+    Remove history recorded before the cutoff day (UTC).
+
+    PostgreSQL drops whole daily partitions; other databases delete rows.
+
+    Returns:
+        int: Partitions dropped on PostgreSQL, rows deleted elsewhere
+    """
+    if bind.dialect.name != "postgresql":
+        with bind.begin() as conn:
+            result = conn.execute(table.delete().where(
+                table.c.recorded_at < datetime.combine(cutoff, datetime.min.time())))
+        return result.rowcount
+
+    pattern = re.compile(rf"^{re.escape(table.name)}_p(\d{{8}})$")
+    with bind.begin() as conn:
+        partitions = conn.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+        """), {"table": table.name}).scalars().all()
+        dropped = 0
+        for name in partitions:
+            match = pattern.match(name)
+            if match and datetime.strptime(match.group(1), "%Y%m%d").date() < cutoff:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                dropped += 1
+    return dropped
+
+
+def load_track(session: Session, driver_id: int, start: datetime,
+               end: Optional[datetime] = None) -> List[Row]:
+    """
+    A driver's recorded positions between two UTC times, oldest first.
+
+    The recorded_at range lets PostgreSQL skip partitions outside the window.
+
+    Returns:
+        list: Rows with latitude, longitude and recorded_at
+    """
+    statement = select(
+        DriverLocationHistory.latitude,
+        DriverLocationHistory.longitude,
+        DriverLocationHistory.recorded_at,
+    ).where(
+        DriverLocationHistory.driver_id == driver_id,
+        DriverLocationHistory.recorded_at >= start,
+    )
+    if end is not None:
+        statement = statement.where(DriverLocationHistory.recorded_at <= end)
+    statement = statement.order_by(DriverLocationHistory.recorded_at)
+    return list(session.execute(statement))
+
+
+def downsample(points: Sequence, max_points: int = ROUTE_MAX_POINTS) -> list:
+    """Evenly spaced subset of at most max_points (at least 2), always keeping the first and last point."""
+    if len(points) <= max_points:
+        return list(points)
+    step = (len(points) - 1) / (max_points - 1)
+    return [points[round(index * step)] for index in range(max_points)]
+
+
+class LocationHistoryWriter:
+    """Buffers every accepted driver position and appends it to history in batches."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        table: Table = DriverLocationHistory.__table__,
+        flush_interval_ms: int = LOCATION_HISTORY_FLUSH_INTERVAL_MS,
+        high_water: int = LOCATION_HISTORY_HIGH_WATER,
+        max_pending: int = LOCATION_HISTORY_MAX_PENDING,
+        retention_days: int = LOCATION_HISTORY_RETENTION_DAYS,
+        precreate_days: int = LOCATION_HISTORY_PRECREATE_DAYS,
+        maintenance_interval_s: float = LOCATION_HISTORY_MAINTENANCE_S,
+    ):
+        if bind.dialect.name not in HISTORY_INSERTS:
+            raise ValueError(
+                f"Location history not supported for {bind.dialect.name}, expected one of {tuple(HISTORY_INSERTS)}")
+        self.bind = bind
+        self.table = table
+        self.flush_interval = flush_interval_ms / 1000
+        self.high_water = high_water
+        self.retention_days = retention_days
+        self.precreate_days = precreate_days
+        self.maintenance_interval = maintenance_interval_s
+        self._pending: Deque[HistoryRow] = deque(maxlen=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._last_maintenance: Optional[float] = None
+        self._stats = {
+            "recorded": 0,
+            "rows_written": 0,
+            "rows_dropped": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "copy_fallbacks": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "max_pending": 0,
+            "partitions_dropped": 0,
+            "rows_expired": 0,
+            "maintenance_errors": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, driver_id: int, latitude: float, longitude: float,
+               trip_id: Optional[int] = None, recorded_at: Optional[datetime] = None) -> None:
+        """
+        Append a position to the next batch.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+            trip_id: OngoingTrip the position was reported for, if known
+            recorded_at: UTC time of the position; defaults to now
+        """
+        if len(self._pending) == self._pending.maxlen:
+            self._stats["rows_dropped"] += 1
+        self._pending.append((
+            driver_id, recorded_at or datetime.utcnow(), latitude, longitude, trip_id))
+        self._stats["recorded"] += 1
+
+        pending = len(self._pending)
+        if pending > self._stats["max_pending"]:
+            self._stats["max_pending"] = pending
+        if pending >= self.high_water and self._wakeup is not None and not self._wakeup.is_set():
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Create upcoming partitions and start the background flush loop."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        await self.maintain()
+        self._task = asyncio.create_task(self._run())
+        print(f"🧭 Location history started (every {self.flush_interval * 1000:.0f} ms, "
+              f"kept {self.retention_days} days)")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        print(f"🧭 Location history stopped, {self._stats['rows_written']} rows written")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if time.monotonic() - self._last_maintenance >= self.maintenance_interval:
+                await self.maintain()
+
+    async def flush(self) -> int:
+        """
+        Write all pending rows off the event loop.
+
+        Returns:
+            int: Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch = self._take_pending()
+            if not batch:
+                return 0
+            try:
+                return await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                self._restore(batch)
+                self._stats["flush_errors"] += 1
+                print(f"❌ Error writing location history: {e}")
+                return 0
+
+    def flush_sync(self) -> int:
+        """Blocking flush for scripts and tests without an event loop."""
+        batch = self._take_pending()
+        if not batch:
+            return 0
+        try:
+            return self._write_batch(batch)
+        except Exception:
+            self._restore(batch)
+            self._stats["flush_errors"] += 1
+            raise
+
+    async def maintain(self) -> None:
+        """Create the next partitions and drop history past retention, off the event loop."""
+        self._last_maintenance = time.monotonic()
+        try:
+            await asyncio.to_thread(self.maintain_sync)
+        except Exception as e:
+            self._stats["maintenance_errors"] += 1
+            print(f"❌ Error maintaining location history: {e}")
+
+    def maintain_sync(self, today: Optional[date] = None) -> None:
+        today = today or datetime.utcnow().date()
+        ensure_partitions(self.bind, self.table, [
+            today + timedelta(days=offset) for offset in range(self.precreate_days + 1)])
+        removed = drop_expired_history(
+            self.bind, self.table, today - timedelta(days=self.retention_days))
+        if self.bind.dialect.name == "postgresql":
+            self._stats["partitions_dropped"] += removed
+        else:
+            self._stats["rows_expired"] += removed
+
+    def _take_pending(self) -> List[HistoryRow]:
+        batch = list(self._pending)
+        self._pending.clear()
+        return batch
+
+    def _restore(self, batch: List[HistoryRow]) -> None:
+        # Rows recorded during the failed flush stay newest; the oldest go first if full
+        restored = deque(batch, maxlen=self._pending.maxlen)
+        overflow = max(len(batch) + len(self._pending) - self._pending.maxlen, 0)
+        restored.extend(self._pending)
+        self._pending = restored
+        self._stats["rows_dropped"] += overflow
+
+    def _write_batch(self, batch: List[HistoryRow]) -> int:
+        start = time.perf_counter()
+        if self.bind.dialect.name == "postgresql":
+            try:
+                self._copy(batch)
+            except self.bind.dialect.dbapi.IntegrityError:
+                # A day without a partition yet, or a duplicate (driver_id, recorded_at)
+                self._stats["copy_fallbacks"] += 1
+                ensure_partitions(self.bind, self.table, [row[1].date() for row in batch])
+                self._insert(batch)
+        else:
+            self._insert(batch)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += len(batch)
+        self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], round(elapsed_ms, 3))
+        return len(batch)
+
+    def _copy(self, batch: List[HistoryRow]) -> None:
+        """COPY ... FROM STDIN through the psycopg2 connection."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for driver_id, recorded_at, latitude, longitude, trip_id in batch:
+            writer.writerow((driver_id, recorded_at.isoformat(), repr(latitude), repr(longitude),
+                             "" if trip_id is None else trip_id))
+        buffer.seek(0)
+        connection = self.bind.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY "{self.table.name}" ({", ".join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)',
+                    buffer)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _insert(self, batch: List[HistoryRow]) -> None:
+        """Bulk INSERT that skips rows already stored."""
+        insert = HISTORY_INSERTS[self.bind.dialect.name]
+        rows = [dict(zip(COLUMNS, row)) for row in batch]
+        with self.bind.begin() as conn:
+            for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+                conn.execute(insert(self.table).values(
+                    rows[offset:offset + INSERT_CHUNK_SIZE]).on_conflict_do_nothing())
+
+    def metrics(self) -> dict:
+        """Buffer depth, write throughput and retention counters."""
+        return {
+            "enabled": LOCATION_HISTORY == "on",
+            "running": self.running,
+            "pending": len(self._pending),
+            "flush_interval_ms": self.flush_interval * 1000,
+            "high_water": self.high_water,
+            "retention_days": self.retention_days,
+            **self._stats,
+        }
+
+
+# Global instance
+location_history = LocationHistoryWriter(engine)
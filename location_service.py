@@ -4,6 +4,11 @@ from models import DriverLocation
 from geoalchemy2.functions import ST_GeomFromText
 
 
+def to_geography_wkt(latitude: float, longitude: float) -> str:
+    """EWKT for DriverLocation.location (PostGIS expects lon lat order)."""
+    return f'SRID=4326;POINT({longitude} {latitude})'
+
+
 def get_driver_location(
     session: Session,
     driver_id: int
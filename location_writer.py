@@ -0,0 +1,244 @@
+"""
+Write-behind buffer for driver location persistence.
+
+Location pings only need the latest position per driver in the database, so
+instead of one SELECT + UPDATE/INSERT + COMMIT per ping the buffer keeps the
+newest coordinates per driver and writes them all with one bulk upsert every
+flush interval.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from db import engine
+from location_service import to_geography_wkt
+from models import DriverLocation
+
+
+# "write_behind" buffers pings; "sync" keeps one commit per ping
+LOCATION_WRITE_MODE = os.getenv("LOCATION_WRITE_MODE", "write_behind")
+LOCATION_FLUSH_INTERVAL_MS = int(os.getenv("LOCATION_FLUSH_INTERVAL_MS", "1000"))
+# Flush early once this many drivers are waiting
+LOCATION_FLUSH_HIGH_WATER = int(os.getenv("LOCATION_FLUSH_HIGH_WATER", "5000"))
+# Keep each statement well below PostgreSQL's bind parameter limit
+UPSERT_CHUNK_SIZE = 5000
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class LocationWriteBehindBuffer:
+    """Coalesces the latest position per driver and flushes it in bulk."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        table: Table = DriverLocation.__table__,
+        flush_interval_ms: int = LOCATION_FLUSH_INTERVAL_MS,
+        high_water: int = LOCATION_FLUSH_HIGH_WATER,
+    ):
+        if bind.dialect.name not in UPSERT_INSERTS:
+            raise ValueError(
+                f"Bulk upsert not supported for {bind.dialect.name}, expected one of {tuple(UPSERT_INSERTS)}")
+        self.bind = bind
+        self.table = table
+        self.flush_interval = flush_interval_ms / 1000
+        self.high_water = high_water
+        self._pending: Dict[int, Tuple[float, float]] = {}
+        self._oldest_pending_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "early_flushes": 0,
+            "rows_written": 0,
+            "rows_rejected": 0,
+            "flush_errors": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "max_pending": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def enqueue(self, driver_id: int, latitude: float, longitude: float) -> None:
+        """
+        Record the latest position of a driver for the next flush.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+        """
+        if driver_id in self._pending:
+            self._stats["coalesced"] += 1
+        elif not self._pending:
+            self._oldest_pending_at = time.monotonic()
+        self._pending[driver_id] = (latitude, longitude)
+        self._stats["enqueued"] += 1
+
+        pending = len(self._pending)
+        if pending > self._stats["max_pending"]:
+            self._stats["max_pending"] = pending
+        if pending >= self.high_water and self._wakeup is not None and not self._wakeup.is_set():
+            self._stats["early_flushes"] += 1
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Start the background flush loop on the running event loop."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        print(f"🗂️ Location write-behind started (every {self.flush_interval * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        print(f"🗂️ Location write-behind stopped, {self._stats['rows_written']} rows written")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write all pending positions off the event loop.
+
+        Returns:
+            int: Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch = self._take_pending()
+            if not batch:
+                return 0
+            try:
+                return await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                self._restore(batch)
+                self._stats["flush_errors"] += 1
+                print(f"❌ Error flushing driver locations: {e}")
+                return 0
+
+    def flush_sync(self) -> int:
+        """Blocking flush for scripts and shutdown paths without an event loop."""
+        batch = self._take_pending()
+        if not batch:
+            return 0
+        try:
+            return self._write_batch(batch)
+        except Exception:
+            self._restore(batch)
+            self._stats["flush_errors"] += 1
+            raise
+
+    def _take_pending(self) -> Dict[int, Tuple[float, float]]:
+        batch, self._pending = self._pending, {}
+        self._oldest_pending_at = None
+        return batch
+
+    def _restore(self, batch: Dict[int, Tuple[float, float]]) -> None:
+        # Newer positions that arrived during the failed flush win
+        for driver_id, position in batch.items():
+            self._pending.setdefault(driver_id, position)
+        if self._pending and self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+
+    def _rows(self, batch: Dict[int, Tuple[float, float]]) -> List[dict]:
+        with_location = (
+            self.bind.dialect.name == "postgresql" and "location" in self.table.c)
+        rows = []
+        for driver_id, (latitude, longitude) in batch.items():
+            row = {"driver_id": driver_id, "latitude": latitude, "longitude": longitude}
+            if with_location:
+                row["location"] = to_geography_wkt(latitude, longitude)
+            rows.append(row)
+        return rows
+
+    def _upsert(self, rows: List[dict]):
+        """INSERT ... ON CONFLICT (driver_id) DO UPDATE for the engine's dialect."""
+        statement = UPSERT_INSERTS[self.bind.dialect.name](self.table).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[self.table.c.driver_id],
+            set_={
+                column: statement.excluded[column]
+                for column in rows[0] if column != "driver_id"
+            },
+        )
+
+    def _write_batch(self, batch: Dict[int, Tuple[float, float]]) -> int:
+        start = time.perf_counter()
+        rows = self._rows(batch)
+        written = 0
+        for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[offset:offset + UPSERT_CHUNK_SIZE]
+            try:
+                with self.bind.begin() as conn:
+                    conn.execute(self._upsert(chunk))
+                written += len(chunk)
+            except IntegrityError:
+                # One unknown driver_id must not sink the whole batch
+                written += self._write_rows_individually(chunk)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += written
+        self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], round(elapsed_ms, 3))
+        return written
+
+    def _write_rows_individually(self, rows: List[dict]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                with self.bind.begin() as conn:
+                    conn.execute(self._upsert([row]))
+                written += 1
+            except IntegrityError as e:
+                self._stats["rows_rejected"] += 1
+                print(f"❌ Dropping location for driver {row['driver_id']}: {e.orig}")
+        return written
+
+    def metrics(self) -> dict:
+        """Buffer depth, age of the oldest pending write and flush statistics."""
+        oldest_ms = 0.0
+        if self._oldest_pending_at is not None:
+            oldest_ms = (time.monotonic() - self._oldest_pending_at) * 1000
+        return {
+            "mode": "write_behind" if self.running else "sync",
+            "pending": len(self._pending),
+            "oldest_pending_ms": round(oldest_ms, 3),
+            "flush_interval_ms": self.flush_interval * 1000,
+            "high_water": self.high_water,
+            **self._stats,
+        }
+
+
+# Global instance
+location_writer = LocationWriteBehindBuffer(engine)
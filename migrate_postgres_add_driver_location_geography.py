@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL Migration: Add geography location column with a GiST index to driverlocation
+"""
+
+from sqlalchemy import create_engine, text
+from db import SQLALCHEMY_DATABASE_URL
+
+def migrate():
+    """Add driverlocation.location, backfill it from latitude/longitude and index it"""
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    with engine.connect() as conn:
+        try:
+            print("🚀 Starting PostgreSQL migration...")
+            print(f"📁 Database: {SQLALCHEMY_DATABASE_URL}")
+
+            # Geography type and ST_* functions come from PostGIS
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+            conn.commit()
+            print("✅ PostGIS extension available")
+
+            # Check if location column already exists
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='driverlocation' AND column_name='location'
+            """))
+
+            if result.fetchone():
+                print("✅ location column already exists in driverlocation table")
+            else:
+                print("📊 Adding location column to driverlocation table...")
+
+                conn.execute(text("""
+                    ALTER TABLE driverlocation
+                    ADD COLUMN location geography(POINT, 4326)
+                """))
+                conn.commit()
+                print("✅ Added location column")
+
+            # Backfill rows written before the column existed
+            print("📊 Backfilling location from latitude/longitude...")
+            result = conn.execute(text("""
+                UPDATE driverlocation
+                SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+                WHERE location IS NULL
+            """))
+            conn.commit()
+            print(f"✅ Backfilled {result.rowcount} driver locations")
+
+            # GiST index used by ST_DWithin and <-> ordering in /nearby
+            print("📊 Creating GiST index on driverlocation.location...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_driverlocation_location
+                ON driverlocation
+                USING GIST (location)
+            """))
+            conn.commit()
+            print("✅ GiST index ready")
+
+            # Verify the changes
+            result = conn.execute(text("""
+                SELECT COUNT(*) AS total, COUNT(location) AS with_location
+                FROM driverlocation
+            """))
+
+            row = result.fetchone()
+            print("\n📋 Driver location rows:")
+            print(f"   - total: {row[0]}")
+            print(f"   - with location: {row[1]}")
+
+            print("\n✅ Migration completed successfully!")
+
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+if __name__ == "__main__":
+    migrate()
+    print("\n🎉 Migration finished!")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL Migration: Add the status/timestamp index used by notification archival
+"""
+
+from sqlalchemy import create_engine, text
+from db import SQLALCHEMY_DATABASE_URL
+
+INDEX_NAME = "ix_notification_status_timestamp"
+
+
+def migrate():
+    """Create ix_notification_status_timestamp without blocking writes to notification"""
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        try:
+            print("🚀 Starting PostgreSQL migration...")
+            print(f"📁 Database: {SQLALCHEMY_DATABASE_URL}")
+
+            # A failed concurrent build leaves an INVALID index behind; rebuild it
+            result = conn.execute(text("""
+                SELECT pg_index.indisvalid
+                FROM pg_class
+                JOIN pg_index ON pg_index.indexrelid = pg_class.oid
+                WHERE pg_class.relname = :name
+            """), {"name": INDEX_NAME})
+
+            row = result.fetchone()
+            if row and not row[0]:
+                print(f"📊 Dropping invalid {INDEX_NAME} left by an earlier attempt...")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}"))
+                row = None
+
+            if row:
+                print(f"✅ {INDEX_NAME} already exists on notification table")
+            else:
+                print(f"📊 Creating {INDEX_NAME} on notification table...")
+                conn.execute(text(f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME}
+                    ON notification
+                    (status, timestamp)
+                """))
+                print(f"✅ Created {INDEX_NAME}")
+
+            # Refresh planner statistics so archival batches pick the new index
+            conn.execute(text("ANALYZE notification"))
+
+            # Verify the changes
+            result = conn.execute(text("""
+                SELECT indexdef
+                FROM pg_indexes
+                WHERE tablename = 'notification' AND indexname = :name
+            """), {"name": INDEX_NAME})
+
+            print("\n📋 Notification archival index:")
+            for row in result:
+                print(f"   - {row[0]}")
+
+            print("\n✅ Migration completed successfully!")
+
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    migrate()
+    print("\n🎉 Migration finished!")
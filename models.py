@@ -10,7 +10,7 @@ from decimal import Decimal
 from typing import Optional
 from sqlmodel import SQLModel, Field, Column, Integer, ForeignKey, Float
 from geoalchemy2 import Geography
-from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy import Index, PrimaryKeyConstraint, desc
 Base = declarative_base()
 
 DRIVER_ID_FK = "driver.driver_id"
@@ -36,6 +36,13 @@ class Rider(SQLModel, table=True):
 
 
 class DriverLocation(SQLModel, table=True):
+
+    __table_args__ = (
+        # GiST index used by ST_DWithin and <-> ordering in /nearby; PostGIS only
+        Index("idx_driverlocation_location", "location", postgresql_using="gist")
+        .ddl_if(dialect="postgresql"),
+    )
+
     driver_id: int = Field(
         sa_column=Column(
             Integer,
@@ -52,14 +59,34 @@ class DriverLocation(SQLModel, table=True):
     longitude: float = Field(
         sa_column=Column(Float, nullable=False)
     )
-    # location: Geography = Field(sa_column=Column(
-    #     Geography(geometry_type="POINT", srid=4326), nullable=False))
+    # Kept in sync with latitude/longitude on PostgreSQL; SQLite (local
+    # development) has no geography type and stores the column as text
+    location: Optional[Geography] = Field(default=None, sa_column=Column(
+        Geography(geometry_type="POINT", srid=4326, spatial_index=False).with_variant(Text(), "sqlite"),
+        nullable=True))
 
     model_config = {
         "arbitrary_types_allowed": True
     }
 
 
+class DriverLocationHistory(SQLModel, table=True):
+    """Every accepted driver position; written by location_history, never updated."""
+
+    __table_args__ = (
+        # A partitioned table's primary key must include the partition column
+        PrimaryKeyConstraint("driver_id", "recorded_at"),
+        {"postgresql_partition_by": "RANGE (recorded_at)"},
+    )
+
+    # No foreign key: rows outlive deleted drivers until their partition is dropped
+    driver_id: int = Field(sa_column=Column(Integer, nullable=False))
+    recorded_at: datetime = Field(sa_column=Column(DateTime, nullable=False))
+    latitude: float = Field(sa_column=Column(Float, nullable=False))
+    longitude: float = Field(sa_column=Column(Float, nullable=False))
+    trip_id: Optional[int] = Field(default=None)
+
+
 class Trip(SQLModel, table=True):
     trip_id: Optional[int] = Field(default=None, primary_key=True, index=True)
     rider_id: int = Field(
@@ -186,6 +213,19 @@ class EngagedDriver(SQLModel, table=True):
 
 
 class Notification(SQLModel, table=True):
+
+    __table_args__ = (
+        # Inbox pages: equality on the first three columns, then a keyset
+        # walk newest first (see notification_inbox.inbox_page)
+        Index(
+            "ix_notification_inbox",
+            "recipient_id", "recipient_type", "status",
+            desc("timestamp"), desc("notification_id"),
+        ),
+        # Archival batches: old rows of one status (see notification_retention)
+        Index("ix_notification_status_timestamp", "status", "timestamp"),
+    )
+
     notification_id: Optional[int] = Field(
         default=None, primary_key=True, index=True)
     recipient_id: int = Field(
@@ -230,6 +270,41 @@ class Notification(SQLModel, table=True):
     rider_name: Optional[str] = Field(default=None)
 
 
+class NotificationArchive(SQLModel, table=True):
+    """Notifications moved out of the notification table by notification_retention."""
+    __tablename__ = "notification_archive"
+
+    # Keeps the id it had in notification
+    notification_id: int = Field(
+        sa_column=Column(Integer, primary_key=True, autoincrement=False))
+    recipient_id: int = Field(
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            index=True
+        )
+    )
+    recipient_type: str
+    sender_id: int
+    sender_type: str
+    notification_type: str
+    title: str
+    message: str
+    # No foreign key: the trip request may be deleted after archival
+    req_id: Optional[int] = Field(default=None)
+    trip_id: Optional[int] = Field(default=None)
+    bid_amount: Optional[float] = Field(default=None)
+    original_amount: Optional[float] = Field(default=None)
+    status: str
+    timestamp: datetime
+    pickup_location: Optional[str] = Field(default=None)
+    destination: Optional[str] = Field(default=None)
+    driver_name: Optional[str] = Field(default=None)
+    driver_mobile: Optional[str] = Field(default=None)
+    rider_name: Optional[str] = Field(default=None)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class Dirde(SQLModel, table=True):
     dirde_id: Optional[int] = Field(default=None, primary_key=True, index=True)
     rider_id: int = Field(
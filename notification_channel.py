@@ -0,0 +1,199 @@
+"""
+The notifications channel on /ws, which replaces polling GET /notifications.
+
+A signed-in client sends "subscribe-notifications" and gets back a
+"notifications-snapshot": its unread count and the newest inbox page in the
+same shape as GET /notifications. From then on every committed notification
+for that user is pushed as a "notification" frame.
+
+Clients acknowledge notifications they have shown with
+"ack-notifications". Receipts are collected and marked read together every
+NOTIFICATION_ACK_INTERVAL_MS: one UPDATE per recipient and one transaction
+per interval instead of one PUT /notifications/{id}/status each. Each
+recipient then gets a "notifications-read" frame with the ids that changed.
+"""
+import asyncio
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import ws_repository
+from connection_manager import ConnectionManager, manager
+from counters import counter_cache
+from db import engine
+from models import Notification
+from notification_inbox import inbox_page, notification_view, unread_count
+from notification_writer import notification_writer
+from serialization import dumps_text
+
+
+NOTIFICATION_ACK_INTERVAL_MS = int(os.getenv("NOTIFICATION_ACK_INTERVAL_MS", "500"))
+
+# (recipient_id, recipient_type)
+Recipient = Tuple[int, str]
+
+
+def notification_snapshot(bind: Engine, recipient_id: int, recipient_type: str, limit: int) -> dict:
+    """Unread count and newest inbox page for a recipient."""
+    with Session(bind) as session:
+        notifications, next_cursor = inbox_page(session, recipient_id, recipient_type, limit=limit)
+        return {
+            "unread_count": unread_count(session, recipient_id, recipient_type),
+            "notifications": [notification_view(n) for n in notifications],
+            "next_cursor": next_cursor,
+        }
+
+
+def mark_read(bind: Engine, receipts: Dict[Recipient, Set[int]]) -> Dict[Recipient, List[int]]:
+    """
+    Mark acknowledged unread notifications read, in one transaction.
+
+    Ids that belong to someone else or are no longer unread are left alone.
+
+    Returns:
+        dict: Recipient -> ids that changed from unread to read
+    """
+    table = Notification.__table__
+    changed = {}
+    with bind.begin() as conn:
+        for (recipient_id, recipient_type), notification_ids in receipts.items():
+            ids = conn.execute(
+                update(table)
+                .where(
+                    table.c.recipient_id == recipient_id,
+                    table.c.recipient_type == recipient_type,
+                    table.c.status == "unread",
+                    table.c.notification_id.in_(sorted(notification_ids)),
+                )
+                .values(status="read")
+                .returning(table.c.notification_id)
+            ).scalars().all()
+            if ids:
+                changed[(recipient_id, recipient_type)] = sorted(ids)
+    return changed
+
+
+class NotificationChannel:
+    """Snapshots, pushes and batched read receipts for subscribed connections."""
+
+    def __init__(self, bind: Engine, connections: ConnectionManager = manager,
+                 ack_interval_ms: int = NOTIFICATION_ACK_INTERVAL_MS):
+        self.bind = bind
+        self.connections = connections
+        self.ack_interval = ack_interval_ms / 1000
+        self._receipts: Dict[Recipient, Set[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {
+            "snapshots": 0,
+            "pushed": 0,
+            "forwarded": 0,
+            "acks": 0,
+            "ack_flushes": 0,
+            "marked_read": 0,
+            "flush_errors": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def snapshot(self, recipient_id: int, recipient_type: str, limit: int) -> dict:
+        self._stats["snapshots"] += 1
+        return await ws_repository.run_db(
+            notification_snapshot, self.bind, recipient_id, recipient_type, limit)
+
+    async def publish(self, written: Iterable[Tuple[dict, int]]) -> None:
+        """Push committed notifications to their recipients' subscribed connections."""
+        for row, notification_id in written:
+            view = notification_view(Notification(**row, notification_id=notification_id))
+            delivered = await self.connections.send_notification(
+                dumps_text({"type": "notification", "data": view}),
+                row["recipient_id"], row["recipient_type"])
+            if delivered:
+                self._stats["pushed"] += 1
+            elif delivered is None:
+                # Handed to the other workers; only the one holding the recipient pushes it
+                self._stats["forwarded"] += 1
+
+    def acknowledge(self, recipient_id: int, recipient_type: str, notification_ids: Iterable[int]) -> None:
+        """Queue read receipts for the next flush."""
+        self._receipts.setdefault((recipient_id, recipient_type), set()).update(notification_ids)
+        self._stats["acks"] += 1
+
+    async def start(self) -> None:
+        """Start flushing read receipts on the running event loop."""
+        if self.running:
+            return
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        print(f"📬 Notification channel started (read receipts every {self.ack_interval * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and mark whatever was acknowledged read."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        print(f"📬 Notification channel stopped, {self._stats['marked_read']} notifications marked read")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.ack_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write queued read receipts and tell each recipient which ids changed.
+
+        Returns:
+            int: Number of notifications marked read
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            receipts, self._receipts = self._receipts, {}
+            if not receipts:
+                return 0
+            try:
+                changed = await ws_repository.run_db(mark_read, self.bind, receipts)
+            except Exception as e:
+                # Receipts acknowledged since are merged with the failed ones
+                for recipient, notification_ids in receipts.items():
+                    self._receipts.setdefault(recipient, set()).update(notification_ids)
+                self._stats["flush_errors"] += 1
+                print(f"❌ Error marking notifications read: {e}")
+                return 0
+
+        marked = sum(len(ids) for ids in changed.values())
+        if marked:
+            counter_cache.apply(notifications=Counter({"unread": -marked, "read": marked}))
+        self._stats["ack_flushes"] += 1
+        self._stats["marked_read"] += marked
+        for (recipient_id, recipient_type), ids in changed.items():
+            await self.connections.send_notification(dumps_text({
+                "type": "notifications-read",
+                "data": {"notification_ids": ids}
+            }), recipient_id, recipient_type)
+        return marked
+
+    def metrics(self) -> dict:
+        return {
+            "running": self.running,
+            "ack_interval_ms": self.ack_interval * 1000,
+            "pending_receipts": sum(len(ids) for ids in self._receipts.values()),
+            **self._stats,
+        }
+
+
+# Global instance
+notification_channel = NotificationChannel(engine)
+notification_writer.add_listener(notification_channel.publish)
@@ -0,0 +1,122 @@
+"""
+Keyset pagination for a user's notification inbox.
+
+Pages are ordered newest first by (timestamp, notification_id). A page ends
+with a cursor "<timestamp>,<notification_id>" of its last row; the next page
+is everything strictly older than it. Each status is read as its own range
+of ix_notification_inbox, so a page touches about `limit` index entries per
+status however many notifications the account has accumulated.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from models import Notification
+
+
+INBOX_STATUSES = ("unread", "read")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(notification: Notification) -> str:
+    return f"{notification.timestamp.isoformat()},{notification.notification_id}"
+
+
+def parse_cursor(cursor: str) -> Cursor:
+    """
+    Split a "<timestamp>,<notification_id>" cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    timestamp, _, notification_id = cursor.rpartition(",")
+    if not timestamp:
+        raise ValueError("Cursor must be <timestamp>,<notification_id>")
+    return datetime.fromisoformat(timestamp), int(notification_id)
+
+
+def inbox_page(
+    session: Session,
+    recipient_id: int,
+    recipient_type: str,
+    before: Optional[Cursor] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Notification], Optional[str]]:
+    """
+    One page of a recipient's unread and read notifications, newest first.
+
+    Args:
+        session: Database session
+        recipient_id: ID of the rider or driver
+        recipient_type: "rider" or "driver"
+        before: Cursor of the last row on the previous page
+        limit: Page size
+
+    Returns:
+        tuple: (notifications, cursor for the next page or None on the last page)
+    """
+    order = (Notification.timestamp.desc(), Notification.notification_id.desc())
+    branches = []
+    for status in INBOX_STATUSES:
+        statement = select(Notification.notification_id).where(
+            Notification.recipient_id == recipient_id,
+            Notification.recipient_type == recipient_type,
+            Notification.status == status,
+        )
+        if before is not None:
+            statement = statement.where(
+                tuple_(Notification.timestamp, Notification.notification_id) < before)
+        # One extra row tells whether another page follows
+        branches.append(select(statement.order_by(*order).limit(limit + 1).subquery()))
+
+    page_ids = union_all(*branches).subquery()
+    notifications = list(session.execute(
+        select(Notification)
+        .join(page_ids, Notification.notification_id == page_ids.c.notification_id)
+        .order_by(*order)
+        .limit(limit + 1)
+    ).scalars())
+
+    if len(notifications) <= limit:
+        return notifications, None
+    notifications = notifications[:limit]
+    return notifications, encode_cursor(notifications[-1])
+
+
+def unread_count(session: Session, recipient_id: int, recipient_type: str) -> int:
+    """Unread notifications of one recipient, counted from ix_notification_inbox."""
+    return session.execute(select(func.count()).where(
+        Notification.recipient_id == recipient_id,
+        Notification.recipient_type == recipient_type,
+        Notification.status == "unread",
+    )).scalar_one()
+
+
+def notification_view(notification: Notification) -> dict:
+    """Notification as returned by GET /notifications."""
+    return {
+        "notification_id": notification.notification_id,
+        "recipient_id": notification.recipient_id,
+        "recipient_type": notification.recipient_type,
+        "sender_id": notification.sender_id,
+        "sender_type": notification.sender_type,
+        "notification_type": notification.notification_type,
+        "title": notification.title,
+        "message": notification.message,
+        "req_id": notification.req_id,
+        "trip_id": notification.trip_id,
+        "bid_amount": notification.bid_amount,
+        "original_amount": notification.original_amount,
+        "status": notification.status,
+        "timestamp": notification.timestamp.isoformat(),
+        "pickup_location": notification.pickup_location,
+        "destination": notification.destination,
+        "driver_name": notification.driver_name,
+        "driver_mobile": notification.driver_mobile,
+        "rider_name": notification.rider_name,
+    }
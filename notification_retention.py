@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Retention for the notification table.
+
+Notifications in a terminal status (NOTIFICATION_ARCHIVE_STATUSES) older than
+NOTIFICATION_RETENTION_DAYS are moved to notification_archive, at most
+NOTIFICATION_ARCHIVE_BATCH_SIZE rows per transaction with a short pause
+between batches, so status updates and inbox reads never queue behind one
+long delete. On PostgreSQL each batch is a single statement that picks its
+rows with FOR UPDATE SKIP LOCKED (rows another transaction holds wait for
+the next run), deletes them and inserts them into the archive. A run that
+moved rows ends with VACUUM (ANALYZE) notification so the freed space is
+reused instead of growing the table.
+
+Runs inside the API every NOTIFICATION_ARCHIVE_INTERVAL_S, or on demand:
+    python notification_retention.py [--days N] [--batch-size N] [--dry-run]
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import DateTime, bindparam, func, literal, select, text
+from sqlalchemy.engine import Engine
+
+from counters import counter_cache
+from db import engine
+from models import Notification, NotificationArchive
+
+
+NOTIFICATION_RETENTION = os.getenv("NOTIFICATION_RETENTION", "on")
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+NOTIFICATION_ARCHIVE_STATUSES = tuple(
+    status.strip()
+    for status in os.getenv(
+        "NOTIFICATION_ARCHIVE_STATUSES", "accepted,rejected,declined,cancelled,confirmed").split(",")
+    if status.strip()
+)
+NOTIFICATION_ARCHIVE_BATCH_SIZE = int(os.getenv("NOTIFICATION_ARCHIVE_BATCH_SIZE", "1000"))
+# Gap between batches, so other writers and replication keep up during a long run
+NOTIFICATION_ARCHIVE_PAUSE_MS = float(os.getenv("NOTIFICATION_ARCHIVE_PAUSE_MS", "50"))
+NOTIFICATION_ARCHIVE_INTERVAL_S = float(os.getenv("NOTIFICATION_ARCHIVE_INTERVAL_S", "3600"))
+
+# Columns copied as they are; archived_at is set by the batch
+COLUMNS = tuple(column.name for column in NotificationArchive.__table__.c if column.name != "archived_at")
+
+ARCHIVE_BATCH_POSTGRES = text(f"""
+    WITH batch AS (
+        SELECT notification_id
+        FROM notification
+        WHERE status IN :statuses AND timestamp < :cutoff
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM notification
+        USING batch
+        WHERE notification.notification_id = batch.notification_id
+        RETURNING notification.*
+    ), archived AS (
+        INSERT INTO notification_archive ({", ".join(COLUMNS)}, archived_at)
+        SELECT {", ".join(COLUMNS)}, :archived_at FROM moved
+        ON CONFLICT (notification_id) DO UPDATE SET
+            {", ".join(f"{name} = EXCLUDED.{name}" for name in (*COLUMNS, "archived_at") if name != "notification_id")}
+    )
+    SELECT status FROM moved
+""").bindparams(bindparam("statuses", expanding=True))
+
+
+def count_archivable(bind: Engine, cutoff: datetime, statuses: Sequence[str]) -> int:
+    """Rows a run with this cutoff would move."""
+    table = Notification.__table__
+    with bind.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table).where(
+            table.c.status.in_(statuses), table.c.timestamp < cutoff)).scalar_one()
+
+
+def archive_batch(bind: Engine, cutoff: datetime, statuses: Sequence[str], batch_size: int) -> Counter:
+    """
+    Move one batch of old notifications to the archive in one transaction.
+
+    Args:
+        bind: Engine
+        cutoff: Only notifications created before this (UTC) are moved
+        statuses: Only notifications in these statuses are moved
+        batch_size: Most rows to move
+
+    Returns:
+        Counter: Rows moved per status
+    """
+    archived_at = datetime.utcnow()
+    with bind.begin() as conn:
+        if bind.dialect.name == "postgresql":
+            moved = conn.execute(ARCHIVE_BATCH_POSTGRES, {
+                "statuses": list(statuses),
+                "cutoff": cutoff,
+                "batch_size": batch_size,
+                "archived_at": archived_at,
+            }).scalars().all()
+            return Counter(moved)
+
+        # Without SKIP LOCKED or data-modifying CTEs: copy, then delete, by id.
+        # An archived copy with the same id is replaced, never kept instead of the row
+        table, archive = Notification.__table__, NotificationArchive.__table__
+        ids = conn.execute(select(table.c.notification_id).where(
+            table.c.status.in_(statuses), table.c.timestamp < cutoff,
+        ).limit(batch_size)).scalars().all()
+        if not ids:
+            return Counter()
+        conn.execute(archive.insert().prefix_with("OR REPLACE", dialect="sqlite").from_select(
+            [*COLUMNS, "archived_at"],
+            select(*(table.c[name] for name in COLUMNS), literal(archived_at, DateTime))
+            .where(table.c.notification_id.in_(ids)),
+        ))
+        moved = conn.execute(table.delete().where(
+            table.c.notification_id.in_(ids)).returning(table.c.status)).scalars().all()
+        return Counter(moved)
+
+
+def vacuum_notifications(bind: Engine) -> None:
+    """Let PostgreSQL reuse the space of archived rows and refresh planner statistics."""
+    if bind.dialect.name != "postgresql":
+        return
+    # VACUUM cannot run inside a transaction block
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM (ANALYZE) notification"))
+
+
+class NotificationRetention:
+    """Moves old terminal notifications to notification_archive, in batches."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        retention_days: int = NOTIFICATION_RETENTION_DAYS,
+        statuses: Sequence[str] = NOTIFICATION_ARCHIVE_STATUSES,
+        batch_size: int = NOTIFICATION_ARCHIVE_BATCH_SIZE,
+        pause_ms: float = NOTIFICATION_ARCHIVE_PAUSE_MS,
+        interval_s: float = NOTIFICATION_ARCHIVE_INTERVAL_S,
+    ):
+        if not statuses:
+            raise ValueError("NOTIFICATION_ARCHIVE_STATUSES must name at least one status")
+        if "unread" in statuses or "read" in statuses:
+            raise ValueError("Unread and read notifications are still shown in the inbox")
+        self.bind = bind
+        self.retention_days = retention_days
+        self.statuses = tuple(statuses)
+        self.batch_size = batch_size
+        self.pause = pause_ms / 1000
+        self.interval = interval_s
+        self._task: Optional[asyncio.Task] = None
+        self._stop_requested = threading.Event()
+        self._progress = None
+        self._last_run = None
+        self._stats = {
+            "runs": 0,
+            "run_errors": 0,
+            "batches": 0,
+            "rows_archived": 0,
+            "last_lock_ms": 0.0,
+            "max_lock_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def run_sync(
+        self,
+        now: Optional[datetime] = None,
+        max_batches: Optional[int] = None,
+        dry_run: bool = False,
+        on_batch: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        """
+        Archive everything past retention, one batch per transaction.
+
+        Args:
+            now: Reference time (UTC), defaults to now
+            max_batches: Stop after this many batches
+            dry_run: Only count what would be archived
+            on_batch: Called with the progress dict after every batch
+
+        Returns:
+            dict: Summary of the run
+        """
+        self._stop_requested.clear()
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        started = time.perf_counter()
+        progress = {
+            "cutoff": cutoff.isoformat(),
+            "eligible": count_archivable(self.bind, cutoff, self.statuses),
+            "archived": 0,
+            "batches": 0,
+            "by_status": {},
+            "max_lock_ms": 0.0,
+            "total_lock_ms": 0.0,
+            "rows_per_s": 0.0,
+            "elapsed_s": 0.0,
+            "dry_run": dry_run,
+        }
+        self._progress = progress
+        by_status = Counter()
+
+        while not dry_run and progress["eligible"] and not self._stop_requested.is_set():
+            if max_batches is not None and progress["batches"] >= max_batches:
+                break
+            # Row locks are held from the first DELETE to the commit
+            batch_started = time.perf_counter()
+            moved = archive_batch(self.bind, cutoff, self.statuses, self.batch_size)
+            lock_ms = round((time.perf_counter() - batch_started) * 1000, 3)
+            count = sum(moved.values())
+            if not count:
+                break
+
+            counter_cache.apply(notifications=Counter({status: -n for status, n in moved.items()}))
+            by_status.update(moved)
+            elapsed = time.perf_counter() - started
+            progress.update({
+                "archived": progress["archived"] + count,
+                "batches": progress["batches"] + 1,
+                "by_status": dict(by_status),
+                "max_lock_ms": max(progress["max_lock_ms"], lock_ms),
+                "total_lock_ms": round(progress["total_lock_ms"] + lock_ms, 3),
+                "rows_per_s": round((progress["archived"] + count) / elapsed, 1),
+                "elapsed_s": round(elapsed, 3),
+            })
+            self._stats["batches"] += 1
+            self._stats["rows_archived"] += count
+            self._stats["last_lock_ms"] = lock_ms
+            self._stats["max_lock_ms"] = max(self._stats["max_lock_ms"], lock_ms)
+            if on_batch is not None:
+                on_batch(progress)
+            if count < self.batch_size and self.bind.dialect.name != "postgresql":
+                break  # Nothing is skipped without SKIP LOCKED, so a short batch was the last
+            if self.pause > 0:
+                time.sleep(self.pause)
+
+        if progress["archived"]:
+            vacuum_notifications(self.bind)
+        progress["elapsed_s"] = round(time.perf_counter() - started, 3)
+        self._stats["runs"] += 1
+        self._progress = None
+        self._last_run = progress
+        return progress
+
+    async def start(self) -> None:
+        """Archive once now and then every interval, on a worker thread."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        print(f"🗄️ Notification retention started (every {self.interval:.0f} s, "
+              f"kept {self.retention_days} days)")
+
+    async def stop(self) -> None:
+        """Stop after the batch in progress; the rest waits for the next run."""
+        self._stop_requested.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        print(f"🗄️ Notification retention stopped, {self._stats['rows_archived']} notifications archived")
+
+    async def _run(self) -> None:
+        while True:
+            await self.run()
+            await asyncio.sleep(self.interval)
+
+    async def run(self) -> Optional[dict]:
+        """One run off the event loop; errors are counted and logged."""
+        try:
+            summary = await asyncio.to_thread(self.run_sync)
+        except Exception as e:
+            self._stats["run_errors"] += 1
+            print(f"❌ Error archiving notifications: {e}")
+            return None
+        if summary["archived"]:
+            print(f"🗄️ Archived {summary['archived']} notifications in {summary['batches']} batches "
+                  f"({summary['rows_per_s']:.0f} rows/s, longest lock {summary['max_lock_ms']:.1f} ms)")
+        return summary
+
+    def metrics(self) -> dict:
+        """Progress of a run in flight, the last finished run and lifetime totals."""
+        return {
+            "running": self.running,
+            "retention_days": self.retention_days,
+            "statuses": list(self.statuses),
+            "batch_size": self.batch_size,
+            "interval_s": self.interval,
+            "in_progress": dict(self._progress) if self._progress else None,
+            "last_run": self._last_run,
+            **self._stats,
+        }
+
+
+# Global instance
+notification_retention = NotificationRetention(engine)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Move old accepted/rejected/... notifications to notification_archive")
+    parser.add_argument("--days", type=int, default=NOTIFICATION_RETENTION_DAYS,
+                        help="Keep notifications newer than this many days")
+    parser.add_argument("--batch-size", type=int, default=NOTIFICATION_ARCHIVE_BATCH_SIZE,
+                        help="Rows moved per transaction")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived")
+    args = parser.parse_args()
+
+    from db import SQLALCHEMY_DATABASE_URL
+
+    retention = NotificationRetention(engine, retention_days=args.days, batch_size=args.batch_size)
+    print("🚀 Starting notification archival...")
+    print(f"📁 Database: {SQLALCHEMY_DATABASE_URL}")
+    print(f"📊 Statuses {', '.join(retention.statuses)} older than {args.days} days, "
+          f"{args.batch_size} rows per batch")
+
+    def report(progress: dict) -> None:
+        if progress["batches"] % 10 == 0 or progress["archived"] >= progress["eligible"]:
+            print(f"   - {progress['archived']}/{progress['eligible']} archived, "
+                  f"{progress['rows_per_s']:.0f} rows/s, longest lock {progress['max_lock_ms']:.1f} ms")
+
+    try:
+        summary = retention.run_sync(max_batches=args.max_batches, dry_run=args.dry_run, on_batch=report)
+    except Exception as e:
+        print(f"❌ Archival failed: {str(e)}")
+        raise
+
+    if args.dry_run:
+        print(f"\n✅ {summary['eligible']} notifications older than {summary['cutoff']} would be archived")
+        return
+    print("\n📋 Archived by status:")
+    for status, count in sorted(summary["by_status"].items()):
+        print(f"   - {status}: {count}")
+    print(f"\n✅ Archived {summary['archived']} of {summary['eligible']} notifications in "
+          f"{summary['batches']} batches, {summary['elapsed_s']:.1f} s "
+          f"({summary['rows_per_s']:.0f} rows/s, longest lock {summary['max_lock_ms']:.1f} ms, "
+          f"total lock {summary['total_lock_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
+    print("\n🎉 Archival finished!")
@@ -0,0 +1,295 @@
+"""
+Batched persistence for notifications created by the /ws handlers.
+
+Handlers submit notification records and get back a future for the new
+notification_id. A background task writes everything submitted so far with
+one multi-row INSERT ... RETURNING notification_id per batch, then resolves
+each future with its id (or None if the row itself was rejected).
+Notifications submitted while a batch is being written form the next one,
+so batches grow with load without delaying a lone notification. If the
+database is unreachable the batch goes back on the queue and is retried
+every NOTIFICATION_RETRY_MS; its futures stay pending until then.
+
+NOTIFICATION_DURABILITY decides what a handler waits for before its
+WebSocket push:
+    "commit": the batch holding its notification has committed, so a client
+              that reacts to the push by fetching /notifications sees it
+    "async":  nothing; the notification is written in the background and can
+              be lost if the worker dies before the next flush
+Handlers that put the notification_id in their push always wait.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+import ws_repository
+from counters import counter_cache
+from db import engine
+from models import Notification
+
+
+# "batched" queues notifications for the writer; "sync" keeps one commit per notification
+NOTIFICATION_WRITE_MODE = os.getenv("NOTIFICATION_WRITE_MODE", "batched")
+NOTIFICATION_DURABILITY = os.getenv("NOTIFICATION_DURABILITY", "commit")
+# Optional wait for more notifications before writing a batch; with 0 the
+# batches come from notifications that queue up during the previous write
+NOTIFICATION_LINGER_MS = float(os.getenv("NOTIFICATION_LINGER_MS", "0"))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))
+NOTIFICATION_RETRY_MS = float(os.getenv("NOTIFICATION_RETRY_MS", "1000"))
+
+DURABILITY_MODES = ("commit", "async")
+
+# listener(written): written holds (row, notification_id) for each committed row
+WrittenListener = Callable[[List[Tuple[dict, int]]], Awaitable[None]]
+
+
+class _PartialWrite(Exception):
+    """The database failed partway through a row-by-row write."""
+
+    def __init__(self, ids: List[Optional[int]]):
+        super().__init__(f"{len(ids)} rows handled before the failure")
+        self.ids = ids
+
+
+class NotificationWriter:
+    """Micro-batches notification inserts off the event loop."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        table: Table = Notification.__table__,
+        durability: str = NOTIFICATION_DURABILITY,
+        linger_ms: float = NOTIFICATION_LINGER_MS,
+        batch_size: int = NOTIFICATION_BATCH_SIZE,
+        retry_ms: float = NOTIFICATION_RETRY_MS,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown NOTIFICATION_DURABILITY {durability!r}, expected one of {DURABILITY_MODES}")
+        self.bind = bind
+        self.table = table
+        self.durability = durability
+        self.linger = linger_ms / 1000
+        self.batch_size = batch_size
+        self.retry = retry_ms / 1000
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self._listeners: List[WrittenListener] = []
+        self._stats = {
+            "submitted": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_rejected": 0,
+            "rows_dropped": 0,
+            "flush_errors": 0,
+            "largest_batch": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "max_pending": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, notification_data: dict) -> asyncio.Future:
+        """
+        Queue a notification for the next batch.
+
+        Args:
+            notification_data: Notification fields as passed to save_notification_to_db
+
+        Returns:
+            asyncio.Future: Resolves to the notification_id, or None if the row
+                was rejected or still unwritten when the writer stopped
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((ws_repository.notification_row(notification_data), future))
+        self._stats["submitted"] += 1
+        pending = len(self._pending)
+        if pending > self._stats["max_pending"]:
+            self._stats["max_pending"] = pending
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    def add_listener(self, listener: WrittenListener) -> None:
+        """Call listener after every batch with the rows it committed."""
+        self._listeners.append(listener)
+
+    async def save(self, notification_data: dict, wait: bool = False) -> Optional[int]:
+        """
+        Queue a notification and wait for it as the durability mode requires.
+
+        Args:
+            notification_data: Notification fields
+            wait: Wait for the id even in "async" mode
+
+        Returns:
+            Optional[int]: notification_id, or None if not waited for or not written
+        """
+        future = self.submit(notification_data)
+        if self.durability == "async" and not wait:
+            return None
+        return await future
+
+    async def start(self) -> None:
+        """Start the background batch loop on the running event loop."""
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        print(f"🔔 Notification writer started ({self.durability} durability, "
+              f"{self.linger * 1000:.0f} ms linger)")
+
+    async def stop(self) -> None:
+        """Stop the batch loop once everything submitted so far is written."""
+        if self._task is not None:
+            # Let an in-flight batch finish so its futures are resolved
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            # The database is still unreachable; nobody will retry these
+            print(f"❌ Dropping {len(self._pending)} unwritten notifications")
+            self._stats["rows_dropped"] += len(self._pending)
+            for _, future in self._pending:
+                if not future.done():
+                    future.set_result(None)
+            self._pending.clear()
+        print(f"🔔 Notification writer stopped, {self._stats['rows_written']} rows written")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            if self._pending:
+                # Left over from a failed flush: retry after a pause unless woken sooner
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.retry)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._wakeup.wait()
+            self._wakeup.clear()
+            if 0 < len(self._pending) < self.batch_size and self.linger > 0 and not self._stopping:
+                await asyncio.sleep(self.linger)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write everything pending, batch_size rows per statement.
+
+        Stops at the first batch that fails for a reason other than a bad row
+        and puts its unwritten rows back on the queue.
+
+        Returns:
+            int: Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                rows = [row for row, _ in batch]
+                error = None
+                try:
+                    ids = await asyncio.to_thread(self._write_batch, rows)
+                except _PartialWrite as e:
+                    ids, error = e.ids, e.__cause__
+                except Exception as e:
+                    ids, error = [], e
+                if error is not None:
+                    self._restore(batch[len(ids):])
+                    self._stats["flush_errors"] += 1
+                    print(f"❌ Error writing {len(rows) - len(ids)} notifications, will retry: {error}")
+                for (_, future), notification_id in zip(batch, ids):
+                    if not future.done():
+                        future.set_result(notification_id)
+                committed = [(row, notification_id) for row, notification_id in zip(rows, ids)
+                             if notification_id is not None]
+                written += len(committed)
+                for listener in self._listeners:
+                    try:
+                        await listener(committed)
+                    except Exception as e:
+                        print(f"❌ Error in notification listener: {e}")
+                if error is not None:
+                    break
+        return written
+
+    def _restore(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        # Back in front of anything submitted during the failed flush, in order
+        self._pending[:0] = batch
+
+    def _insert(self):
+        return insert(self.table).returning(
+            self.table.c.notification_id, sort_by_parameter_order=True)
+
+    def _write_batch(self, rows: List[dict]) -> List[Optional[int]]:
+        start = time.perf_counter()
+        try:
+            with self.bind.begin() as conn:
+                ids = list(conn.execute(self._insert(), rows).scalars())
+        except IntegrityError:
+            # One bad row (e.g. an unknown req_id) must not sink the whole batch
+            ids = self._write_rows_individually(rows, start)
+
+        self._record(len(rows), ids, start)
+        return ids
+
+    def _record(self, batch_size: int, ids: List[Optional[int]], start: float) -> None:
+        written = sum(notification_id is not None for notification_id in ids)
+        counter_cache.apply(notifications=Counter({"unread": written}))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += written
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], batch_size)
+        self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], round(elapsed_ms, 3))
+
+    def _write_rows_individually(self, rows: List[dict], start: float) -> List[Optional[int]]:
+        ids = []
+        for row in rows:
+            try:
+                with self.bind.begin() as conn:
+                    ids.append(conn.execute(self._insert(), [row]).scalar_one())
+            except IntegrityError as e:
+                self._stats["rows_rejected"] += 1
+                ids.append(None)
+                print(f"❌ Dropping notification for {row['recipient_type']} "
+                      f"{row['recipient_id']}: {e.orig}")
+            except Exception as e:
+                # Rows already committed keep their ids; the rest are retried
+                self._record(len(rows), ids, start)
+                raise _PartialWrite(ids) from e
+        return ids
+
+    def metrics(self) -> dict:
+        """Queue depth and batch statistics."""
+        return {
+            "mode": "batched" if self.running else "sync",
+            "durability": self.durability,
+            "pending": len(self._pending),
+            "linger_ms": self.linger * 1000,
+            "batch_size": self.batch_size,
+            **self._stats,
+        }
+
+
+# Global instance
+notification_writer = NotificationWriter(engine)
@@ -0,0 +1,188 @@
+"""
+Per-connection outbound WebSocket queues.
+
+Every connection gets a bounded queue drained by its own writer task, so
+handlers and broadcasts only append to queues and never wait on a client's
+network. What happens when a client cannot keep up is set by
+WS_SLOW_CONSUMER_POLICY:
+
+    drop_oldest: once WS_SEND_QUEUE_SIZE frames are waiting, the oldest
+        droppable (location) frame makes room. Bid, trip and other frames are
+        never dropped; if they alone pile up to WS_SEND_HIGH_WATER the client
+        is disconnected.
+    disconnect: nothing is dropped; the client is disconnected as soon as
+        WS_SEND_QUEUE_SIZE frames are waiting.
+
+A single send that takes longer than WS_FANOUT_SEND_TIMEOUT seconds (a client
+whose TCP window stays shut) disconnects the client as well, so a stalled
+writer cannot hold its queue open forever.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_HIGH_WATER = int(os.getenv("WS_SEND_HIGH_WATER", "512"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+WS_FANOUT_SEND_TIMEOUT = float(os.getenv("WS_FANOUT_SEND_TIMEOUT", "2.0"))
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+# Text frames are JSON; bytes are binary location frames (see location_codec.py)
+Frame = Union[str, bytes]
+
+# 1013 "Try Again Later": the server gave up on a client that fell too far behind
+CLOSE_CODE_SLOW_CONSUMER = 1013
+
+
+class OutboundQueue:
+    """Bounded send queue and writer task for one WebSocket connection."""
+
+    def __init__(
+        self,
+        connection_id: str,
+        websocket: WebSocket,
+        on_close: Optional[Callable[[str, str], None]] = None,
+        maxsize: int = WS_SEND_QUEUE_SIZE,
+        high_water: int = WS_SEND_HIGH_WATER,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        send_timeout: float = WS_FANOUT_SEND_TIMEOUT,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.on_close = on_close
+        self.maxsize = maxsize
+        self.high_water = max(high_water, maxsize)
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        # (message, droppable)
+        self._frames: Deque[Tuple[Frame, bool]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        # Held so the close is not garbage collected before it finishes
+        self._close_task: Optional[asyncio.Future] = None
+        self.sent = 0
+        self.dropped = 0
+        self.timed_out = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, message: Frame, droppable: bool = False) -> bool:
+        """
+        Queue a frame without waiting for the client.
+
+        Args:
+            message: Encoded text frame, or bytes for a binary frame
+            droppable: True for location frames a newer frame makes obsolete
+
+        Returns:
+            bool: True if the frame was queued; False if it was dropped or the
+                connection is closed (check `closed` to tell them apart)
+        """
+        if self.closed:
+            return False
+        depth = len(self._frames)
+        if self.policy == "disconnect":
+            if depth >= self.maxsize:
+                self._close("slow_consumer")
+                return False
+        elif depth >= self.maxsize:
+            if not self._drop_oldest_droppable():
+                if droppable:
+                    self.dropped += 1
+                    return False
+                if depth >= self.high_water:
+                    self._close("slow_consumer")
+                    return False
+
+        self._frames.append((message, droppable))
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _drop_oldest_droppable(self) -> bool:
+        for index, (_, droppable) in enumerate(self._frames):
+            if droppable:
+                del self._frames[index]
+                self.dropped += 1
+                return True
+        return False
+
+    async def join(self) -> None:
+        """Wait until every queued frame has been written or the queue closed."""
+        await self._idle.wait()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._frames:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            message, _ = self._frames.popleft()
+            try:
+                if isinstance(message, bytes):
+                    send = self.websocket.send_bytes(message)
+                else:
+                    send = self.websocket.send_text(message)
+                await asyncio.wait_for(send, self.send_timeout)
+                self.sent += 1
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self._close("send_timeout")
+                return
+            except Exception:
+                self._close("send_failed", close_socket=False)
+                return
+
+    def _close(self, reason: str, close_socket: bool = True, notify: bool = True) -> None:
+        """Stop writing, drop pending frames and tell the owner."""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self._frames.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        if close_socket:
+            self._close_task = asyncio.ensure_future(self._close_socket())
+        if notify and self.on_close is not None:
+            self.on_close(self.connection_id, reason)
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close(code=CLOSE_CODE_SLOW_CONSUMER)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Stop the writer after the connection went away; the socket is left alone."""
+        self._close("disconnected", close_socket=False, notify=False)
+
+    def metrics(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "timed_out": self.timed_out,
+        }
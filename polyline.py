@@ -0,0 +1,153 @@
+"""
+Route simplification and compact encoding for trip playback.
+
+A recorded trip holds a point every few seconds, far more than a map can
+show at city zoom. simplify() drops points with Douglas-Peucker at a
+tolerance of about one screen pixel at the requested zoom, and
+encode_polyline() packs what is left with Google's encoded polyline
+algorithm, which map SDKs decode natively.
+"""
+import math
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+# Allowed deviation from the original path, in screen pixels
+POLYLINE_TOLERANCE_PX = float(os.getenv("POLYLINE_TOLERANCE_PX", "1"))
+# Web Mercator metres per pixel at zoom 0 on the equator (256 px tiles)
+METRES_PER_PIXEL_Z0 = 156543.03392
+EARTH_RADIUS_M = 6_371_000
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+
+Point = Tuple[float, float]
+
+
+def tolerance_for_zoom(zoom: float, latitude: float, pixels: float = POLYLINE_TOLERANCE_PX) -> float:
+    """Metres covered by the given number of pixels at a zoom level and latitude."""
+    return pixels * METRES_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def simplify_mask(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker over an (n, 2) array of (latitude, longitude).
+
+    Rather than recursing one segment at a time, every segment still above
+    tolerance is split in the same NumPy pass, so the Python loop runs once
+    per level of the recursion. The kept points are the same as the
+    recursive algorithm's.
+
+    Returns:
+        np.ndarray: Boolean mask of the points to keep
+    """
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if count < 3:
+        return keep
+
+    # Local equirectangular projection; accurate to well under a metre across a city
+    latitudes = np.radians(points[:, 0])
+    y = latitudes * EARTH_RADIUS_M
+    x = np.radians(points[:, 1]) * EARTH_RADIUS_M * math.cos(float(latitudes.mean()))
+    tolerance_sq = tolerance_m * tolerance_m
+
+    # Interior points of segments that may still be split
+    open_points = np.arange(1, count - 1)
+    while len(open_points):
+        kept = np.flatnonzero(keep)
+        segment = np.searchsorted(kept, open_points) - 1
+        first = kept[segment]
+        last = kept[segment + 1]
+
+        px = x[open_points] - x[first]
+        py = y[open_points] - y[first]
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length_sq = dx * dx + dy * dy
+        # Distance to the chord segment, clamped to its endpoints; a closed
+        # loop or a stop measures to the shared endpoint
+        t = np.divide(px * dx + py * dy, length_sq, out=np.zeros_like(px), where=length_sq > 0)
+        t = np.clip(t, 0.0, 1.0)
+        ex = px - t * dx
+        ey = py - t * dy
+        distance_sq = ex * ex + ey * ey
+
+        # open_points is sorted, so each segment's points are contiguous
+        starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+        worst = np.maximum.reduceat(distance_sq, starts)
+        splitting = worst > tolerance_sq
+        if not splitting.any():
+            break
+        # First point reaching its segment's maximum, as np.argmax would pick
+        is_worst = distance_sq == np.repeat(worst, np.diff(np.r_[starts, len(segment)]))
+        candidates = np.flatnonzero(is_worst)
+        _, first_worst = np.unique(segment[candidates], return_index=True)
+        split_at = candidates[first_worst][splitting]
+        keep[open_points[split_at]] = True
+
+        # Drop settled segments and the new split points
+        still_open = np.repeat(splitting, np.diff(np.r_[starts, len(segment)]))
+        still_open[split_at] = False
+        open_points = open_points[still_open]
+    return keep
+
+
+def simplify(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """Points of a path no further than tolerance_m from the original, first and last kept."""
+    if len(points) < 3:
+        return list(points)
+    array = np.asarray(points, dtype=float)
+    return [tuple(point) for point in array[simplify_mask(array, tolerance_m)].tolist()]
+
+
+def _encode_value(value: int, out: List[str]) -> None:
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: Sequence[Point], precision: int = 5) -> str:
+    """
+    Google encoded polyline of (latitude, longitude) points.
+
+    Each coordinate is rounded to 10^-precision degrees and stored as the
+    difference from the previous point, so a dense route costs a few
+    characters per point.
+    """
+    if len(points) == 0:
+        return ""
+    # Half-up rounding, as Math.round in the reference JavaScript encoder
+    scaled = np.floor(np.asarray(points, dtype=float) * 10 ** precision + 0.5).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    out: List[str] = []
+    for value in deltas.ravel().tolist():
+        _encode_value(value, out)
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Point]:
+    """Inverse of encode_polyline."""
+    factor = 10 ** precision
+    values = []
+    value = shift = 0
+    for char in encoded:
+        chunk = ord(char) - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    latitude = longitude = 0
+    points = []
+    for index in range(0, len(values) - 1, 2):
+        latitude += values[index]
+        longitude += values[index + 1]
+        points.append((latitude / factor, longitude / factor))
+    return points
@@ -2,8 +2,8 @@
 Schema definitions for user authentication and validation.
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+from typing import List, Optional, Union
 import re
 from pydantic import BaseModel, EmailStr, field_validator
 
@@ -135,12 +135,14 @@ class DriverLocationResponse(BaseModel):
     driver_id: int
     name: str
     mobile: str
+    distance_km: Optional[float] = None
 
 
 class NearbyDriversRequest(BaseModel):
     lat: float = Field(..., ge=-90, le=90)
     lon: float = Field(..., ge=-180, le=180)
     radius: float = Field(..., gt=0)  # radius in kilometers
+    limit: int = Field(default=20, gt=0, le=100)  # closest N drivers
 
 
 class Coordinates(BaseModel):
@@ -178,3 +180,68 @@ class LocationAddResponse(BaseModel):
 class LocationRemoveResponse(BaseModel):
     success: bool
     message: Optional[str] = None
+
+
+"""Schemas for the "data" object of /ws messages."""
+
+
+# Bid amounts are forwarded as sent, so 500 stays 500 rather than 500.0
+Amount = Union[int, float]
+
+
+class WSPayload(BaseModel):
+    """Fields a handler relies on are checked; anything else is kept and forwarded."""
+    model_config = ConfigDict(extra="allow")
+
+    def payload(self) -> dict:
+        """The fields the client sent, with validated values."""
+        return self.model_dump(exclude_unset=True)
+
+
+class WSLocationUpdate(WSPayload):
+    # The map client sends "id", the driver app "driver_id". Binary location
+    # frames carry it as a uint32, so larger ids are rejected here
+    driver_id: int = Field(..., ge=0, lt=2**32, validation_alias=AliasChoices("id", "driver_id"))
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+class WSBid(WSPayload):
+    req_id: Optional[int] = None
+    rider_id: Optional[int] = None
+    driver_id: Optional[int] = None
+    amount: Optional[Amount] = None
+
+
+class WSDriverBidOffer(WSBid):
+    # Recorded in the database before it is forwarded
+    req_id: int
+    rider_id: int
+    driver_id: int
+    amount: Amount
+
+
+class WSTrip(WSPayload):
+    trip_id: Optional[int] = None
+    req_id: Optional[int] = None
+    rider_id: Optional[int] = None
+    driver_id: Optional[int] = None
+
+
+class WSTripConfirmation(WSTrip):
+    req_id: int
+    rider_id: int
+    driver_id: int
+
+
+class WSTripLocationUpdate(WSTrip):
+    trip_id: int
+
+
+class WSNotificationSubscribe(WSPayload):
+    # Size of the first page; capped at notification_inbox.MAX_PAGE_SIZE
+    limit: Optional[int] = Field(None, ge=1)
+
+
+class WSNotificationAck(WSPayload):
+    notification_ids: List[int] = Field(..., min_length=1)
@@ -0,0 +1,98 @@
+"""
+JSON serialization shared by REST responses and WebSocket messages.
+
+orjson is used when it is installed and the standard library json module
+otherwise, so both paths produce the same documents: non-string keys become
+strings and unknown types such as Decimal fall back to str().
+"""
+import json
+from datetime import date, datetime, time
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        """
+        Encode obj as UTF-8 JSON.
+
+        Args:
+            obj: JSON-compatible object
+
+        Returns:
+            bytes: Encoded document
+        """
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """
+        Decode a JSON document.
+
+        Args:
+            data: Encoded document
+
+        Returns:
+            Any: Decoded object
+        """
+        return orjson.loads(data)
+else:
+    DefaultJSONResponse = JSONResponse
+
+    def _default(obj: Any) -> str:
+        # Match orjson's native ISO 8601 output for temporal types
+        if isinstance(obj, (datetime, date, time)):
+            return obj.isoformat()
+        return str(obj)
+
+    def dumps(obj: Any) -> bytes:
+        """
+        Encode obj as UTF-8 JSON.
+
+        Args:
+            obj: JSON-compatible object
+
+        Returns:
+            bytes: Encoded document
+        """
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """
+        Decode a JSON document.
+
+        Args:
+            data: Encoded document
+
+        Returns:
+            Any: Decoded object
+        """
+        return json.loads(data)
+
+
+def dumps_text(obj: Any) -> str:
+    """
+    Encode obj as JSON text for WebSocket text frames.
+
+    Broadcasts should call this once and hand the same string to every
+    recipient instead of encoding per connection.
+
+    Args:
+        obj: JSON-compatible object
+
+    Returns:
+        str: Encoded document
+    """
+    return dumps(obj).decode("utf-8")
@@ -0,0 +1,439 @@
+"""
+In-memory spatial index and vectorized distance helpers used to answer
+radius queries without scanning every driver in Python.
+"""
+import math
+from typing import Dict, Hashable, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np
+
+
+KM_PER_DEGREE_LAT = 111.32
+DEFAULT_CELL_SIZE_DEG = 0.05  # roughly 5.5 km north-south
+
+
+def _circle_bounds(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float]:
+    """Latitude range and longitude half-width (degrees) of a circle's bounding box."""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+
+    # Widest longitude span occurs at the latitude closest to a pole
+    widest_lat = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest_lat))
+    if cos_lat <= 1e-9:
+        lon_delta = 180.0
+    else:
+        lon_delta = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return min_lat, max_lat, lon_delta
+
+
+def _cell_span(cell_size_deg: float, lon_cells: int, min_lat: float, max_lat: float,
+               west: float, east: float) -> Tuple[int, int, Iterable[int]]:
+    """Grid rows and (wrapped) columns covering a box; east may exceed west by up to 360."""
+    min_row = int(math.floor(min_lat / cell_size_deg))
+    max_row = int(math.floor(max_lat / cell_size_deg))
+    if east - west >= 360.0:
+        return min_row, max_row, range(lon_cells)
+    first_col = int(math.floor((west + 180.0) / cell_size_deg))
+    last_col = int(math.floor((east + 180.0) / cell_size_deg))
+    span = min(last_col - first_col + 1, lon_cells)
+    return min_row, max_row, [(first_col + offset) % lon_cells for offset in range(span)]
+
+
+class GridIndex:
+    """
+    Uniform latitude/longitude grid.
+
+    Every key lives in exactly one cell. A radius query only visits the cells
+    that overlap the bounding box of the search circle, so its cost depends on
+    local density instead of the total number of indexed keys.
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        if cell_size_deg <= 0:
+            raise ValueError("cell_size_deg must be positive")
+        self.cell_size_deg = cell_size_deg
+        self._lon_cells = int(math.ceil(360.0 / cell_size_deg))
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._key_cells: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._key_cells)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._key_cells
+
+    def _cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        row = int(math.floor(latitude / self.cell_size_deg))
+        col = int(math.floor((longitude + 180.0) / self.cell_size_deg)) % self._lon_cells
+        return row, col
+
+    def insert(self, key: Hashable, latitude: float, longitude: float) -> None:
+        """
+        Add a key or move it to the cell of its new position.
+
+        Args:
+            key: Identifier of the indexed object (e.g. driver_id)
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+        """
+        cell = self._cell_for(latitude, longitude)
+        previous = self._key_cells.get(key)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._discard_from_cell(key, previous)
+        self._cells.setdefault(cell, set()).add(key)
+        self._key_cells[key] = cell
+
+    def remove(self, key: Hashable) -> bool:
+        """
+        Remove a key from the index.
+
+        Returns:
+            bool: True if the key was indexed
+        """
+        cell = self._key_cells.pop(key, None)
+        if cell is None:
+            return False
+        self._discard_from_cell(key, cell)
+        return True
+
+    def _discard_from_cell(self, key: Hashable, cell: Tuple[int, int]) -> None:
+        members = self._cells.get(cell)
+        if members is None:
+            return
+        members.discard(key)
+        if not members:
+            del self._cells[cell]
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> Iterator[Hashable]:
+        """
+        Yield every key whose cell overlaps the bounding box of the search circle.
+
+        The result is a superset of the keys within radius_km; callers still
+        apply an exact distance check.
+        """
+        min_lat, max_lat, lon_delta = _circle_bounds(latitude, longitude, radius_km)
+        return self.candidates_in_box(min_lat, max_lat, longitude - lon_delta, longitude + lon_delta)
+
+    def candidates_in_box(self, south: float, north: float, west: float, east: float) -> Iterator[Hashable]:
+        """
+        Yield every key whose cell overlaps a latitude/longitude box.
+
+        east may be up to 360 degrees past west for boxes crossing the
+        antimeridian. The result is a superset of the keys inside the box.
+        """
+        min_row, max_row, cols = _cell_span(
+            self.cell_size_deg, self._lon_cells, south, north, west, east)
+
+        # Very large boxes touch more cells than there are occupied cells
+        if (max_row - min_row + 1) * len(cols) > len(self._cells):
+            for (row, col), members in self._cells.items():
+                if min_row <= row <= max_row:
+                    yield from members
+            return
+
+        for row in range(min_row, max_row + 1):
+            for col in cols:
+                members = self._cells.get((row, col))
+                if members:
+                    yield from members
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance between two points given in degrees."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    sin_dlat = math.sin((lat2 - lat1) * 0.5)
+    sin_dlon = math.sin((lon2 - lon1) * 0.5)
+    a = sin_dlat * sin_dlat + math.cos(lat1) * math.cos(lat2) * sin_dlon * sin_dlon
+    return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_km(lat_rad: float, lon_rad: float, lats_rad: np.ndarray, lons_rad: np.ndarray) -> np.ndarray:
+    """
+    Vectorized haversine distance from one point to many.
+
+    Args:
+        lat_rad, lon_rad: Reference point in radians
+        lats_rad, lons_rad: Arrays of points in radians
+
+    Returns:
+        np.ndarray: Distances in kilometers
+    """
+    sin_dlat = np.sin((lats_rad - lat_rad) * 0.5)
+    sin_dlon = np.sin((lons_rad - lon_rad) * 0.5)
+    a = sin_dlat * sin_dlat + math.cos(lat_rad) * np.cos(lats_rad) * sin_dlon * sin_dlon
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CoordinateArrays:
+    """
+    Struct-of-arrays store of positions for vectorized distance math.
+
+    Keys map to dense slots; removing a key moves the last slot into the hole
+    so the arrays stay contiguous.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._slots: Dict[Hashable, int] = {}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.lat_rad = np.zeros(capacity, dtype=np.float64)
+        self.lon_rad = np.zeros(capacity, dtype=np.float64)
+        self.seen_at = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def _grow(self) -> None:
+        capacity = len(self.ids) * 2
+        for name in ("ids", "lat_rad", "lon_rad", "seen_at"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def upsert(self, key: int, latitude: float, longitude: float, seen_at: float) -> None:
+        """Store a position given in degrees; seen_at is compared against nearest_within's min_seen_at."""
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._size == len(self.ids):
+                self._grow()
+            slot = self._size
+            self._slots[key] = slot
+            self._size += 1
+            self.ids[slot] = key
+        self.lat_rad[slot] = math.radians(latitude)
+        self.lon_rad[slot] = math.radians(longitude)
+        self.seen_at[slot] = seen_at
+
+    def remove(self, key: Hashable) -> bool:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        last = self._size - 1
+        if slot != last:
+            moved_key = self.ids[last].item()
+            self.ids[slot] = self.ids[last]
+            self.lat_rad[slot] = self.lat_rad[last]
+            self.lon_rad[slot] = self.lon_rad[last]
+            self.seen_at[slot] = self.seen_at[last]
+            self._slots[moved_key] = slot
+        self._size = last
+        return True
+
+    def slots_for(self, keys: Iterable[Hashable]) -> np.ndarray:
+        """Dense slot numbers for the given keys, skipping unknown keys."""
+        slots = self._slots
+        return np.fromiter(
+            (slots[key] for key in keys if key in slots), dtype=np.intp)
+
+    def all_slots(self) -> np.ndarray:
+        return np.arange(self._size, dtype=np.intp)
+
+
+def nearest_within(
+    arrays: CoordinateArrays,
+    slots: np.ndarray,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    min_seen_at: float = float("-inf"),
+    limit: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distances and radius mask for all candidate slots in one vectorized pass.
+
+    Returns:
+        tuple: (ids, distances_km) of the matches, closest first, at most limit long
+    """
+    if slots.size == 0 or (limit is not None and limit <= 0):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    distances = haversine_km(
+        math.radians(latitude), math.radians(longitude),
+        arrays.lat_rad[slots], arrays.lon_rad[slots])
+    mask = (distances <= radius_km) & (arrays.seen_at[slots] > min_seen_at)
+    slots = slots[mask]
+    distances = distances[mask]
+
+    if limit is not None and limit < distances.size:
+        # Top-k without sorting the whole match set
+        top = np.argpartition(distances, limit - 1)[:limit]
+        slots = slots[top]
+        distances = distances[top]
+
+    order = np.argsort(distances, kind="stable")
+    return arrays.ids[slots[order]], distances[order]
+
+
+class SubscriptionArea:
+    """A circle or a latitude/longitude box that a subscriber wants updates for."""
+
+    __slots__ = ("south", "north", "west", "east", "center", "radius_km")
+
+    def __init__(self, south: float, north: float, west: float, east: float,
+                 center: Optional[Tuple[float, float]] = None, radius_km: Optional[float] = None):
+        # east < west marks a box that crosses the antimeridian
+        self.south = south
+        self.north = north
+        self.west = west
+        self.east = east
+        self.center = center
+        self.radius_km = radius_km
+
+    @classmethod
+    def circle(cls, latitude: float, longitude: float, radius_km: float) -> "SubscriptionArea":
+        """
+        Area within radius_km of a center point.
+
+        Raises:
+            ValueError: If the center or radius is out of range
+        """
+        _check_point(latitude, longitude)
+        if not radius_km > 0:
+            raise ValueError("radius_km must be positive")
+        min_lat, max_lat, lon_delta = _circle_bounds(latitude, longitude, radius_km)
+        return cls(min_lat, max_lat, longitude - lon_delta, longitude + lon_delta,
+                   center=(latitude, longitude), radius_km=radius_km)
+
+    @classmethod
+    def bbox(cls, south: float, west: float, north: float, east: float) -> "SubscriptionArea":
+        """
+        Area inside a bounding box; west > east crosses the antimeridian.
+
+        Raises:
+            ValueError: If a corner is out of range or south > north
+        """
+        _check_point(south, west)
+        _check_point(north, east)
+        if south > north:
+            raise ValueError("south must not be greater than north")
+        if east < west:
+            east += 360.0
+        return cls(south, north, west, east)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SubscriptionArea":
+        """
+        Parse {"latitude", "longitude", "radius_km"} or {"south", "west", "north", "east"}.
+
+        Raises:
+            ValueError: If neither shape is present or values are invalid
+        """
+        try:
+            if "radius_km" in data:
+                return cls.circle(float(data["latitude"]), float(data["longitude"]), float(data["radius_km"]))
+            return cls.bbox(float(data["south"]), float(data["west"]),
+                            float(data["north"]), float(data["east"]))
+        except (KeyError, TypeError) as e:
+            raise ValueError(
+                "Area needs latitude/longitude/radius_km or south/west/north/east") from e
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not self.south <= latitude <= self.north:
+            return False
+        if self.center is not None:
+            return distance_km(self.center[0], self.center[1], latitude, longitude) <= self.radius_km
+        # Compare in the box's own longitude frame, which may extend past 180
+        offset = (longitude - self.west) % 360.0
+        return offset <= self.east - self.west
+
+    def as_dict(self) -> dict:
+        if self.center is not None:
+            return {"latitude": self.center[0], "longitude": self.center[1], "radius_km": self.radius_km}
+        east = self.east - 360.0 if self.east > 180.0 else self.east
+        return {"south": self.south, "west": self.west, "north": self.north, "east": east}
+
+
+def _check_point(latitude: float, longitude: float) -> None:
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        raise ValueError(f"Invalid coordinates: {latitude}, {longitude}")
+
+
+class AreaIndex:
+    """
+    Grid of subscription areas, answering "which areas contain this point?".
+
+    Each area is registered in every cell its bounding box overlaps, so a
+    lookup only checks the areas registered in one cell. Areas spanning more
+    than max_cells cells are kept in a short list checked on every lookup.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.1, max_cells: int = 4096):
+        if cell_size_deg <= 0:
+            raise ValueError("cell_size_deg must be positive")
+        self.cell_size_deg = cell_size_deg
+        self.max_cells = max_cells
+        self._lon_cells = int(math.ceil(360.0 / cell_size_deg))
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._areas: Dict[Hashable, SubscriptionArea] = {}
+        self._key_cells: Dict[Hashable, Tuple[Tuple[int, int], ...]] = {}
+        self._wide: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._areas)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._areas
+
+    def get(self, key: Hashable) -> Optional[SubscriptionArea]:
+        return self._areas.get(key)
+
+    def insert(self, key: Hashable, area: SubscriptionArea) -> None:
+        """
+        Register an area for key, replacing any previous area of that key.
+
+        Args:
+            key: Identifier of the subscriber (e.g. connection_id)
+            area: Area the subscriber is interested in
+        """
+        self.remove(key)
+        self._areas[key] = area
+        min_row, max_row, cols = _cell_span(
+            self.cell_size_deg, self._lon_cells, area.south, area.north, area.west, area.east)
+        if (max_row - min_row + 1) * len(cols) > self.max_cells:
+            self._wide.add(key)
+            return
+        cells = tuple((row, col) for row in range(min_row, max_row + 1) for col in cols)
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+        self._key_cells[key] = cells
+
+    def remove(self, key: Hashable) -> bool:
+        """
+        Drop the area of key.
+
+        Returns:
+            bool: True if key had an area
+        """
+        if self._areas.pop(key, None) is None:
+            return False
+        self._wide.discard(key)
+        for cell in self._key_cells.pop(key, ()):
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._cells[cell]
+        return True
+
+    def covering(self, latitude: float, longitude: float) -> Set[Hashable]:
+        """Keys whose area contains the point."""
+        row = int(math.floor(latitude / self.cell_size_deg))
+        col = int(math.floor((longitude + 180.0) / self.cell_size_deg)) % self._lon_cells
+        candidates = self._cells.get((row, col), ())
+        areas = self._areas
+        matches = {key for key in candidates if areas[key].contains(latitude, longitude)}
+        for key in self._wide:
+            if areas[key].contains(latitude, longitude):
+                matches.add(key)
+        return matches
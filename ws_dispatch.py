@@ -0,0 +1,282 @@
+"""
+Message-type dispatch for the /ws endpoint.
+
+Handlers register for a message type with an optional Pydantic model for the
+message's "data" object:
+
+    @dispatcher.register("driver-bid-offer", WSDriverBidOffer)
+    async def handle_driver_bid_offer(ctx, data, message):
+        ...
+
+dispatch() finds the handler with one dict lookup, validates the payload
+before the handler sees it (invalid frames get an error reply instead of
+failing halfway through), and records how long each message type takes.
+
+Binary location frames (see location_codec.py) are routed the same way by
+frame kind:
+
+    @dispatcher.register_frame(FRAME_LOCATION_UPDATE, "binary-location-update")
+    async def handle_location_frame(ctx, location):
+        ...
+"""
+import bisect
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import WebSocket
+from pydantic import BaseModel, ValidationError
+
+from location_codec import BINARY_SUBPROTOCOL, LocationFrame, decode_frame
+from outbound import Frame, OutboundQueue
+from serialization import dumps_text
+
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+@dataclass
+class WSContext:
+    """The connection a message arrived on."""
+    websocket: WebSocket
+    connection_id: str
+    user_id: Optional[int] = None
+    user_role: Optional[str] = None
+    # Negotiated the binary location subprotocol
+    binary: bool = False
+    # The connection's send queue once manager.connect() registered it; its
+    # writer task must be the only one writing to the socket
+    outbound: Optional[OutboundQueue] = None
+
+    async def send(self, payload: dict) -> None:
+        """Reply on this connection only."""
+        await self.send_text(dumps_text(payload))
+
+    async def send_text(self, message: str) -> None:
+        await self._send(message)
+
+    async def send_frame(self, frame: bytes) -> None:
+        await self._send(frame)
+
+    async def _send(self, message: Frame) -> None:
+        if self.outbound is not None:
+            self.outbound.put(message)
+        elif isinstance(message, bytes):
+            await self.websocket.send_bytes(message)
+        else:
+            await self.websocket.send_text(message)
+
+    async def send_error(self, message: str) -> None:
+        await self.send({"type": "error", "message": message})
+
+
+# handler(ctx, data, message): data is the validated "data" object, message the whole frame
+Handler = Callable[[WSContext, dict, dict], Awaitable[None]]
+
+# frame_handler(ctx, location): location is the decoded binary frame
+FrameHandler = Callable[[WSContext, LocationFrame], Awaitable[None]]
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of handling times in milliseconds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max_ms past the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else round(self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(self.buckets, self.counts)},
+                "inf": self.counts[-1],
+            },
+        }
+
+
+class MessageDispatcher:
+    """Maps message types to handler coroutines and their payload models."""
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Handler, Optional[Type[BaseModel]]]] = {}
+        # frame kind -> (handler, name used for metrics)
+        self._frame_routes: Dict[int, Tuple[FrameHandler, str]] = {}
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self._stats = {"dispatched": 0, "invalid": 0, "unknown": 0, "errors": 0}
+
+    def register(self, message_type: str, model: Optional[Type[BaseModel]] = None) -> Callable[[Handler], Handler]:
+        """
+        Decorator registering a handler for one message type.
+
+        Args:
+            message_type: Value of the frame's "type" field
+            model: Pydantic model for the frame's "data" object; None passes it through unchecked
+
+        Raises:
+            ValueError: If the type already has a handler
+        """
+        def decorator(handler: Handler) -> Handler:
+            if message_type in self._routes:
+                raise ValueError(f"Handler already registered for {message_type}")
+            self._routes[message_type] = (handler, model)
+            self.latency[message_type] = LatencyHistogram()
+            return handler
+        return decorator
+
+    def register_frame(self, kind: int, name: str) -> Callable[[FrameHandler], FrameHandler]:
+        """
+        Decorator registering a handler for one binary frame kind.
+
+        Args:
+            kind: Frame kind byte from location_codec
+            name: Label for the kind in metrics
+
+        Raises:
+            ValueError: If the kind already has a handler
+        """
+        def decorator(handler: FrameHandler) -> FrameHandler:
+            if kind in self._frame_routes:
+                raise ValueError(f"Handler already registered for frame kind {kind}")
+            self._frame_routes[kind] = (handler, name)
+            self.latency[name] = LatencyHistogram()
+            return handler
+        return decorator
+
+    @property
+    def message_types(self) -> List[str]:
+        return sorted(self._routes)
+
+    async def dispatch(self, ctx: WSContext, message: dict) -> bool:
+        """
+        Validate a decoded frame and run its handler.
+
+        Args:
+            ctx: Connection the frame arrived on
+            message: Decoded JSON frame
+
+        Returns:
+            bool: True if a handler ran
+        """
+        if not isinstance(message, dict):
+            self._stats["invalid"] += 1
+            await ctx.send_error("Message must be a JSON object")
+            return False
+
+        message_type = message.get("type", "unknown")
+        route = self._routes.get(message_type)
+        if route is None:
+            self._stats["unknown"] += 1
+            # Only the type: echoing whole frames let any client make us re-send arbitrary payloads
+            await ctx.send({"type": "echo", "original_type": message_type})
+            return False
+
+        handler, model = route
+        started = time.perf_counter()
+        data = message.get("data")
+        if model is not None:
+            try:
+                data = model.model_validate(data if data is not None else {}).payload()
+            except ValidationError as e:
+                self._stats["invalid"] += 1
+                await ctx.send_error(f"Invalid {message_type} message: {_describe(e)}")
+                return False
+        elif data is None:
+            data = {}
+
+        self._stats["dispatched"] += 1
+        try:
+            await handler(ctx, data, message)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self.latency[message_type].observe((time.perf_counter() - started) * 1000)
+        return True
+
+    async def dispatch_frame(self, ctx: WSContext, frame: bytes) -> bool:
+        """
+        Decode a binary frame and run the handler for its kind.
+
+        Args:
+            ctx: Connection the frame arrived on
+            frame: Raw binary WebSocket message
+
+        Returns:
+            bool: True if a handler ran
+        """
+        if not ctx.binary:
+            self._stats["invalid"] += 1
+            await ctx.send_error(f"Binary frames require the {BINARY_SUBPROTOCOL} subprotocol")
+            return False
+
+        started = time.perf_counter()
+        try:
+            kind, location = decode_frame(frame)
+        except ValueError as e:
+            self._stats["invalid"] += 1
+            await ctx.send_error(f"Invalid binary frame: {str(e)}")
+            return False
+        route = self._frame_routes.get(kind)
+        if route is None:
+            self._stats["invalid"] += 1
+            await ctx.send_error(f"Unexpected binary frame kind: {kind}")
+            return False
+
+        handler, name = route
+        self._stats["dispatched"] += 1
+        try:
+            await handler(ctx, location)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self.latency[name].observe((time.perf_counter() - started) * 1000)
+        return True
+
+    def metrics(self) -> dict:
+        """Dispatch outcome counts and latency per message type that has been seen."""
+        return {
+            **self._stats,
+            "latency": {
+                message_type: histogram.as_dict()
+                for message_type, histogram in self.latency.items()
+                if histogram.count
+            },
+        }
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'data'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+# Global instance; handlers are registered by ws_handlers
+dispatcher = MessageDispatcher()
@@ -0,0 +1,531 @@
+"""
+Handlers for the messages clients send over /ws.
+
+Each handler is registered on the shared dispatcher with the payload model it
+expects (see schema.py); frames that fail validation never reach it.
+"""
+from datetime import datetime
+from typing import Optional
+
+import ws_repository
+from connection_manager import manager
+from driver_location_service import driver_location_service
+from driver_stream import driver_stream
+from location_codec import (
+    FRAME_LOCATION_ACK,
+    FRAME_LOCATION_UPDATE,
+    LocationFrame,
+    encode_frame,
+    iso_timestamp,
+    timestamp_ms,
+)
+from location_history import location_history
+from notification_channel import notification_channel
+from notification_inbox import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from notification_writer import notification_writer
+from schema import (
+    WSBid,
+    WSDriverBidOffer,
+    WSLocationUpdate,
+    WSNotificationAck,
+    WSNotificationSubscribe,
+    WSTrip,
+    WSTripConfirmation,
+    WSTripLocationUpdate,
+)
+from serialization import dumps_text
+from spatial_index import SubscriptionArea
+from ws_dispatch import WSContext, dispatcher
+
+
+async def save_notification_to_db(notification_data: dict, wait: bool = False):
+    """
+    Persist a notification through the batched writer, or with its own
+    commit on the DB executor when the writer is not running. Subscribers
+    of the notifications channel get it pushed once it is committed.
+
+    Args:
+        notification_data: Notification fields
+        wait: The caller needs the notification_id, whatever the durability mode
+
+    Returns:
+        Optional[int]: ID of the new notification, or None
+    """
+    try:
+        if notification_writer.running:
+            return await notification_writer.save(notification_data, wait=wait)
+        row = ws_repository.notification_row(notification_data)
+        notification_id = await ws_repository.run_db(
+            ws_repository.insert_notification_row, row)
+        await notification_channel.publish([(row, notification_id)])
+        return notification_id
+    except Exception as e:
+        print(f"❌ Error saving notification to database: {str(e)}")
+        return None
+
+
+async def _send_to_parties(message_type: str, data: dict) -> None:
+    """Send the same frame to the rider and the driver named in data."""
+    message = dumps_text({"type": message_type, "data": data})
+    if data.get("rider_id"):
+        await manager.send_to_user(message, data["rider_id"])
+    if data.get("driver_id"):
+        await manager.send_to_user(message, data["driver_id"])
+
+
+# Connection
+
+@dispatcher.register("ping")
+async def handle_ping(ctx: WSContext, data: dict, message: dict):
+    await ctx.send({
+        "type": "pong",
+        "timestamp": message.get("timestamp")
+    })
+
+
+@dispatcher.register("new-client")
+async def handle_new_client(ctx: WSContext, data: dict, message: dict):
+    client_id = data.get("id")
+    client_role = data.get("role")
+
+    await ctx.send({
+        "type": "client_registered",
+        "message": f"Client {client_id} ({client_role}) registered successfully",
+        "client_id": client_id,
+        "client_role": client_role
+    })
+
+
+@dispatcher.register("broadcast")
+async def handle_broadcast(ctx: WSContext, data: dict, message: dict):
+    # Broadcast message to all connected clients
+    await manager.broadcast(dumps_text({
+        "type": "broadcast_message",
+        "message": message.get("message", ""),
+        "from_user": ctx.user_id
+    }))
+
+
+# Notifications
+
+@dispatcher.register("subscribe-notifications", WSNotificationSubscribe)
+async def handle_subscribe_notifications(ctx: WSContext, data: dict, message: dict):
+    if ctx.user_id is None or ctx.user_role not in ("rider", "driver"):
+        await ctx.send_error("Sign in as a rider or driver to receive notifications")
+        return
+    # Subscribe first so nothing committed while the snapshot loads is missed
+    manager.subscribe_notifications(ctx.connection_id)
+    limit = min(data.get("limit") or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    snapshot = await notification_channel.snapshot(ctx.user_id, ctx.user_role, limit)
+    await ctx.send({
+        "type": "notifications-snapshot",
+        "data": snapshot
+    })
+
+
+@dispatcher.register("ack-notifications", WSNotificationAck)
+async def handle_ack_notifications(ctx: WSContext, data: dict, message: dict):
+    if ctx.user_id is None or ctx.user_role not in ("rider", "driver"):
+        await ctx.send_error("Sign in as a rider or driver to acknowledge notifications")
+        return
+    notification_channel.acknowledge(ctx.user_id, ctx.user_role, data["notification_ids"])
+    if not notification_channel.running:
+        await notification_channel.flush()
+
+
+# Driver locations
+
+async def _apply_location(location: LocationFrame, timestamp: str, force: bool = False) -> dict:
+    """
+    Store a driver position and send it to riders whose area contains it.
+
+    Updates the location filter suppresses are acknowledged but neither
+    stored nor broadcast; riders extrapolate from the last accepted one.
+
+    Returns:
+        dict: The driver-location data, with "accepted" and the velocity estimate
+    """
+    driver_id, latitude, longitude, _ = location
+    decision = driver_location_service.report_location(
+        driver_id, latitude, longitude, force)
+
+    data = {
+        "driver_id": driver_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": timestamp
+    }
+    if decision.velocity is not None:
+        data["velocity"] = decision.velocity
+    if not decision.accepted:
+        return {**data, "accepted": False}
+    if location_history.running:
+        location_history.record(driver_id, latitude, longitude)
+
+    # The driver list itself follows as a coalesced nearby-drivers-delta
+    await manager.broadcast_to_area(latitude, longitude, dumps_text({
+        "type": "driver-location",
+        "data": data
+    }), location)
+    return {**data, "accepted": True}
+
+
+async def _update_location(ctx: WSContext, data: dict, timestamp: Optional[str], acknowledge: bool,
+                           force: bool = False):
+    timestamp = timestamp or datetime.now().isoformat()
+    location = LocationFrame(
+        data["driver_id"], data["latitude"], data["longitude"], timestamp_ms(timestamp))
+    location_data = await _apply_location(location, timestamp, force)
+    if acknowledge:
+        await ctx.send({
+            "type": "location_updated",
+            "message": f"Location updated for driver {location.driver_id}",
+            "data": location_data
+        })
+
+
+@dispatcher.register("add-location", WSLocationUpdate)
+async def handle_add_location(ctx: WSContext, data: dict, message: dict):
+    # First position after the driver comes online always goes out
+    await _update_location(ctx, data, message.get("timestamp"), acknowledge=True, force=True)
+
+
+@dispatcher.register("update-location", WSLocationUpdate)
+async def handle_update_location(ctx: WSContext, data: dict, message: dict):
+    await _update_location(ctx, data, message.get("timestamp"), acknowledge=True)
+
+
+@dispatcher.register("driver-location", WSLocationUpdate)
+async def handle_driver_location(ctx: WSContext, data: dict, message: dict):
+    # Sent by the map client, which does not expect an acknowledgement
+    await _update_location(ctx, data, None, acknowledge=False)
+
+
+@dispatcher.register_frame(FRAME_LOCATION_UPDATE, "binary-location-update")
+async def handle_location_frame(ctx: WSContext, location: LocationFrame):
+    # Binary counterpart of update-location; acknowledged with the same frame as kind ACK
+    await _apply_location(location, iso_timestamp(location.timestamp_ms))
+    await ctx.send_frame(encode_frame(FRAME_LOCATION_ACK, location))
+
+
+@dispatcher.register("nearby-drivers-resync")
+async def handle_nearby_drivers_resync(ctx: WSContext, data: dict, message: dict):
+    # Client saw a gap in delta sequence numbers
+    await ctx.send_text(driver_stream.snapshot_payload(
+        manager.area_for(ctx.connection_id)))
+
+
+@dispatcher.register("subscribe-area")
+async def handle_subscribe_area(ctx: WSContext, data: dict, message: dict):
+    # Rider only wants drivers inside a circle or bounding box
+    try:
+        area = SubscriptionArea.from_dict(data)
+    except ValueError as e:
+        await ctx.send_error(f"Invalid subscription area: {str(e)}")
+        return
+    manager.subscribe_area(ctx.connection_id, area)
+    await ctx.send({
+        "type": "area-subscribed",
+        "data": area.as_dict()
+    })
+    await ctx.send_text(driver_stream.snapshot_payload(area))
+
+
+@dispatcher.register("unsubscribe-area")
+async def handle_unsubscribe_area(ctx: WSContext, data: dict, message: dict):
+    manager.unsubscribe_area(ctx.connection_id)
+    await ctx.send({"type": "area-unsubscribed"})
+    await ctx.send_text(driver_stream.snapshot_payload())
+
+
+# Bidding
+
+@dispatcher.register("new-trip-request")
+async def handle_new_trip_request(ctx: WSContext, data: dict, message: dict):
+    print(f"🚨 New trip request received: {data.get('req_id')}")
+
+    # Broadcast to all drivers
+    await manager.broadcast(dumps_text({
+        "type": "new-trip-request",
+        "data": data
+    }))
+
+
+@dispatcher.register("bid-from-driver", WSBid)
+async def handle_bid_from_driver(ctx: WSContext, data: dict, message: dict):
+    print(f"🚑 Driver bid received from driver: {data.get('driver_id')}")
+    print(f"🚑 Bid data: {data}")
+    print(f"🚑 Target rider ID: {data.get('rider_id')}")
+
+    # Send to specific rider
+    if data.get("rider_id"):
+        message_to_send = dumps_text({
+            "type": "bid-from-driver",
+            "data": data
+        })
+        print(
+            f"🚑 Sending message to rider {data['rider_id']}: {message_to_send}")
+        delivered = await manager.send_to_user(message_to_send, data["rider_id"])
+        if delivered is None:
+            print("🚑 Message forwarded to the other workers")
+        else:
+            print(f"🚑 Message sent successfully: {delivered}")
+    else:
+        print("❌ No rider_id in bid data, cannot send message")
+
+
+@dispatcher.register("driver-bid-offer", WSDriverBidOffer)
+async def handle_driver_bid_offer(ctx: WSContext, data: dict, message: dict):
+    print(f"🚑 Driver bid offer: {data['driver_id']} -> {data['rider_id']}")
+
+    # Get rider name, coordinates, and create ongoing trip with coordinates
+    bid_records = await ws_repository.run_db(
+        ws_repository.record_driver_bid, data)
+
+    notification_id = await save_notification_to_db({
+        "recipient_id": data["rider_id"],
+        "recipient_type": "rider",
+        "sender_id": data["driver_id"],
+        "sender_type": "driver",
+        "notification_type": "bid",
+        "title": "Driver Bid Received",
+        "message": f"{data.get('driver_name', 'Driver')} offered ৳{data['amount']} for your trip",
+        "req_id": data["req_id"],
+        "bid_amount": data["amount"],
+        "pickup_location": data.get("pickup_location"),
+        "destination": data.get("destination"),
+        "driver_name": data.get("driver_name"),
+        "driver_mobile": data.get("driver_mobile"),
+        "rider_name": bid_records["rider_name"],
+    })
+    if notification_id:
+        print(f"✅ Notification saved to database with ID: {notification_id}")
+
+    # Send to specific rider with trip ID and coordinates
+    await manager.send_to_user(dumps_text({
+        "type": "driver-bid-offer",
+        "data": {
+            **data,
+            "ongoing_trip_id": bid_records["ongoing_trip_id"],
+            "dirde_id": bid_records["dirde_id"],
+            "rider_latitude": bid_records["rider_latitude"],
+            "rider_longitude": bid_records["rider_longitude"],
+            "driver_latitude": bid_records["driver_latitude"],
+            "driver_longitude": bid_records["driver_longitude"]
+        }
+    }), data["rider_id"])
+
+
+@dispatcher.register("rider-counter-offer", WSBid)
+async def handle_rider_counter_offer(ctx: WSContext, data: dict, message: dict):
+    print(f"🚗 Rider counter offer: {data.get('rider_id')} -> {data.get('driver_id')}")
+
+    rider_name, driver_name = await ws_repository.run_db(
+        ws_repository.get_counter_offer_names,
+        data.get("rider_id"), data.get("driver_id"))
+
+    await save_notification_to_db({
+        "recipient_id": data.get("driver_id"),
+        "recipient_type": "driver",
+        "sender_id": data.get("rider_id"),
+        "sender_type": "rider",
+        "notification_type": "counter_offer",
+        "title": "Rider Counter Offer",
+        "message": f"{rider_name} offered ৳{data.get('amount')} for the trip",
+        "req_id": data.get("req_id"),
+        "bid_amount": data.get("amount"),
+        "original_amount": data.get("original_amount"),
+        "rider_name": rider_name,
+        "driver_name": driver_name,
+    })
+
+    if data.get("driver_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "rider-counter-offer",
+            "data": data
+        }), data["driver_id"])
+
+
+@dispatcher.register("driver-counter-offer", WSBid)
+async def handle_driver_counter_offer(ctx: WSContext, data: dict, message: dict):
+    print(f"🚑 Driver counter offer: {data.get('driver_id')} -> {data.get('rider_id')}")
+
+    await save_notification_to_db({
+        "recipient_id": data.get("rider_id"),
+        "recipient_type": "rider",
+        "sender_id": data.get("driver_id"),
+        "sender_type": "driver",
+        "notification_type": "counter_offer",
+        "title": "Driver Counter Offer",
+        "message": f"Driver offered ৳{data.get('amount')} for your trip",
+        "req_id": data.get("req_id"),
+        "bid_amount": data.get("amount"),
+        "original_amount": data.get("original_amount"),
+    })
+
+    if data.get("rider_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "driver-counter-offer",
+            "data": data
+        }), data["rider_id"])
+
+
+@dispatcher.register("bid-accepted", WSBid)
+async def handle_bid_accepted(ctx: WSContext, data: dict, message: dict):
+    print(f"✅ Bid accepted: {data.get('driver_id')} <-> {data.get('rider_id')}")
+    await _send_to_parties("bid-accepted", data)
+
+
+@dispatcher.register("bid-accepted-for-confirmation", WSBid)
+async def handle_bid_accepted_for_confirmation(ctx: WSContext, data: dict, message: dict):
+    print(
+        f"🔔 Bid accepted for confirmation: {data.get('driver_id')} <-> {data.get('rider_id')}")
+
+    notification_id = await save_notification_to_db({
+        "recipient_id": data.get("driver_id"),
+        "recipient_type": "driver",
+        "sender_id": data.get("rider_id"),
+        "sender_type": "rider",
+        "notification_type": "bid_confirmation_request",
+        "title": "Trip Confirmation Request",
+        "message": f"Rider {data.get('rider_name', 'Patient')} has accepted your bid of ৳{data.get('amount')}. Please confirm or cancel this trip.",
+        "req_id": data.get("req_id"),
+        "bid_amount": data.get("amount"),
+        "pickup_location": data.get("pickup_location"),
+        "destination": data.get("destination"),
+        "driver_name": "Driver",  # This will be filled by the driver
+        "driver_mobile": "N/A",
+        "rider_name": data.get("rider_name", "Patient"),
+    }, wait=True)
+    if notification_id:
+        print(f"✅ Driver confirmation notification saved with ID: {notification_id}")
+
+    if data.get("driver_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "bid-confirmation-request",
+            "data": {
+                **data,
+                "notification_id": notification_id,
+                "message": "A rider has accepted your bid. Please confirm or cancel this trip."
+            }
+        }), data["driver_id"])
+
+
+@dispatcher.register("bid-rejected", WSBid)
+async def handle_bid_rejected(ctx: WSContext, data: dict, message: dict):
+    print(f"❌ Bid rejected: {data.get('driver_id')} <-> {data.get('rider_id')}")
+    await _send_to_parties("bid-rejected", data)
+
+
+# Trips
+
+@dispatcher.register("trip-confirmed-by-driver", WSTripConfirmation)
+async def handle_trip_confirmed_by_driver(ctx: WSContext, data: dict, message: dict):
+    print(f"✅ Trip confirmed by driver: {data['driver_id']} <-> {data['rider_id']}")
+
+    # Update existing ongoing trip status in database
+    confirmed_trip = await ws_repository.run_db(ws_repository.confirm_trip, data)
+    await _send_to_parties("trip-confirmed", confirmed_trip)
+
+
+@dispatcher.register("trip-cancelled-by-driver", WSTrip)
+async def handle_trip_cancelled_by_driver(ctx: WSContext, data: dict, message: dict):
+    print(f"❌ Trip cancelled by driver: {data.get('driver_id')} <-> {data.get('rider_id')}")
+
+    if data.get("rider_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "trip-cancelled",
+            "data": {
+                **data,
+                "message": "Driver has cancelled the trip. Please search for another driver."
+            }
+        }), data["rider_id"])
+
+
+@dispatcher.register("trip-location-update", WSTripLocationUpdate)
+async def handle_trip_location_update(ctx: WSContext, data: dict, message: dict):
+    # Update OngoingTrip table with real-time coordinates
+    driver_id = await ws_repository.run_db(ws_repository.update_trip_locations, data)
+    driver_location = data.get("driver_location") or {}
+    if driver_id is not None and driver_location.get("longitude") is not None and location_history.running:
+        location_history.record(
+            driver_id, driver_location["latitude"], driver_location["longitude"], trip_id=data["trip_id"])
+    await _send_to_parties("trip-location-update", data)
+
+
+@dispatcher.register("trip-ended", WSTrip)
+async def handle_trip_ended(ctx: WSContext, data: dict, message: dict):
+    print(f"🏁 Trip ended: {data.get('trip_id')}")
+    await _send_to_parties("trip-ended", data)
+
+
+@dispatcher.register("end-emergency-request", WSTrip)
+async def handle_end_emergency_request(ctx: WSContext, data: dict, message: dict):
+    print(
+        f"🚑 End emergency request from driver: {data.get('driver_id')} -> rider: {data.get('rider_id')}")
+
+    # Get req_id from OngoingTrip if trip_id is provided
+    req_id = await ws_repository.run_db(
+        ws_repository.find_trip_req_id, data.get("trip_id"))
+
+    notification_id = await save_notification_to_db({
+        "recipient_id": data.get("rider_id"),
+        "recipient_type": "rider",
+        "sender_id": data.get("driver_id"),
+        "sender_type": "driver",
+        "notification_type": "end_emergency_request",
+        "title": "End Emergency Request",
+        "message": f"{data.get('driver_name', 'Driver')} wants to end the emergency trip. Please confirm.",
+        "req_id": req_id,
+        "trip_id": data.get("trip_id"),
+        "pickup_location": data.get("pickup_location"),
+        "destination": data.get("destination"),
+        "driver_name": data.get("driver_name", "Driver"),
+        "rider_name": "Rider",
+    }, wait=True)
+    if notification_id:
+        print(f"✅ End emergency request notification saved with ID: {notification_id}")
+
+    if data.get("rider_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "end-emergency-request",
+            "data": {
+                **data,
+                "notification_id": notification_id,
+                "req_id": req_id,
+                "message": f"{data.get('driver_name', 'Driver')} wants to end the emergency trip."
+            }
+        }), data["rider_id"])
+
+
+@dispatcher.register("end-emergency-confirmed", WSTrip)
+async def handle_end_emergency_confirmed(ctx: WSContext, data: dict, message: dict):
+    print(
+        f"✅ End emergency confirmed by rider: {data.get('rider_id')} -> driver: {data.get('driver_id')}")
+
+    # Update ongoing trip status to completed
+    await ws_repository.run_db(ws_repository.complete_trip, data.get("trip_id"))
+
+    if data.get("driver_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "end-emergency-confirmed",
+            "data": {
+                **data,
+                "message": "Rider confirmed. Emergency trip ended successfully."
+            }
+        }), data["driver_id"])
+
+
+@dispatcher.register("end-emergency-cancelled", WSTrip)
+async def handle_end_emergency_cancelled(ctx: WSContext, data: dict, message: dict):
+    print(
+        f"❌ End emergency cancelled by rider: {data.get('rider_id')} -> driver: {data.get('driver_id')}")
+
+    if data.get("driver_id"):
+        await manager.send_to_user(dumps_text({
+            "type": "end-emergency-cancelled",
+            "data": {
+                **data,
+                "message": "Rider cancelled the end emergency request. Trip continues."
+            }
+        }), data["driver_id"])
@@ -0,0 +1,430 @@
+"""
+Database access for the /ws handlers.
+
+SQLAlchemy sessions here are synchronous, so every function in this module is
+meant to be awaited through run_db(), which runs it on a bounded thread pool
+instead of the event loop. A slow query then only ties up one pool thread
+rather than every socket served by the worker.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlmodel import select
+
+from db import SessionLocal
+from models import Dirde, Driver, DriverLocation, Notification, OngoingTrip, Rider, TripRequest
+
+
+# Upper bound on concurrent blocking DB calls issued from WebSocket handlers
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="ws-db")
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking repository function on the DB executor and await it."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+
+def get_available_driver_locations() -> List[dict]:
+    """Available drivers with their stored locations, for a rider's first map."""
+    with SessionLocal() as session:
+        statement = select(Driver, DriverLocation).join(
+            DriverLocation, Driver.driver_id == DriverLocation.driver_id
+        ).filter(Driver.is_available == True)
+        results = session.execute(statement).all()
+
+        drivers_data = []
+        for driver, location in results:
+            drivers_data.append({
+                "id": driver.driver_id,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "timestamp": datetime.now().isoformat(),
+                "name": driver.name,
+                "status": "available"
+            })
+        return drivers_data
+
+
+def record_driver_bid(bid_data: dict) -> dict:
+    """
+    Look up rider and driver coordinates for a bid and create the pending
+    OngoingTrip and Dirde records.
+
+    Returns:
+        dict: rider_name, coordinates, ongoing_trip_id and dirde_id
+    """
+    result = {
+        "rider_name": "Rider",  # Default fallback
+        "rider_latitude": None,
+        "rider_longitude": None,
+        "driver_latitude": None,
+        "driver_longitude": None,
+        "ongoing_trip_id": None,
+        "dirde_id": None,
+    }
+
+    try:
+        with SessionLocal() as session:
+            # Get trip request details including rider coordinates
+            trip_request = session.query(TripRequest).filter(
+                TripRequest.req_id == bid_data.get("req_id")
+            ).first()
+
+            if trip_request:
+                # Get rider name from the rider_id
+                rider = session.query(Rider).filter(
+                    Rider.rider_id == trip_request.rider_id
+                ).first()
+                if rider:
+                    result["rider_name"] = rider.name or rider.email or "Rider"
+
+                # Get rider coordinates from trip request
+                result["rider_latitude"] = trip_request.latitude
+                result["rider_longitude"] = trip_request.longitude
+
+            # Get driver coordinates from DriverLocation table
+            driver_location = session.query(DriverLocation).filter(
+                DriverLocation.driver_id == bid_data.get("driver_id")
+            ).first()
+
+            if driver_location:
+                result["driver_latitude"] = driver_location.latitude
+                result["driver_longitude"] = driver_location.longitude
+
+            rider_latitude = result["rider_latitude"]
+            rider_longitude = result["rider_longitude"]
+            driver_latitude = result["driver_latitude"]
+            driver_longitude = result["driver_longitude"]
+
+            # Create OngoingTrip record with coordinates when driver sends bid
+            if trip_request:
+                ongoing_trip = OngoingTrip(
+                    req_id=bid_data.get("req_id"),
+                    rider_id=bid_data.get("rider_id"),
+                    driver_id=bid_data.get("driver_id"),
+                    pickup_location=bid_data.get(
+                        "pickup_location", trip_request.pickup_location),
+                    destination=bid_data.get(
+                        "destination", trip_request.destination),
+                    fare=bid_data.get("amount", trip_request.fare),
+                    status="pending_confirmation",  # Status until rider accepts
+                    rider_latitude=rider_latitude,
+                    rider_longitude=rider_longitude,
+                    driver_latitude=driver_latitude,
+                    driver_longitude=driver_longitude
+                )
+
+                session.add(ongoing_trip)
+                session.commit()
+                session.refresh(ongoing_trip)
+                result["ongoing_trip_id"] = ongoing_trip.trip_id
+
+                print(f"✅ OngoingTrip created with coordinates:")
+                print(f"   Trip ID: {ongoing_trip.trip_id}")
+                print(
+                    f"   Rider coordinates: {rider_latitude}, {rider_longitude}")
+                print(
+                    f"   Driver coordinates: {driver_latitude}, {driver_longitude}")
+
+            # Create Dirde record with coordinates when driver sends bid
+            if rider_latitude and rider_longitude and driver_latitude and driver_longitude:
+                # Check if Dirde record already exists for this rider-driver pair
+                existing_dirde = session.query(Dirde).filter(
+                    Dirde.rider_id == bid_data.get("rider_id"),
+                    Dirde.driver_id == bid_data.get("driver_id")
+                ).first()
+
+                if existing_dirde:
+                    # Update existing record
+                    existing_dirde.rider_latitude = rider_latitude
+                    existing_dirde.rider_longitude = rider_longitude
+                    existing_dirde.driver_latitude = driver_latitude
+                    existing_dirde.driver_longitude = driver_longitude
+                    existing_dirde.timestamp = datetime.utcnow()
+                    existing_dirde.status = "active"
+
+                    session.commit()
+                    session.refresh(existing_dirde)
+                    result["dirde_id"] = existing_dirde.dirde_id
+
+                    print(
+                        f"✅ Updated existing Dirde record: {existing_dirde.dirde_id}")
+                else:
+                    # Create new Dirde record
+                    new_dirde = Dirde(
+                        rider_id=bid_data.get("rider_id"),
+                        driver_id=bid_data.get("driver_id"),
+                        rider_latitude=rider_latitude,
+                        rider_longitude=rider_longitude,
+                        driver_latitude=driver_latitude,
+                        driver_longitude=driver_longitude,
+                        status="active"
+                    )
+
+                    session.add(new_dirde)
+                    session.commit()
+                    session.refresh(new_dirde)
+                    result["dirde_id"] = new_dirde.dirde_id
+
+                    print(
+                        f"✅ Created new Dirde record: {new_dirde.dirde_id}")
+                    print(
+                        f"   Rider coordinates: {rider_latitude}, {rider_longitude}")
+                    print(
+                        f"   Driver coordinates: {driver_latitude}, {driver_longitude}")
+    except Exception as e:
+        print(
+            f"⚠️ Could not fetch coordinates or create ongoing trip: {e}")
+        result["rider_name"] = "Rider"
+
+    return result
+
+
+def get_counter_offer_names(rider_id: Optional[int], driver_id: Optional[int]) -> Tuple[str, str]:
+    """Display names for both sides of a counter offer."""
+    rider_name = "Rider"  # Default fallback
+    driver_name = "Driver"  # Default fallback
+    try:
+        with SessionLocal() as session:
+            # Get rider name
+            rider = session.query(Rider).filter(
+                Rider.rider_id == rider_id
+            ).first()
+            if rider:
+                rider_name = rider.name or rider.email or "Rider"
+
+            # Get driver name
+            driver = session.query(Driver).filter(
+                Driver.driver_id == driver_id
+            ).first()
+            if driver:
+                driver_name = driver.name or driver.email or "Driver"
+    except Exception as e:
+        print(f"⚠️ Could not fetch names: {e}")
+
+    return rider_name, driver_name
+
+
+def confirm_trip(trip_data: dict) -> dict:
+    """
+    Mark the trip created at bid time as ongoing (or create it) and accept the request.
+
+    Returns:
+        dict: The trip-confirmed payload sent to both parties
+    """
+    with SessionLocal() as session:
+        # Find existing ongoing trip (created when driver sent bid)
+        ongoing_trip = session.query(OngoingTrip).filter(
+            OngoingTrip.req_id == trip_data.get("req_id"),
+            OngoingTrip.driver_id == trip_data.get("driver_id"),
+            OngoingTrip.rider_id == trip_data.get("rider_id")
+        ).first()
+
+        if ongoing_trip:
+            # Update status to ongoing
+            ongoing_trip.status = "ongoing"
+            session.commit()
+            session.refresh(ongoing_trip)
+
+            print(
+                f"✅ Ongoing trip updated with ID: {ongoing_trip.trip_id}")
+            print(f"   Status changed to: ongoing")
+        else:
+            # Create new ongoing trip if not found (fallback)
+            ongoing_trip = OngoingTrip(
+                req_id=trip_data.get("req_id"),
+                rider_id=trip_data.get("rider_id"),
+                driver_id=trip_data.get("driver_id"),
+                pickup_location=trip_data.get(
+                    "tripDetails", {}).get("pickup_location", ""),
+                destination=trip_data.get(
+                    "tripDetails", {}).get("destination", ""),
+                fare=trip_data.get("amount"),
+                status="ongoing"
+            )
+
+            session.add(ongoing_trip)
+            session.commit()
+            session.refresh(ongoing_trip)
+            print(
+                f"✅ New ongoing trip created with ID: {ongoing_trip.trip_id}")
+
+        # Update trip request status
+        trip_request = session.query(TripRequest).filter(
+            TripRequest.req_id == trip_data.get("req_id")
+        ).first()
+        if trip_request:
+            trip_request.status = "accepted"
+            session.commit()
+
+        return {
+            "trip_id": ongoing_trip.trip_id,
+            "req_id": ongoing_trip.req_id,
+            "rider_id": ongoing_trip.rider_id,
+            "driver_id": ongoing_trip.driver_id,
+            "pickup_location": ongoing_trip.pickup_location,
+            "destination": ongoing_trip.destination,
+            "fare": ongoing_trip.fare,
+            "status": ongoing_trip.status,
+            "start_time": ongoing_trip.start_time.isoformat(),
+            "rider_latitude": ongoing_trip.rider_latitude,
+            "rider_longitude": ongoing_trip.rider_longitude,
+            "driver_latitude": ongoing_trip.driver_latitude,
+            "driver_longitude": ongoing_trip.driver_longitude
+        }
+
+
+def update_trip_locations(location_data: dict) -> Optional[int]:
+    """
+    Store the latest rider/driver coordinates on the OngoingTrip and active Dirde.
+
+    Returns:
+        int: The trip's driver_id when driver coordinates were stored, else None
+    """
+    try:
+        with SessionLocal() as session:
+            # Find the ongoing trip
+            ongoing_trip = session.query(OngoingTrip).filter(
+                OngoingTrip.trip_id == location_data.get("trip_id")
+            ).first()
+
+            if not ongoing_trip:
+                return None
+
+            # Update coordinates based on who is sending the update
+            rider_location = location_data.get("rider_location", {})
+            driver_location = location_data.get("driver_location", {})
+
+            if rider_location and rider_location.get("latitude"):
+                ongoing_trip.rider_latitude = rider_location.get("latitude")
+                ongoing_trip.rider_longitude = rider_location.get("longitude")
+                print(f"✅ Updated rider location: {rider_location}")
+
+            driver_id = None
+            if driver_location and driver_location.get("latitude"):
+                ongoing_trip.driver_latitude = driver_location.get("latitude")
+                ongoing_trip.driver_longitude = driver_location.get("longitude")
+                driver_id = ongoing_trip.driver_id
+                print(f"✅ Updated driver location: {driver_location}")
+
+            session.commit()
+            print(
+                f"✅ OngoingTrip coordinates updated for trip {ongoing_trip.trip_id}")
+
+            # Also update Dirde table if record exists
+            dirde_record = session.query(Dirde).filter(
+                Dirde.rider_id == ongoing_trip.rider_id,
+                Dirde.driver_id == ongoing_trip.driver_id,
+                Dirde.status == "active"
+            ).first()
+
+            if dirde_record:
+                if rider_location and rider_location.get("latitude"):
+                    dirde_record.rider_latitude = rider_location.get("latitude")
+                    dirde_record.rider_longitude = rider_location.get("longitude")
+                    print(f"📍 Updated rider coordinates in Dirde")
+
+                if driver_location and driver_location.get("latitude"):
+                    dirde_record.driver_latitude = driver_location.get("latitude")
+                    dirde_record.driver_longitude = driver_location.get("longitude")
+                    print(f"📍 Updated driver coordinates in Dirde")
+
+                dirde_record.timestamp = datetime.utcnow()
+                session.commit()
+                print(f"✅ Dirde coordinates updated successfully")
+            return driver_id
+    except Exception as e:
+        print(f"❌ Error updating OngoingTrip coordinates: {e}")
+        return None
+
+
+def find_trip_req_id(trip_id: Optional[int]) -> Optional[int]:
+    """req_id of an ongoing trip, if the trip exists."""
+    if not trip_id:
+        return None
+    try:
+        with SessionLocal() as session:
+            ongoing_trip = session.query(OngoingTrip).filter(
+                OngoingTrip.trip_id == trip_id
+            ).first()
+            if ongoing_trip:
+                print(f"✅ Found req_id: {ongoing_trip.req_id} for trip_id: {trip_id}")
+                return ongoing_trip.req_id
+    except Exception as e:
+        print(f"❌ Error finding req_id: {e}")
+    return None
+
+
+def complete_trip(trip_id: Optional[int]) -> None:
+    """Mark an ongoing trip as completed."""
+    try:
+        with SessionLocal() as session:
+            ongoing_trip = session.query(OngoingTrip).filter(
+                OngoingTrip.trip_id == trip_id
+            ).first()
+
+            if ongoing_trip:
+                ongoing_trip.status = "completed"
+                ongoing_trip.end_time = datetime.utcnow()
+                session.commit()
+                print(
+                    f"✅ OngoingTrip {ongoing_trip.trip_id} marked as completed")
+    except Exception as e:
+        print(f"❌ Error updating trip status: {e}")
+
+
+def notification_row(notification_data: dict) -> dict:
+    """Column values for a new unread Notification, with the defaults handlers rely on."""
+    return {
+        "recipient_id": notification_data.get("recipient_id"),
+        "recipient_type": notification_data.get("recipient_type", "rider"),
+        "sender_id": notification_data.get("sender_id"),
+        "sender_type": notification_data.get("sender_type", "driver"),
+        "notification_type": notification_data.get("notification_type", "bid"),
+        "title": notification_data.get("title"),
+        "message": notification_data.get("message"),
+        "req_id": notification_data.get("req_id"),
+        "trip_id": notification_data.get("trip_id"),
+        "bid_amount": notification_data.get("bid_amount"),
+        "original_amount": notification_data.get("original_amount"),
+        "pickup_location": notification_data.get("pickup_location"),
+        "destination": notification_data.get("destination"),
+        "driver_name": notification_data.get("driver_name"),
+        "driver_mobile": notification_data.get("driver_mobile"),
+        "rider_name": notification_data.get("rider_name"),
+        "status": "unread",
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def insert_notification(notification_data: dict) -> int:
+    """
+    Insert one unread Notification row.
+
+    Returns:
+        int: ID of the new notification
+    """
+    return insert_notification_row(notification_row(notification_data))
+
+
+def insert_notification_row(row: dict) -> int:
+    """
+    Insert a Notification from notification_row() values.
+
+    Returns:
+        int: ID of the new notification
+    """
+    with SessionLocal() as session:
+        notification = Notification(**row)
+
+        session.add(notification)
+        session.commit()
+        return notification.notification_id